@@ -12,7 +12,10 @@ def attack_player(game, agent):
 def move_towards_player(game, ch):
     """Have an agent try to move towards the player.
 
-    This is basically a very simple uninformed search.
+    Follows the flow field (see flow_field.py) downhill, so walls aren't
+    a problem. Between equally good tiles it picks the one cost() likes
+    best, and if the player can't be reached at all, that's all it has
+    to go on, like in the old uninformed search.
 
     If adjacent the player, this calls attack_player instead.
 
@@ -32,30 +35,37 @@ def move_towards_player(game, ch):
         wait(game, ch)
         return
 
-    # get the costs of all the possible moves
-    costs = []
+    # if the player is one of them, attack instead of moving
+    if pl_pos in possibilities:
+        attack_player(game, ch)
+        return
+
+    flow = game.perception.flow_field
+    # find the lowest (distance, cost)
+    move = None
+    lowest = None
     for pos in possibilities:
-        costs.append(cost(ch_pos, pos, pl_pos))
+        key = (flow.distance(pos), cost(ch_pos, pos, pl_pos))
+        if lowest is None or key < lowest:
+            move = pos
+            lowest = key
 
-    # find the lowest one
-    lowest = 0
-    for i in range(1, len(costs)):
-        if costs[i] < costs[lowest]:
-            lowest = i
+    # the way is blocked, moving away would only make it worse
+    if lowest[0] > flow.distance(ch_pos):
+        wait(game, ch)
+        return
 
-    move = possibilities[lowest]
-    # if the move is the player, attack instead of moving
-    if move == pl_pos:
-        attack_player(game, ch)
-        #print "best move towards player is the player"
-    else:
-        result = game.move_entity(ch, move)
-        if result is not True:
-            print("wtf")
+    result = game.move_entity(ch, move)
+    if result is not True:
+        print("wtf")
 
 
 def run_away(game, ch):
-    """This is a copy paste of move_towards with one test flipped. lazy much?"""
+    """Have an agent try to get away from the player.
+
+    The opposite of move_towards_player: goes uphill on the flow field.
+    Only attacks if the player is the only place left to go.
+    """
     ch_pos = ch.position
     pl_pos = game.get_player().position
 
@@ -67,25 +77,31 @@ def run_away(game, ch):
         wait(game, ch)
         return
 
-    # get the costs of all the possible moves
-    costs = []
+    if pl_pos in possibilities:
+        possibilities.remove(pl_pos)
+        # cornered
+        if not possibilities:
+            attack_player(game, ch)
+            return
+
+    flow = game.perception.flow_field
+    # find the HIGHEST (distance, cost)
+    move = None
+    highest = None
     for pos in possibilities:
-        costs.append(cost(ch_pos, pos, pl_pos))
+        key = (flow.distance(pos), cost(ch_pos, pos, pl_pos))
+        if highest is None or key > highest:
+            move = pos
+            highest = key
 
-    # find the HIGHEST one
-    highest = 0
-    for i in range(1, len(costs)):
-        if costs[i] > costs[highest]:
-            highest = i
+    # nowhere to go but closer
+    if highest[0] < flow.distance(ch_pos):
+        wait(game, ch)
+        return
 
-    move = possibilities[highest]
-    # if the move is the player, attack instead of moving
-    if costs[highest] == -3:
-        attack_player(game, ch)
-    else:
-        result = game.move_entity(ch, move)
-        if result is not True:
-            print("wtf")
+    result = game.move_entity(ch, move)
+    if result is not True:
+        print("wtf")
 
 
 def wait(game, agent):
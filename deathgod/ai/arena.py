@@ -0,0 +1,390 @@
+"""
+arena.py
+
+Runs the genetic AI test without a Display.
+
+The normal game only advances when somebody presses a key, and every
+turn gets drawn to the screen, so evolving frogs overnight is limited
+by rendering and input rather than by the AI. An Arena builds a headless
+Game (no Display, no Screen), spawns the frog population and then just
+calls end_turn in a loop. The player stands still and lets the frogs
+come to it, unless the arena is given a player controller (see
+player_controllers.py) to move it around and fight back.
+
+An Arena can also be given an evaluator (see parallel.py), in which
+case its own map is left alone and every generation is simulated
+somewhere else instead.
+
+A run can be recorded (--record, see recorder.py) and played back much
+faster later on (see replay.py).
+
+Run it from the top level directory, since the stat files are loaded
+with relative paths:
+
+python3 -m deathgod.ai.arena --generations 100
+
+members:
+
+Arena
+forget_inherited_handlers
+main
+"""
+
+import sys
+import time
+import argparse
+from ..game import Game
+from .. import settings
+from .. import player_controllers
+from ..message import Message
+from .. import event
+from .. import character
+from . import genetic
+from .fitness_cache import FitnessCache
+from .checkpoint import CheckpointError
+from .telemetry import TelemetryWriter
+from ..recorder import Recorder
+from ..profiler import TurnProfiler
+
+
+class Arena:
+    """A headless game with a GATest running in it.
+
+    Public Members:
+
+    game
+    ga_test
+    evaluator
+    player
+    turns
+    run
+    run_turns
+    evaluate_generation
+    scatter
+    close
+    """
+    def __init__(self, monster_count=30, eval_interval=5,
+                 world_dimensions=settings.world_dimensions, verbose=False,
+                 evaluator=None, batched=False, fitness_cache=None, seed=None,
+                 player=None, recorder=None, dormancy=None):
+        """Arguments:
+
+        monster_count
+            -- how many frogs to evolve (default 30)
+        eval_interval
+            -- turns between generations, passed on to GATest (default 5)
+        world_dimensions
+            -- the size of the map. Big populations need big maps, since
+               every frog needs an open tile. (default settings.world_dimensions)
+        verbose
+            -- whether the GATest should print its progress (default False)
+        evaluator
+            -- something with an evaluate(trees) method returning a
+               (damage_dealt, kills, got_killed) tuple per tree, such as a
+               parallel.ParallelEvaluator. If None, the frogs are evaluated
+               right here on the arena's map. (default None)
+        batched
+            -- evaluate the AI tests for all the frogs at once, and mutate
+               and breed them all at once, with NumPy (see batch.py and
+               variation.py) (default False)
+        fitness_cache
+            -- a fitness_cache.FitnessCache for the GATest to select with.
+               With an evaluator, frogs whose genome is already being
+               evaluated this generation don't get evaluated again.
+               (default None)
+        seed
+            -- seeds the game's random number generator, which the GATest
+               uses too, so the same seed makes the same run (default None)
+        player
+            -- what plays the player: a player_controllers.PlayerController,
+               or the name of one in player_controllers.CONTROLLERS
+               (default None: the player stands still)
+        recorder
+            -- a recorder.Recorder to record the whole run with, from the
+               moment the game is made (or a replay.Replayer, replaying one)
+               (default None)
+        dormancy
+            -- park the frogs further than this from the player, see
+               dormancy.py (default None: settings.dormancy_radius)
+        """
+        rng = None
+        if recorder is not None:
+            rng = recorder.make_rng(seed)
+        self.game = Game(headless=True, world_dimensions=world_dimensions, seed=seed, rng=rng)
+        if recorder is not None:
+            recorder.attach(self.game)
+        if dormancy is not None:
+            self.game.dormancy.enable(dormancy)
+        if batched:
+            self.game.perception.enable_batch()
+        self.ga_test = genetic.GATest(self.game, eval_interval, verbose, fitness_cache)
+        if batched:
+            self.ga_test.enable_batched_variation()
+        self.ga_test.start(monster_count)
+        self.evaluator = evaluator
+        if player is None:
+            player = player_controllers.IdleController()
+        elif isinstance(player, str):
+            player = player_controllers.make_controller(player)
+        self.player = player
+        self.turns = 0
+
+
+    def run(self, generations):
+        """Runs turns until the GATest has gone through (generations) more generations."""
+        if self.evaluator is not None:
+            for i in range(generations):
+                self.evaluate_generation()
+            return
+
+        target = self.ga_test.generations + generations
+        while self.ga_test.generations < target:
+            self.player.take_turn(self.game)
+            self.turns = self.turns + 1
+
+
+    def evaluate_generation(self):
+        """Has the evaluator simulate every frog, then moves on to the next generation."""
+        monsters = self.ga_test.monsters
+        evaluated = monsters
+        if self.ga_test.fitness_cache is not None:
+            # one frog per genome is enough, the rest get the pooled estimate
+            evaluated = []
+            keys = set()
+            for mon in monsters:
+                key = mon.d_tree.genome_key()
+                if key not in keys:
+                    keys.add(key)
+                    evaluated.append(mon)
+
+        results = self.evaluator.evaluate([mon.d_tree for mon in evaluated])
+        for mon, (damage_dealt, kills, got_killed) in zip(evaluated, results):
+            # same as if the frog had done all this on our own map
+            mon.damage_dealt = mon.damage_dealt + damage_dealt
+            mon.kills = mon.kills + kills
+            mon.got_killed = mon.got_killed or got_killed
+        self.turns = self.turns + self.ga_test.eval_interval
+        self.ga_test.next_generation(evaluated)
+
+
+    def run_turns(self, turns):
+        """Runs exactly (turns) turns."""
+        for i in range(turns):
+            self.player.take_turn(self.game)
+        self.turns = self.turns + turns
+
+
+    def scatter(self, seed):
+        """Starts the arena over from (seed), keeping the frogs' trees.
+
+        Reseeds the game's random number generator, heals everybody, puts
+        the player back at the start and every frog on a new open tile, in
+        the same order every time.
+        Whatever happens next only depends on (seed) and the trees, not
+        on what the arena was doing before.
+        """
+        game = self.game
+        game.rng.seed(seed)
+        player = game.player
+        player.stats.hp = player.stats.max_hp
+        player.turns_since_regen = 0
+        self.player.reset()
+
+        monsters = self.ga_test.monsters
+        # off the map first, so they don't stand in each other's way
+        for mon in monsters:
+            if mon.active:
+                game.deactivate_entity(mon)
+            game.remove_entity(mon)
+        game.get_map().move_entity(player, settings.player_start)
+        player.position = settings.player_start
+        for mon in monsters:
+            mon.position, t_tile = game.get_map().choose_open_tile(game.rng)
+            mon.stats.hp = mon.stats.max_hp
+            mon.turns_since_regen = 0
+            game.add_entity(mon)
+            game.activate_entity(mon)
+
+
+    def close(self):
+        """Unhooks the arena's GATest and player from the event system.
+
+        Necessary if more than one Arena is going to be made in the same
+        process, otherwise the old ones keep handling events.
+        """
+        self.ga_test.stop()
+        Message.handlers.remove(self.game.player.handle_message)
+
+
+def forget_inherited_handlers():
+    """Empties the event handler lists an Arena's game uses.
+
+    For new worker processes: a forked process inherits every handler
+    the parent had registered, none of which belong to games in it.
+    """
+    del event.TurnEnded.handlers[:]
+    del character.CharacterDeath.handlers[:]
+    del Message.handlers[:]
+
+
+def main(argv=None):
+    """Runs an arena from the command line and reports how fast it went."""
+    parser = argparse.ArgumentParser(description="Evolve frogs without a display.")
+    parser.add_argument("-g", "--generations", type=int, default=100)
+    parser.add_argument("-m", "--monsters", type=int, default=30)
+    parser.add_argument("-e", "--eval-interval", type=int, default=5)
+    parser.add_argument("--width", type=int, default=settings.world_dimensions[0])
+    parser.add_argument("--height", type=int, default=settings.world_dimensions[1])
+    parser.add_argument("-w", "--workers", type=int, default=0,
+                        help="evaluate on this many worker processes")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="pieces to split the population into (default: one per worker)")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="select by mean fitness per genome, remembering this many genomes")
+    parser.add_argument("--cache-age", type=int, default=None,
+                        help="forget genomes not seen for this many generations")
+    parser.add_argument("-b", "--batched", action="store_true",
+                        help="evaluate AI tests, mutate and breed with NumPy, for big populations")
+    parser.add_argument("-c", "--checkpoint", default=None,
+                        help="save the population to this file as it goes")
+    parser.add_argument("--checkpoint-interval", type=int, default=1,
+                        help="generations between checkpoints")
+    parser.add_argument("-r", "--resume", default=None,
+                        help="start from a checkpoint")
+    parser.add_argument("-i", "--islands", type=int, default=0,
+                        help="evolve this many populations in separate processes")
+    parser.add_argument("--migration-interval", type=int, default=10,
+                        help="generations between migrations between islands")
+    parser.add_argument("--migrants", type=int, default=2,
+                        help="trees each island sends per migration")
+    parser.add_argument("-t", "--telemetry", default=None,
+                        help="write a record of every generation here (.csv for CSV, else JSON lines; "
+                             "with --islands, one file per island)")
+    parser.add_argument("--racing", type=float, default=None, metavar="BUDGET",
+                        help="race the frogs (see racing.py), spending this fraction of the usual turns")
+    parser.add_argument("-s", "--seed", default=None,
+                        help="seed everything with this, for a run that can be repeated exactly")
+    parser.add_argument("-p", "--player", default=None,
+                        choices=sorted(player_controllers.CONTROLLERS),
+                        help="what the player does (default: stands still)")
+    parser.add_argument("--record", default=None,
+                        help="record the run to this file, for replay.py")
+    parser.add_argument("--dormancy", type=int, default=None, metavar="RADIUS",
+                        help="frogs further than this from the player stop acting")
+    parser.add_argument("--profile", default=None,
+                        help="time every part of every turn, and write the timings here "
+                             "(.csv for CSV, else JSON)")
+    parser.add_argument("--profile-window", type=int, default=100,
+                        help="turns the timings cover (default 100)")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.record is not None and (args.islands > 0 or args.workers > 0
+                                    or args.racing is not None or args.resume is not None):
+        parser.error("--record only records plain runs, without islands, workers, "
+                     "racing or resuming")
+    if args.dormancy is not None and (args.islands > 0 or args.workers > 0
+                                      or args.racing is not None):
+        parser.error("--dormancy only applies to frogs evaluated on the arena's own map")
+    if args.profile is not None and (args.islands > 0 or args.workers > 0
+                                     or args.racing is not None):
+        parser.error("--profile only times turns played on the arena's own map")
+    if args.islands > 0 and (args.checkpoint is not None or args.resume is not None):
+        parser.error("--checkpoint and --resume save and load one population, not islands")
+
+    if args.islands > 0:
+        from .islands import run_islands
+        start = time.time()
+        reports = run_islands(args.islands, args.generations, args.migration_interval,
+                              args.migrants, args.monsters, args.eval_interval,
+                              (args.width, args.height), args.batched, args.seed,
+                              args.player, args.telemetry, args.cache_size, args.cache_age)
+        elapsed = time.time() - start
+        for report in reports:
+            print("island %(island)d: %(generations)d generations, "
+                  "%(migrants_received)d migrants received, best fitness %(best_fitness)d" % report)
+        print("%d islands x %d generations in %.2f s: %.1f generations/s" % (
+            args.islands, args.generations, elapsed,
+            args.islands * args.generations / elapsed))
+        return 0
+
+    evaluator = None
+    if args.racing is not None:
+        if args.workers > 0:
+            parser.error("--racing runs in this process, it can't be combined with --workers")
+        from .racing import RacingEvaluator
+        evaluator = RacingEvaluator(args.eval_interval, (args.width, args.height),
+                                    args.seed, budget=args.racing, player=args.player)
+    elif args.workers > 0:
+        from .parallel import ParallelEvaluator
+        evaluator = ParallelEvaluator(args.workers, args.shards, args.eval_interval,
+                                      (args.width, args.height), args.seed, args.player)
+
+    fitness_cache = None
+    if args.cache_size > 0:
+        fitness_cache = FitnessCache(args.cache_size, args.cache_age)
+
+    recorder = None
+    if args.record is not None:
+        # everything replay.py needs to set the same arena up again
+        recorder = Recorder(args.record, {
+            "monsters": args.monsters,
+            "eval_interval": args.eval_interval,
+            "world": [args.width, args.height],
+            "batched": args.batched,
+            "cache_size": args.cache_size,
+            "cache_age": args.cache_age,
+            "seed": args.seed,
+            "player": args.player,
+            "dormancy": args.dormancy
+        })
+
+    arena = Arena(args.monsters, args.eval_interval,
+                  (args.width, args.height), args.verbose, evaluator, args.batched,
+                  fitness_cache, args.seed, args.player, recorder, args.dormancy)
+    arena.ga_test.checkpoint_path = args.checkpoint
+    arena.ga_test.checkpoint_interval = args.checkpoint_interval
+    if args.telemetry is not None:
+        arena.ga_test.telemetry = TelemetryWriter(args.telemetry)
+    if args.resume is not None:
+        try:
+            arena.ga_test.resume(args.resume)
+        except CheckpointError as e:
+            arena.close()
+            if evaluator is not None:
+                evaluator.close()
+            parser.error(str(e))
+    if args.profile is not None:
+        arena.game.profiler = TurnProfiler(args.profile_window)
+
+    start = time.time()
+    arena.run(args.generations)
+    elapsed = time.time() - start
+    arena.close()
+    if evaluator is not None:
+        evaluator.close()
+    if arena.ga_test.telemetry is not None:
+        arena.ga_test.telemetry.close()
+    if recorder is not None:
+        recorder.close()
+    if args.profile is not None:
+        arena.game.profiler.dump(args.profile)
+
+    print("%d generations (%d turns) in %.2f s: %.1f generations/s, %.1f turns/s" % (
+        args.generations, arena.turns, elapsed,
+        args.generations / elapsed, arena.turns / elapsed))
+    if args.batched:
+        hits, misses, tables = genetic.policy_stats()
+        if hits + misses > 0:
+            print("policy tables: %d genomes, %.1f%% of decisions looked up" % (
+                tables, 100.0 * hits / (hits + misses)))
+    if args.profile is not None:
+        print(arena.game.profiler.report(20))
+    if args.racing is not None:
+        print("racing simulated %d frog-turns instead of %d" % (
+            evaluator.frog_turns, evaluator.plain_frog_turns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
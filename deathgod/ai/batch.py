@@ -0,0 +1,161 @@
+"""
+batch.py
+
+Evaluates every test in tests.members for a whole population at once.
+
+The functions in tests.py each look at one Character. Here each of them
+has a NumPy twin that looks at the hp, max_hp, offense and positions of
+every character in a batch, kept in arrays, and returns a boolean array.
+TestBatch.evaluate stacks these into a matrix with a row per character
+and a column per test, and packs each row into an int with bit i set if
+tests.members[i] came out True. Decision trees can then just check bits
+(see DecisionTree.get_action_from_bits) instead of calling tests.
+
+Like everything in perception.py, the results are worked out at the
+start of the turn, so they don't see the player's hp drop while the
+monsters take their turns.
+
+Requires NumPy, which is why nothing imports this module unless batched
+evaluation is asked for (see Perception.enable_batch).
+
+members:
+
+TestBatch
+batched_tests
+"""
+
+import numpy
+from ..ordered_pair import x, y
+from . import tests
+
+
+class BatchState:
+    """Arrays of everything the batched tests need to know about a batch of characters."""
+    def __init__(self, game, characters):
+        n = len(characters)
+        self.game = game
+        self.characters = characters
+        self.hp = numpy.fromiter((ch.stats.hp for ch in characters), float, n)
+        self.max_hp = numpy.fromiter((ch.stats.max_hp for ch in characters), float, n)
+        self.offense = numpy.fromiter((ch.offense for ch in characters), float, n)
+        self.pos_x = numpy.fromiter((ch.position[x] for ch in characters), int, n)
+        self.pos_y = numpy.fromiter((ch.position[y] for ch in characters), int, n)
+        self.__counts = {}
+
+
+    def count_nearby(self, radius, ent_type):
+        """Counts entities of (ent_type) within (radius) of every character.
+
+        Same thing as Perception.count_nearby, but done with a summed area
+        table of how many such entities are on every tile.
+        """
+        table = self.__counts.get(ent_type)
+        if table is None:
+            table = self.__counts[ent_type] = self.__summed_area_table(ent_type)
+
+        width = table.shape[0] - 1
+        height = table.shape[1] - 1
+        x0 = numpy.clip(self.pos_x - radius, 0, width)
+        x1 = numpy.clip(self.pos_x + radius + 1, 0, width)
+        y0 = numpy.clip(self.pos_y - radius, 0, height)
+        y1 = numpy.clip(self.pos_y + radius + 1, 0, height)
+        return table[x1, y1] - table[x0, y1] - table[x1, y0] + table[x0, y0]
+
+
+    def __summed_area_table(self, ent_type):
+        game = self.game
+        current_map = game.get_map()
+        grid = numpy.zeros((current_map.width + 1, current_map.height + 1), int)
+        xs = []
+        ys = []
+        for entities in (game.active_entities, game.inactive_entities):
+            for ent in entities:
+                if ent.type == ent_type:
+                    xs.append(ent.position[x] + 1)
+                    ys.append(ent.position[y] + 1)
+        numpy.add.at(grid, (xs, ys), 1)
+        return grid.cumsum(0).cumsum(1)
+
+
+# the batched twins of the functions in tests.py
+# they need to match the defaults there
+
+def full_life(state):
+    return state.hp == state.max_hp
+
+def less_than_half_life(state):
+    return state.hp < state.max_hp / 2
+
+def more_than_half_life(state):
+    return ~less_than_half_life(state)
+
+def about_to_die(state, threshold=5):
+    return (state.hp > 0) & (state.hp < threshold)
+
+def player_about_to_die(state, threshold=5):
+    hp = state.game.player.stats.hp
+    return numpy.full(len(state.hp), 0 < hp < threshold)
+
+def can_kill_player(state):
+    return state.offense - state.game.perception.player_defense >= state.game.player.stats.hp
+
+def friends_nearby(state, threshold=3, radius=5):
+    counts = numpy.zeros(len(state.hp), int)
+    types = [ch.type for ch in state.characters]
+    for ent_type in set(types):
+        mask = numpy.fromiter((t == ent_type for t in types), bool, len(types))
+        counts[mask] = state.count_nearby(radius, ent_type)[mask]
+    return counts >= threshold
+
+def adjacent_to_player(state):
+    pl_pos = state.game.perception.player_position
+    dist = numpy.maximum(numpy.abs(state.pos_x - pl_pos[x]), numpy.abs(state.pos_y - pl_pos[y]))
+    return dist == 1
+
+
+batched_tests = {
+    tests.full_life: full_life,
+    tests.less_than_half_life: less_than_half_life,
+    tests.more_than_half_life: more_than_half_life,
+    tests.about_to_die: about_to_die,
+    tests.player_about_to_die: player_about_to_die,
+    tests.can_kill_player: can_kill_player,
+    tests.friends_nearby: friends_nearby,
+    tests.adjacent_to_player: adjacent_to_player
+}
+
+
+class TestBatch:
+    """Evaluates tests.members for a list of characters in one go.
+
+    Public Members:
+
+    evaluate
+    evaluate_bits
+    """
+    def __init__(self):
+        self.functions = [batched_tests[test] for test in tests.members]
+        self.bit_values = numpy.left_shift(1, numpy.arange(len(tests.members)))
+
+
+    def evaluate(self, game, characters):
+        """Returns a boolean matrix, [character][test index]."""
+        state = BatchState(game, characters)
+        matrix = numpy.empty((len(characters), len(self.functions)), bool)
+        profiler = game.profiler
+        if profiler is None:
+            for i, f in enumerate(self.functions):
+                matrix[:, i] = f(state)
+            return matrix
+
+        for i, f in enumerate(self.functions):
+            start = profiler.clock()
+            matrix[:, i] = f(state)
+            profiler.add("batched test", tests.members[i].__name__, profiler.clock() - start)
+        return matrix
+
+
+    def evaluate_bits(self, game, characters):
+        """Returns a list with each character's row of the matrix packed into an int."""
+        matrix = self.evaluate(game, characters)
+        return (matrix @ self.bit_values).tolist()
@@ -0,0 +1,243 @@
+"""
+benchmark.py
+
+Measures how fast the GA runs, so commits can be compared.
+
+For each population size an Arena is built on a fixed seed, with a map
+big enough for the frogs (always the same size for the same population),
+warmed up for a generation and then timed for a number of generations.
+Since the seed is fixed, and genetic.py's caches of compiled trees,
+walk counts and policy tables are cleared before every run (see
+genetic.clear_caches), every run does exactly the same work, compiling
+included, so it's done a few times and the fastest counts, which keeps
+the numbers from jumping around with whatever else the machine is
+doing. The results are:
+
+- generations per second and turns per second over the timed run
+- decision latency: how long DecisionTree.get_action takes per frog,
+  timed separately afterwards on the arena as it was left, so the
+  timing doesn't slow the throughput numbers down
+
+Results are written as JSON, along with the git revision if there is
+one, and two result files can be compared:
+
+python3 -m deathgod.ai.benchmark -o before.json
+...change things...
+python3 -m deathgod.ai.benchmark -o after.json --compare before.json
+
+Comparing prints the change in every number and exits with status 1 if
+anything got slower by more than --threshold, so it can be used to
+catch regressions automatically. Small runs still wobble by 10-20%
+between identical commits on a busy machine, hence the default
+threshold of 20%. Run it from the top level directory, since the stat
+files are loaded with relative paths.
+
+members:
+
+run_benchmark
+compare
+main
+POPULATIONS
+"""
+
+import sys
+import json
+import time
+import math
+import platform
+import argparse
+import subprocess
+from .arena import Arena
+from . import genetic
+
+# population size -> generations to time
+POPULATIONS = {30: 200, 300: 40, 3000: 3}
+
+# open tiles per frog the benchmark maps are sized for
+TILES_PER_FROG = 10
+
+
+def world_for(population):
+    """Returns the (width, height) of the map used for (population) frogs."""
+    side = max(30, int(math.ceil(math.sqrt(population * TILES_PER_FROG))))
+    return (side, side)
+
+
+def run_benchmark(population, generations, seed=0, eval_interval=5, batched=False,
+                  repeats=3, decision_samples=5):
+    """Times one population size. Returns a dictionary of results.
+
+    Arguments:
+
+    population
+        -- how many frogs
+    generations
+        -- how many generations to time
+    seed
+        -- the arena's seed (default 0)
+    eval_interval
+        -- turns per generation (default 5)
+    batched
+        -- evaluate tests with NumPy (see batch.py) (default False)
+    repeats
+        -- how many times to do the whole run, keeping the fastest (default 3)
+    decision_samples
+        -- how many times every frog's decision is timed (default 5)
+    """
+    world = world_for(population)
+    elapsed = None
+    latencies = []
+    for i in range(repeats):
+        # or later runs would find the earlier runs' trees already compiled
+        genetic.clear_caches()
+        arena = Arena(population, eval_interval, world, batched=batched, seed=seed)
+        try:
+            arena.run(1) # warm up
+
+            turns = arena.turns
+            start = time.perf_counter()
+            arena.run(generations)
+            run_time = time.perf_counter() - start
+            turns = arena.turns - turns
+
+            latencies.extend(_decision_latencies(arena, decision_samples))
+        finally:
+            arena.close()
+        if elapsed is None or run_time < elapsed:
+            elapsed = run_time
+
+    latencies.sort()
+    return {
+        "population": population,
+        "world": list(world),
+        "batched": batched,
+        "seed": seed,
+        "generations": generations,
+        "repeats": repeats,
+        "turns": turns,
+        "seconds": elapsed,
+        "generations_per_second": generations / elapsed,
+        "turns_per_second": turns / elapsed,
+        "decision_us_mean": sum(latencies) / len(latencies),
+        "decision_us_p50": latencies[len(latencies) // 2],
+        "decision_us_p99": latencies[min(len(latencies) - 1, (len(latencies) * 99) // 100)]
+    }
+
+
+def _decision_latencies(arena, samples):
+    """Times get_action for every frog, (samples) times. Returns microseconds."""
+    game = arena.game
+    clock = time.perf_counter
+    latencies = []
+    for i in range(samples):
+        for mon in arena.ga_test.monsters:
+            tree = mon.d_tree
+            start = clock()
+            tree.get_action(game)
+            latencies.append((clock() - start) * 1e6)
+    return latencies
+
+
+def git_revision():
+    """Returns the current git commit, or None if there isn't one."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, universal_newlines=True,
+                             timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if out.returncode != 0:
+        return None
+    return out.stdout.strip()
+
+
+def compare(old, new, threshold=0.2):
+    """Compares two sets of results. Returns (lines to print, regressed).
+
+    A result regressed if its throughput dropped, or its decision
+    latency went up, by more than (threshold) (a fraction).
+    """
+    old_by_key = dict((_key(r), r) for r in old["results"])
+    lines = []
+    regressed = False
+    for result in new["results"]:
+        before = old_by_key.get(_key(result))
+        if before is None:
+            lines.append("population %d: no earlier result" % result["population"])
+            continue
+        lines.append("population %d:" % result["population"])
+        for field, higher_is_better in (("generations_per_second", True),
+                                        ("turns_per_second", True),
+                                        ("decision_us_mean", False),
+                                        ("decision_us_p50", False)):
+            change = result[field] / before[field] - 1.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  <-- REGRESSION"
+                regressed = True
+            lines.append("  %-24s %12.2f -> %12.2f  %+6.1f%%%s" % (
+                field, before[field], result[field], change * 100.0, flag))
+    return lines, regressed
+
+
+def _key(result):
+    return (result["population"], result["batched"])
+
+
+def main(argv=None):
+    """Runs the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark GA throughput.")
+    parser.add_argument("-p", "--populations", type=int, nargs="+",
+                        default=sorted(POPULATIONS),
+                        help="population sizes to run")
+    parser.add_argument("-g", "--generations", type=int, default=None,
+                        help="generations to time for every size (default: depends on size)")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-r", "--repeats", type=int, default=3,
+                        help="runs per size, the fastest counts (default 3)")
+    parser.add_argument("-b", "--batched", action="store_true",
+                        help="evaluate AI tests with NumPy")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results to this JSON file")
+    parser.add_argument("-c", "--compare", default=None,
+                        help="compare with an earlier results file")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                        help="slowdown that counts as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for population in args.populations:
+        generations = args.generations or POPULATIONS.get(population, 10)
+        result = run_benchmark(population, generations, args.seed, batched=args.batched,
+                               repeats=args.repeats)
+        print("population %(population)5d: %(generations_per_second)8.2f generations/s, "
+              "%(turns_per_second)9.1f turns/s, decisions %(decision_us_mean)6.2f us "
+              "(p50 %(decision_us_p50).2f, p99 %(decision_us_p99).2f)" % result)
+        results.append(result)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "results": results
+    }
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        lines, regressed = compare(old, report, args.threshold)
+        print("compared to %s (revision %s):" % (args.compare, old.get("revision")))
+        for line in lines:
+            print(line)
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+checkpoint.py
+
+Saves and loads GATest populations.
+
+Pickling a population would drag along the monsters, the game and
+function references, so instead a checkpoint is a small binary file
+(made with struct, then zlib'd) holding:
+
+- the generation count and the GATest's other counters
+- the state of the random number generator
+- the fitness history (average, worst and best for every generation)
+- every monster's genes and performance logging
+
+Genes are indexes into tests.members and actions.members, and those
+lists can change between versions, so a checkpoint also stores the
+names of the tests and actions in the order it used them. Loading maps
+the names back onto whatever the lists look like now.
+
+members:
+
+save
+load
+CheckpointError
+MAGIC
+VERSION
+"""
+
+import os
+import zlib
+import struct
+from . import tests
+from . import actions
+
+MAGIC = b"DGGA"
+VERSION = 2
+
+_header = struct.Struct("<4sH")
+_counters = struct.Struct("<IIIi")
+_rng_state = struct.Struct("<I625IBd")
+_history_entry = struct.Struct("<ddd")
+# damage_dealt, kills, got_killed, fitness
+_monster_stats = struct.Struct("<iiBd")
+# version 1 kept damage_dealt and kills as doubles
+_monster_stats_v1 = struct.Struct("<ddBd")
+
+
+class CheckpointError(Exception):
+    """Raised when a checkpoint can't be loaded."""
+    pass
+
+
+def save(path, ga_test, rng_state):
+    """Writes a checkpoint of (ga_test) to (path).
+
+    The file is written next to (path) first and then moved over it, so
+    a run that dies mid-write leaves the last checkpoint intact.
+
+    Arguments:
+
+    path
+        -- the file to write
+    ga_test
+        -- the GATest to save
+    rng_state
+        -- the state of its random number generator, from getstate()
+    """
+    body = bytearray()
+    body += _counters.pack(ga_test.generations, ga_test.turns_since_eval,
+                           ga_test.eval_interval, ga_test.current_mark)
+    _pack_names(body, [f.__name__ for f in tests.members])
+    _pack_names(body, [f.__name__ for f in actions.members])
+
+    version, words, gauss_next = rng_state
+    has_gauss = gauss_next is not None
+    body += _rng_state.pack(version, *words, has_gauss, gauss_next if has_gauss else 0.0)
+
+    body += struct.pack("<I", len(ga_test.history))
+    for entry in ga_test.history:
+        body += _history_entry.pack(*entry)
+
+    body += struct.pack("<I", len(ga_test.monsters))
+    for mon in ga_test.monsters:
+        genes = mon.d_tree.encode()
+        body += struct.pack("<B", len(genes))
+        body += genes
+        body += _monster_stats.pack(mon.damage_dealt, mon.kills, mon.got_killed, mon.fitness)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_header.pack(MAGIC, VERSION))
+        f.write(zlib.compress(bytes(body), 1))
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    """Reads a checkpoint. Returns a dictionary:
+
+    {
+        'generations', 'turns_since_eval', 'eval_interval', 'current_mark':
+            the GATest's counters
+        'rng_state': a tuple for setstate()
+        'history': a list of (average, worst, best) fitness tuples
+        'monsters': a list of (genes, damage_dealt, kills, got_killed, fitness),
+            with genes ready for DecisionTree.init_from_genes
+    }
+
+    Raises CheckpointError if the file isn't a checkpoint, is damaged
+    (e.g. cut off by a full disk), or uses a test or action that no
+    longer exists.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < _header.size:
+        raise CheckpointError("%s is not a checkpoint" % path)
+    magic, version = _header.unpack_from(data)
+    if magic != MAGIC:
+        raise CheckpointError("%s is not a checkpoint" % path)
+    if version not in (1, VERSION):
+        raise CheckpointError("%s is checkpoint version %d, expected %d" % (path, version, VERSION))
+
+    try:
+        return _unpack_body(zlib.decompress(data[_header.size:]), version)
+    except (zlib.error, struct.error, IndexError, UnicodeDecodeError):
+        raise CheckpointError("%s is damaged" % path)
+
+
+def _unpack_body(body, version):
+    """Does the rest of load, with (body) decompressed."""
+    state = {}
+    (state['generations'], state['turns_since_eval'],
+     state['eval_interval'], state['current_mark']) = _counters.unpack_from(body)
+    offset = _counters.size
+
+    test_names, offset = _unpack_names(body, offset)
+    action_names, offset = _unpack_names(body, offset)
+    gene_map = _make_gene_map(test_names, action_names)
+
+    rng = _rng_state.unpack_from(body, offset)
+    offset = offset + _rng_state.size
+    gauss_next = rng[-1] if rng[-2] else None
+    state['rng_state'] = (rng[0], tuple(rng[1:-2]), gauss_next)
+
+    count, = struct.unpack_from("<I", body, offset)
+    offset = offset + 4
+    history = []
+    for i in range(count):
+        history.append(_history_entry.unpack_from(body, offset))
+        offset = offset + _history_entry.size
+    state['history'] = history
+
+    count, = struct.unpack_from("<I", body, offset)
+    offset = offset + 4
+    monsters = []
+    stats = _monster_stats if version == VERSION else _monster_stats_v1
+    for i in range(count):
+        length = body[offset]
+        genes = bytes(gene_map[g] for g in body[offset + 1:offset + 1 + length])
+        offset = offset + 1 + length
+        damage_dealt, kills, got_killed, fitness = stats.unpack_from(body, offset)
+        offset = offset + stats.size
+        monsters.append((genes, int(damage_dealt), int(kills), bool(got_killed), fitness))
+    state['monsters'] = monsters
+
+    return state
+
+
+def _pack_names(body, names):
+    body += struct.pack("<B", len(names))
+    for name in names:
+        encoded = name.encode("utf-8")
+        body += struct.pack("<B", len(encoded))
+        body += encoded
+
+
+def _unpack_names(body, offset):
+    count = body[offset]
+    offset = offset + 1
+    names = []
+    for i in range(count):
+        length = body[offset]
+        names.append(body[offset + 1:offset + 1 + length].decode("utf-8"))
+        offset = offset + 1 + length
+    return names, offset
+
+
+def _make_gene_map(test_names, action_names):
+    """Returns a list mapping the checkpoint's genes to today's genes."""
+    current_tests = [f.__name__ for f in tests.members]
+    current_actions = [f.__name__ for f in actions.members]
+    gene_map = []
+    try:
+        for name in test_names:
+            gene_map.append(current_tests.index(name))
+        for name in action_names:
+            gene_map.append(len(current_tests) + current_actions.index(name))
+    except ValueError:
+        raise CheckpointError("checkpoint uses %s, which no longer exists" % name)
+    return gene_map
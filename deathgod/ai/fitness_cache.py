@@ -0,0 +1,101 @@
+"""
+fitness_cache.py
+
+Remembers how well each genome has done across generations.
+
+After a few generations a lot of the frogs end up with the same tree,
+and every one of them gets judged on its own few turns of luck. A
+FitnessCache keeps a running mean of every fitness sample seen for a
+genome (keyed by DecisionTree.genome_key, so trees that only differ in
+ways that can never matter count as the same genome), and GATest uses
+that mean for selection instead of the single latest sample.
+
+Entries that haven't been seen for max_age generations are dropped, and
+when there are more than max_size of them, the least recently seen go
+first.
+
+members:
+
+FitnessCache
+"""
+
+from collections import OrderedDict
+
+
+class FitnessCache:
+    """Running mean fitness per genome.
+
+    Public Members:
+
+    max_size
+    max_age
+    add
+    estimate
+    samples
+    evict
+    """
+    def __init__(self, max_size=10000, max_age=None):
+        """Arguments:
+
+        max_size
+            -- the most genomes to remember (default 10000)
+        max_age
+            -- forget genomes not seen for this many generations, None to
+               only evict by size (default None)
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        # key -> [sample count, mean, generation last seen], least recently seen first
+        self.__entries = OrderedDict()
+
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+
+    def add(self, key, sample, generation):
+        """Adds a fitness sample for a genome and returns its new mean."""
+        entry = self.__entries.get(key)
+        if entry is None:
+            entry = self.__entries[key] = [0, 0.0, generation]
+        else:
+            self.__entries.move_to_end(key)
+        entry[0] = entry[0] + 1
+        entry[1] = entry[1] + (sample - entry[1]) / entry[0]
+        entry[2] = generation
+        return entry[1]
+
+
+    def estimate(self, key, default=None):
+        """Returns the mean fitness of a genome, or (default) if it isn't known."""
+        entry = self.__entries.get(key)
+        if entry is None:
+            return default
+        return entry[1]
+
+
+    def samples(self, key):
+        """(int) how many samples the mean for a genome is made of"""
+        entry = self.__entries.get(key)
+        if entry is None:
+            return 0
+        return entry[0]
+
+
+    def evict(self, generation):
+        """Drops entries that are too old, then as many as it takes to fit max_size."""
+        entries = self.__entries
+        if self.max_age is not None:
+            # least recently seen are first, so stop at the first young one
+            while entries:
+                key, entry = next(iter(entries.items()))
+                if generation - entry[2] <= self.max_age:
+                    break
+                del entries[key]
+
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
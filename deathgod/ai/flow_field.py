@@ -0,0 +1,103 @@
+"""
+flow_field.py
+
+A map of how many moves every tile is from the player.
+
+move_towards_player and run_away used to just look at the 8 tiles around
+the monster and take whichever got it closest to (or farthest from) the
+player as the crow flies, which is how the frogs ended up stuck on every
+wall in the test map. Now a FlowField does one breadth first search out
+from the player over the passable terrain, stored as a flat array, and
+monsters just go downhill (or uphill) from wherever they are.
+
+The field is owned by Perception, which rebuilds it at the start of the
+turn, but only when the player has actually moved (or the terrain has
+changed, see GameMap.set_passable). Other entities are
+ignored, since they move around all the time; monsters deal with each
+other when they pick a tile to move into.
+
+members:
+
+FlowField
+UNREACHABLE
+"""
+
+from array import array
+from collections import deque
+from ..ordered_pair import x, y
+
+# distance of tiles you can't get to the player from
+UNREACHABLE = 2 ** 30
+
+
+class FlowField:
+    """Distances from a target tile to every other tile on a map.
+
+    Moves are 8 directional, same as the monsters', so the distance is
+    the number of moves it takes to get there.
+
+    Public Members:
+
+    target
+    update
+    distance
+    """
+    def __init__(self):
+        self.target = None
+        self.__map = None
+        self.__terrain_version = -1
+        self.__height = 0
+        self.__passable = None
+        self.__distances = None
+
+
+    def update(self, current_map, target):
+        """Rebuilds the field for a new target, if it moved (or the map changed)."""
+        target = (target[x], target[y])
+        if (current_map is self.__map and target == self.target
+                and current_map.terrain_version == self.__terrain_version):
+            return
+
+        self.__set_map(current_map)
+        self.target = target
+        self.__distances = self.__search(target)
+
+
+    def distance(self, pos):
+        """(int) moves from pos to the target, or UNREACHABLE"""
+        return self.__distances[pos[x] * self.__height + pos[y]]
+
+
+    def __set_map(self, current_map):
+        self.__map = current_map
+        self.__terrain_version = current_map.terrain_version
+        self.__height = current_map.height
+        self.__passable = current_map.passability
+
+
+    def __search(self, target):
+        """Breadth first search out from target, returns the distance array."""
+        width = self.__map.width
+        height = self.__height
+        passable = self.__passable
+        distances = array('i', [UNREACHABLE]) * (width * height)
+
+        start = target[x] * height + target[y]
+        distances[start] = 0
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            next_distance = distances[i] + 1
+            i_x, i_y = divmod(i, height)
+            for n_x in (i_x - 1, i_x, i_x + 1):
+                if n_x < 0 or n_x >= width:
+                    continue
+                for n_y in (i_y - 1, i_y, i_y + 1):
+                    if n_y < 0 or n_y >= height:
+                        continue
+                    n = n_x * height + n_y
+                    if passable[n] and distances[n] == UNREACHABLE:
+                        distances[n] = next_distance
+                        queue.append(n)
+
+        return distances
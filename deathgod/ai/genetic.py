@@ -17,42 +17,131 @@ act
 fitness
 GATest
 DecisionTree
-DTreeNode
+breed
+tree_depth
+compile_tree
+canonical_genes
+PolicyTable
+policy_stats
+clear_caches
 """
 
+import time
 import random
+from array import array
 from . import tests
 from . import actions
 from ..monster import Monster
 from ..monsters import giant_frog
 from .. import character
 from .. import event
-
-random.seed()
-
-MAX_DEPTH = len(tests.members) # right now my trees are stupid simple so this is accurate
+from . import checkpoint
+from . import telemetry as telemetry_module
+from .genome_pool import GenomePool
+
+N_TESTS = len(tests.members)
+N_ACTIONS = len(actions.members)
+EMPTY = -1
+
+# the most tests on any path from the root to an action. Trees used to be
+# combs with every test on them exactly once, so this used to be N_TESTS,
+# but now any shape goes.
+MAX_DEPTH = 8
+# the most nodes in a tree. Right branch indexes are kept in signed
+# shorts, so this can't go past 32767.
+MAX_NODES = 63
+GENOME_LENGTH = MAX_NODES
+EMPTY_GENOME = array('b', [EMPTY] * GENOME_LENGTH)
+
+# where every DecisionTree's genes live unless it's given a pool of its own
+default_pool = GenomePool(GENOME_LENGTH)
 
 # any monster using this better already be given a d_tree variable somehow
 def act(game, monster):
     """The actual genetic AI function called when the monster's turn comes up."""
+    profiler = game.profiler
+    if profiler is not None:
+        act_profiled(game, monster, profiler)
+        return
     action = monster.d_tree.get_action(game)
     action(game, monster)
 
 
+def act_profiled(game, monster, profiler):
+    """Same as act, timing the decision, the tests and the action (see profiler.py)."""
+    tree = monster.d_tree
+    start = profiler.clock()
+    bits = game.perception.get_test_bits(monster)
+    if bits is not None:
+        action = tree.get_action_from_bits(bits)
+    else:
+        action = tree.get_action_profiled(game, profiler)
+    decided = profiler.clock()
+    action(game, monster)
+    profiler.add("decision", "tree", decided - start)
+    profiler.add("action", action.__name__, profiler.clock() - decided)
+
+
 class GATest:
     """Spawns a bunch of monsters and manages their AI genetically.
 
     Yes, this class is the meat of the project. The rest is just data
     structures and algorithms I needed to make it all work.
     """
-    def __init__(self, game, eval_interval=5):
+    def __init__(self, game, eval_interval=5, verbose=True, fitness_cache=None,
+                 checkpoint_path=None, checkpoint_interval=1, telemetry=None,
+                 rng=None):
+        """Arguments:
+
+        game
+            -- the game to spawn the monsters in
+        eval_interval
+            -- how many turns between generations (default 5)
+        verbose
+            -- whether to print progress (default True)
+        fitness_cache
+            -- a fitness_cache.FitnessCache. If given, monsters are selected
+               by the mean fitness of every monster that has had the same
+               genome, instead of just their own. (default None)
+        checkpoint_path
+            -- if given, the population is saved here every
+               (checkpoint_interval) generations (see checkpoint.py), and
+               resume can pick things back up from it. (default None)
+        checkpoint_interval
+            -- generations between checkpoints (default 1)
+        telemetry
+            -- a telemetry.TelemetryWriter to send a record of every
+               generation to (default None)
+        rng
+            -- the random.Random to spawn, mutate, select and breed with
+               (default: the game's)
+        """
         self.game = game
+        self.rng = rng if rng is not None else game.rng
+        self.verbose = verbose
+        self.fitness_cache = fitness_cache
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
         self.turns_since_eval = 0
         self.eval_interval = eval_interval
         self.generations = 0
         self.running = False
+        self.evolving = True # if False, frogs are only respawned, never bred
         self.monsters = []
         self.current_mark = 0
+        self.history = [] # (average, worst, best) fitness of every generation
+        self.telemetry = telemetry
+        # seconds spent on each phase of the last generation, see next_generation
+        self.phase_times = {}
+        self.__phase_start = time.perf_counter()
+
+        # size limits for new trees, see DecisionTree.init_grow and breed
+        self.max_depth = MAX_DEPTH
+        self.max_nodes = MAX_NODES
+
+        # the variation module (mutate_all and breed_all), if the whole
+        # population is to be varied at once, see enable_batched_variation
+        self.variation = None
 
         self.p_breed = [0.20, 0.30, 0.40, 0.50, 0.60]
         # replacement probabilities are just the inverse
@@ -61,18 +150,94 @@ class GATest:
         event.TurnEnded.add_handler(self.handle_turn_ended)
 
 
+    def enable_batched_variation(self):
+        """Mutates and breeds the whole population at once with NumPy.
+
+        See variation.py. Raises ImportError if NumPy isn't installed.
+        """
+        from . import variation
+        self.variation = variation
+
+
+    def stop(self):
+        """Stops the GA and unhooks it from the game's events.
+
+        The event handler lists are "static", so a GATest that is thrown
+        away without calling this will keep getting every event.
+        """
+        self.running = False
+        event.remove_handler(self.handle_character_death, character.CharacterDeath)
+        event.remove_handler(self.handle_turn_ended, event.TurnEnded)
+
+
     def start(self, monster_count=30):
         self.running = True
-        current_map = self.game.get_map()
         for i in range(monster_count):
-            pos, t_tile = current_map.choose_open_tile()
-            mon = Monster(self.game, pos, giant_frog)
-            mon.ai_func = act
+            self.spawn_monster()
+        self.__phase_start = time.perf_counter()
+
+
+    def spawn_monster(self):
+        """Puts a new frog with a random tree somewhere open on the map."""
+        pos, t_tile = self.game.get_map().choose_open_tile(self.rng)
+        mon = Monster(self.game, pos, giant_frog)
+        mon.ai_func = act
+        mon.d_tree = DecisionTree(mon)
+        mon.d_tree.init_grow(self.max_depth, self.max_nodes, rng=self.rng)
+        self.monsters.append(mon)
+        self.game.add_entity(mon)
+        self.game.activate_entity(mon)
+        return mon
+
+
+    def set_population(self, count):
+        """Spawns or removes frogs until there are (count) of them.
+
+        New frogs get random trees, removed ones are taken off the map.
+        """
+        while len(self.monsters) < count:
+            self.spawn_monster()
+        while len(self.monsters) > count:
+            mon = self.monsters.pop()
+            self.game.deactivate_entity(mon)
+            self.game.remove_entity(mon)
+
+
+    def save_checkpoint(self, path):
+        """Saves the population to (path). See checkpoint.py."""
+        checkpoint.save(path, self, self.rng.getstate())
+
+
+    def resume(self, path):
+        """Picks up where the checkpoint at (path) left off.
+
+        The monsters get the checkpoint's trees and performance logging
+        (frogs are spawned or removed to match its population size, but
+        where they stand isn't saved), and the generation count, fitness
+        history and random number generator are restored.
+
+        Raises checkpoint.CheckpointError if (path) can't be used.
+        """
+        state = checkpoint.load(path)
+        saved = state['monsters']
+        self.running = True
+        self.set_population(len(saved))
+
+        for mon, (genes, damage_dealt, kills, got_killed, fit) in zip(self.monsters, saved):
             mon.d_tree = DecisionTree(mon)
-            mon.d_tree.init_random()
-            self.monsters.append(mon)
-            self.game.add_entity(mon)
-            self.game.activate_entity(mon)
+            mon.d_tree.init_from_genes(genes)
+            mon.damage_dealt = damage_dealt
+            mon.kills = kills
+            mon.got_killed = got_killed
+            mon.fitness_sampled = fitness(mon)
+            mon.fitness = fit
+
+        self.generations = state['generations']
+        self.turns_since_eval = state['turns_since_eval']
+        self.eval_interval = state['eval_interval']
+        self.current_mark = state['current_mark']
+        self.history = state['history']
+        self.rng.setstate(state['rng_state'])
 
 
     def handle_turn_ended(self, e):
@@ -81,71 +246,200 @@ class GATest:
         This class needs to know every time a turn passes. At certain
         intervals it will do the GA thing on all the AI's.
         """
-        if not self.running:
+        if not self.running or not self.evolving:
+            return
+        # the handler list is shared by every game in the process
+        if e.game is not None and e.game is not self.game:
             return
 
         if self.turns_since_eval == self.eval_interval:
-            self.generations = self.generations + 1
-            print("generation %d beginning" % self.generations)
             self.turns_since_eval = 0
-            avg_fitness = 0.0
-            # iterate through all monsters, evaluate fitness, sort, mutate
-            for mon in self.monsters:
-                mon.fitness = fitness(mon)
-                avg_fitness = avg_fitness + mon.fitness
-                # it doesn't really matter if we mutate now or later,
-                # so may as well catch this for loop
-                mon.d_tree.mutate(1.0 / (float(MAX_DEPTH) * 2.0 + 1.0))
+            self.next_generation()
 
-            self.monsters.sort(key=lambda m: m.sorting_priority)
+        self.turns_since_eval = self.turns_since_eval + 1
 
-            avg_fitness = float(avg_fitness) / float(len(self.monsters))
-            print("avg. fitness = %f, worst = %d, best = %d" % (avg_fitness, self.monsters[0].fitness, self.monsters[-1].fitness))
 
-            # pick 5 monsters at random
-            sample = random.sample(self.monsters, 5)
-            #print "type(sample) = " + str(type(sample)) + ", sample = " + str(sample)
-            # order from worst to best
-            sample.sort(key=lambda m: m.sorting_priority)
-
-            to_breed = []
-            to_replace = []
-            # iterate through the sample randomly adding monsters to breeding or replacement pools
-            # based on their position in the list
-            i = 0
-            for mon in sample:
-                if random.uniform(0, 1) < self.p_breed[i]:
-                    to_breed.append(mon)
-                if random.uniform(0, 1) > self.p_breed[i]:
-                    to_replace.append(mon)
+    def next_generation(self, evaluated=None):
+        """Does the GA thing: evaluates, mutates, selects and breeds.
 
-                i = i + 1
+        Normally called by handle_turn_ended, but anything that fills in
+        the monsters' performance logging some other way (the parallel
+        evaluator, for one) can call it directly.
+
+        The time spent on each phase ends up in phase_times (and in the
+        telemetry record, if there's a writer):
+
+        simulation -- everything since the last generation, i.e. playing turns
+        fitness -- evaluating (and pooling) fitness
+        mutation -- mutating every tree
+        breeding -- ranking, selection, breeding and replacement
 
-            # make sure the two quantities are the same
-            # seriously, how the hell are you supposed to do this?
-            while len(to_breed) > len(to_replace):
-                to_replace.append(random.choice(self.monsters[0:len(self.monsters)//2]))
-            if len(to_replace) > len(to_breed):
-                diff = len(to_replace) - len(to_breed)
-                to_replace = to_replace[0:-diff]
+        Arguments:
 
+        evaluated
+            -- the monsters whose performance logging is a new sample of
+               how good their genome is, if not all of them. The others
+               get the fitness cache's estimate for their genome.
+               Meaningless without a fitness cache. (default None)
+        """
+        clock = time.perf_counter
+        t_fitness = clock()
+        times = self.phase_times = {"simulation": t_fitness - self.__phase_start}
+
+        self.generations = self.generations + 1
+        if self.verbose:
+            print("generation %d beginning" % self.generations)
+        avg_fitness = 0.0
+        # iterate through all monsters, evaluate fitness, sort, mutate
+        for mon in self.monsters:
+            mon.fitness = fitness(mon)
+            avg_fitness = avg_fitness + mon.fitness
+
+        if self.telemetry is not None:
+            # the raw samples and genomes, before pooling and mutation touch them
+            samples = [mon.fitness for mon in self.monsters]
+            genome_keys = [mon.d_tree.genome_key() for mon in self.monsters]
+
+        if self.fitness_cache is not None:
+            self.pool_fitness(evaluated)
+
+        t_mutation = clock()
+        times["fitness"] = t_mutation - t_fitness
+
+        rng = self.rng
+        p_mutate = 1.0 / (float(MAX_DEPTH) * 2.0 + 1.0)
+        if self.variation is not None:
+            self.variation.mutate_all([mon.d_tree for mon in self.monsters], p_mutate, rng)
+        else:
+            for mon in self.monsters:
+                mon.d_tree.mutate(p_mutate, rng)
+
+        t_breeding = clock()
+        times["mutation"] = t_breeding - t_mutation
+
+        # worst first, best last
+        self.monsters.sort(key=lambda m: m.fitness)
+
+        avg_fitness = float(avg_fitness) / float(len(self.monsters))
+        self.history.append((avg_fitness, self.monsters[0].fitness, self.monsters[-1].fitness))
+        if self.verbose:
+            print("avg. fitness = %f, worst = %d, best = %d" % (avg_fitness, self.monsters[0].fitness, self.monsters[-1].fitness))
+
+        # pick 5 monsters at random
+        sample = rng.sample(self.monsters, 5)
+        #print "type(sample) = " + str(type(sample)) + ", sample = " + str(sample)
+        # order from worst to best
+        sample.sort(key=lambda m: m.fitness)
+
+        to_breed = []
+        to_replace = []
+        # iterate through the sample randomly adding monsters to breeding or replacement pools
+        # based on their position in the list
+        i = 0
+        for mon in sample:
+            if rng.uniform(0, 1) < self.p_breed[i]:
+                to_breed.append(mon)
+            if rng.uniform(0, 1) > self.p_breed[i]:
+                to_replace.append(mon)
+
+            i = i + 1
+
+        # make sure the two quantities are the same
+        # seriously, how the hell are you supposed to do this?
+        while len(to_breed) > len(to_replace):
+            to_replace.append(rng.choice(self.monsters[0:len(self.monsters)//2]))
+        if len(to_replace) > len(to_breed):
+            diff = len(to_replace) - len(to_breed)
+            to_replace = to_replace[0:-diff]
+
+        # breed with random choice of the best half of self.monsters
+        # is this too much selection pressure?
+        best_half = self.monsters[-len(self.monsters)//2:]
+        recorder = self.game.recorder
+        if self.variation is not None:
+            parents = [(mon, rng.choice(best_half)) for mon in to_breed]
+            if recorder is not None:
+                for mon, partner in parents:
+                    recorder.bred(mon, partner)
+            pairs = [(mon.d_tree, partner.d_tree) for mon, partner in parents]
+            new_d_trees = self.variation.breed_all(pairs, rng, self.max_depth, self.max_nodes)
+        else:
             new_d_trees = []
             for mon in to_breed:
-                # breed with random choice of the best half of self.monsters
-                # is this too much selection pressure?
-                new_d_tree = breed(mon.d_tree,
-                                   random.choice(self.monsters[-len(self.monsters)//2:]).d_tree)
+                partner = rng.choice(best_half)
+                if recorder is not None:
+                    recorder.bred(mon, partner)
+                new_d_tree = breed(mon.d_tree, partner.d_tree,
+                                   rng, self.max_depth, self.max_nodes)
                 new_d_trees.append(new_d_tree)
 
-            # put those new d_trees in to_replace
-            # since this is effectively a new monster, reset it
-            while new_d_trees:
-                mon = to_replace.pop(0)
-                mon.d_tree = new_d_trees.pop(0)
-                mon.reset()
+        # put those new d_trees in to_replace
+        # since this is effectively a new monster, reset it
+        replaced = len(new_d_trees)
+        while new_d_trees:
+            mon = to_replace.pop(0)
+            mon.d_tree = new_d_trees.pop(0)
+            mon.d_tree.owner = mon
+            mon.reset()
+            if recorder is not None:
+                recorder.replaced(mon)
 
+        t_done = clock()
+        times["breeding"] = t_done - t_breeding
+
+        if self.telemetry is not None:
+            self.telemetry.write(telemetry_module.make_record(
+                self.generations, samples, genome_keys, len(to_breed), replaced, times))
+
+        if self.checkpoint_path is not None and self.generations % self.checkpoint_interval == 0:
+            self.save_checkpoint(self.checkpoint_path)
+
+        # writing telemetry and checkpoints counts as simulation time for the
+        # next generation, so the phases always add up to the wall clock
+        self.__phase_start = t_done
+
+
+    def pool_fitness(self, evaluated=None):
+        """Replaces every monster's fitness with the cached mean for its genome.
+
+        The monsters in (evaluated) (all of them if None) add their fitness
+        to the cache first. Has to happen before mutation, since that
+        changes the genomes.
+
+        A monster's performance logging only gets reset when it's
+        replaced, so a monster that survives a few generations has been
+        racking up kills and damage the whole time. Only what it's done
+        since its last sample (mon.fitness_sampled) goes in the cache, or
+        the longer a genome lived the better it would look.
+        """
+        cache = self.fitness_cache
+        if evaluated is None:
+            evaluated = self.monsters
+        for mon in evaluated:
+            cache.add(mon.d_tree.genome_key(), mon.fitness - mon.fitness_sampled,
+                      self.generations)
+        for mon in self.monsters:
+            mon.fitness_sampled = mon.fitness
+            mon.fitness = cache.estimate(mon.d_tree.genome_key(), mon.fitness)
+        cache.evict(self.generations)
+
+
+    def best_genomes(self, count):
+        """Returns the encoded trees of the (count) fittest monsters, best first."""
+        ranked = sorted(self.monsters, key=lambda m: m.fitness, reverse=True)
+        return [mon.d_tree.encode() for mon in ranked[:count]]
 
-        self.turns_since_eval = self.turns_since_eval + 1
+
+    def immigrate(self, genomes):
+        """Gives the least fit monsters the encoded trees in (genomes).
+
+        Like bred trees, the new arrivals count as new monsters.
+        """
+        ranked = sorted(self.monsters, key=lambda m: m.fitness)
+        for mon, genes in zip(ranked, genomes):
+            mon.d_tree = DecisionTree(mon)
+            mon.d_tree.init_from_genes(genes)
+            mon.reset()
 
 
     def handle_character_death(self, e):
@@ -157,10 +451,15 @@ class GATest:
             return
 
         mon = e.ch
+        # the handler list is shared by every game in the process
+        if mon.game is not self.game:
+            return
+
         if mon.name == giant_frog.name:
-            new_pos, t_tile = self.game.get_map().choose_open_tile()
+            new_pos, t_tile = self.game.get_map().choose_open_tile(self.rng)
             mon.mark = self.current_mark
-            print("putting frog which was at %s back at %s, marking it as %d" % (str(mon.position), str(new_pos), mon.mark))
+            if self.verbose:
+                print("putting frog which was at %s back at %s, marking it as %d" % (str(mon.position), str(new_pos), mon.mark))
             mon.position = new_pos
             self.current_mark = self.current_mark + 1
             self.game.add_entity(mon)
@@ -179,203 +478,689 @@ def fitness(monster):
     return fitness
 
 
-def breed(tree1, tree2):
+def breed(tree1, tree2, rng=random, max_depth=MAX_DEPTH, max_nodes=MAX_NODES):
     """My breeding function.
 
-    Basically makes a copy of tree1, and swaps sub-trees with tree2 at
-    a random depth. Pretty much relies on my simplistic tree structure.
+    Makes a copy of tree1, and replaces a random sub-tree of it with a
+    random sub-tree of tree2. The sub-trees can be anywhere, any size,
+    as long as the result stays within (max_depth) and (max_nodes); a
+    few pairs are tried, and if none of them fit, the copy of tree1 is
+    returned as is.
 
-    I have no fucking clue if this will work. I can't even debug it since
-    I have no way of printing my tree.
+    Like in most GP, sub-trees rooted at a test are picked nine times
+    out of ten, otherwise most crossovers would just swap two actions.
 
-    Right now it can only swap sub-trees, which kinda sucks but the
-    alternative is a far more complex algorithm than I have time for.
+    Since the genes are in pre-order, a sub-tree is just a slice, so
+    crossover is just gluing slices together.
+
+    The choices are made with (rng), a random.Random (default: the random
+    module's).
     """
     cpy = tree1.copy()
+    genes1 = tree1.encode()
+    genes2 = tree2.encode()
+
+    for attempt in range(CROSSOVER_ATTEMPTS):
+        i = _crossover_point(genes1, rng)
+        j = _crossover_point(genes2, rng)
+        end1 = subtree_end(genes1, i)
+        end2 = subtree_end(genes2, j)
+        if len(genes1) - (end1 - i) + (end2 - j) > max_nodes:
+            continue
+        genes = genes1[:i] + genes2[j:end2] + genes1[end1:]
+        if tree_depth(genes) > max_depth:
+            continue
+        cpy.set_genes(genes)
+        break
 
-    start_depth = random.randint(0, MAX_DEPTH-2)
+    return cpy
 
-    node1_parent = cpy.get_left_node_at_depth(start_depth)
-    node2 = tree2.get_left_node_at_depth(start_depth+1)
-    node1_parent.left = node2
 
-    return cpy
+# how many sub-tree pairs breed tries before giving up
+CROSSOVER_ATTEMPTS = 4
+
+def _crossover_point(genes, rng):
+    """Picks the root of a sub-tree of (genes) to cross over at."""
+    if rng.random() < 0.9:
+        tests_at = [i for i, gene in enumerate(genes) if gene < N_TESTS]
+        if tests_at:
+            return rng.choice(tests_at)
+    return rng.randrange(len(genes))
+
+
+def tree_depth(genes):
+    """Returns the most tests on any path through the tree in (genes)."""
+    deepest = 0
+    # depths of the nodes still to come, in pre-order
+    pending = [0]
+    i = 0
+    while pending:
+        depth = pending.pop()
+        if is_test(genes[i]):
+            depth = depth + 1
+            if depth > deepest:
+                deepest = depth
+            pending.append(depth)
+            pending.append(depth)
+        i = i + 1
+    return deepest
+
+
+def is_test(gene):
+    """Returns True if (gene) stands for a test, False if it is an action (or EMPTY)."""
+    return 0 <= gene < N_TESTS
+
+
+def test_gene(test):
+    """Returns the gene for a function in tests.members."""
+    return tests.members.index(test)
+
+
+def action_gene(action):
+    """Returns the gene for a function in actions.members."""
+    return N_TESTS + actions.members.index(action)
+
+
+def subtree_end(genes, start):
+    """Returns the index just past the sub-tree whose root is at genes[start]."""
+    # every test node needs two more nodes after it, every action node ends a branch
+    needed = 1
+    i = start
+    while needed:
+        if is_test(genes[i]):
+            needed = needed + 1
+        else:
+            needed = needed - 1
+        i = i + 1
+    return i
+
+
+# the names compiled trees use for the tests and actions
+_compile_globals = {}
+for _i, _f in enumerate(tests.members):
+    _compile_globals["t%d" % _i] = _f
+for _i, _f in enumerate(actions.members):
+    _compile_globals["a%d" % _i] = _f
+
+# compiled functions by genes, since lots of trees turn out to be identical
+_compiled_trees = {}
+MAX_COMPILED_TREES = 4096
+# how many times a genome gets walked, by all the trees that have it
+# between them, before it's worth compiling: about what compiling costs
+# in walks, lower and too many short-lived genomes get compiled
+COMPILE_THRESHOLD = 100
+# decisions walked so far by genes, for the genomes not compiled yet
+_walk_counts = {}
+MAX_WALK_COUNTS = 65536
+
+def compile_tree(genes):
+    """Turns a tree's genes into a function of (game, ch) that returns an action.
+
+    The function is just nested if/else statements calling the tests, e.g.
+
+    def decide(game, ch):
+        if t1(game, ch) is True:
+            return a2
+        else:
+            ...
+
+    which saves get_action from walking the genes every single turn.
+    """
+    key = genes.tobytes()
+    decide = _compiled_trees.get(key)
+    if decide is not None:
+        return decide
+
+    lines = ["def decide(game, ch):"]
+    _compile_aux(genes, 0, 1, lines)
+    namespace = dict(_compile_globals)
+    exec(compile("\n".join(lines), "<decision tree>", "exec"), namespace)
+    decide = namespace["decide"]
+
+    if len(_compiled_trees) >= MAX_COMPILED_TREES:
+        _compiled_trees.clear()
+    _compiled_trees[key] = decide
+    return decide
+
+
+def _compile_aux(genes, i, indent, lines):
+    """Appends the source for the sub-tree at genes[i] to (lines), returns its end."""
+    pad = "    " * indent
+    gene = genes[i]
+    if not is_test(gene):
+        lines.append(pad + "return a%d" % (gene - N_TESTS))
+        return i + 1
+
+    lines.append(pad + "if t%d(game, ch) is True:" % gene)
+    right = _compile_aux(genes, i + 1, indent + 1, lines)
+    lines.append(pad + "else:")
+    return _compile_aux(genes, right, indent + 1, lines)
+
+
+class PolicyTable:
+    """What a genome does for every combination of test results, filled in as needed.
+
+    A tree's choice only depends on which tests are True, so with the
+    test results packed into bits (see Perception.get_test_bits) the
+    whole tree boils down to a table with an entry for every possible
+    value of the bits. Entries are worked out the first time they're
+    asked for, and after that a decision is just a list index.
+
+    Tables are shared by all trees with the same genes (see policy_table).
+
+    Public Members:
+
+    actions
+    hits
+    misses
+    hit_rate
+    """
+    def __init__(self):
+        self.actions = [None] * (1 << N_TESTS)
+        self.hits = 0
+        self.misses = 0
+
+
+    @property
+    def hit_rate(self):
+        """(float) the fraction of lookups that were already in the table"""
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return float(self.hits) / lookups
+
+
+# policy tables by genes, like _compiled_trees
+_policy_tables = {}
+MAX_POLICY_TABLES = 4096
+# hits and misses of tables that have been thrown away, for policy_stats
+_retired_policy_stats = [0, 0]
+
+def policy_table(genes):
+    """Returns the PolicyTable for (genes), making a new one if needed."""
+    key = genes.tobytes()
+    table = _policy_tables.get(key)
+    if table is None:
+        if len(_policy_tables) >= MAX_POLICY_TABLES:
+            for old in _policy_tables.values():
+                _retired_policy_stats[0] = _retired_policy_stats[0] + old.hits
+                _retired_policy_stats[1] = _retired_policy_stats[1] + old.misses
+            _policy_tables.clear()
+        table = _policy_tables[key] = PolicyTable()
+    return table
+
+
+def policy_stats():
+    """Returns (hits, misses, tables) for all the policy tables so far."""
+    hits, misses = _retired_policy_stats
+    for table in _policy_tables.values():
+        hits = hits + table.hits
+        misses = misses + table.misses
+    return hits, misses, len(_policy_tables)
+
+
+def clear_caches():
+    """Forgets every compiled tree, walk count and policy table (and their stats).
+
+    For runs that have to start from scratch, e.g. to be timed. Trees
+    that already have a compiled function or table keep theirs.
+    """
+    _compiled_trees.clear()
+    _walk_counts.clear()
+    _policy_tables.clear()
+    _retired_policy_stats[:] = [0, 0]
+
+
+def canonical_genes(genes):
+    """Returns the genes of the simplest tree that always acts the same as (genes).
+
+    Two kinds of node can never make a difference:
+
+    - a test with identical sub-trees on both sides
+    - a test that already had to be passed (or failed) on the way down,
+      since a test gives the same answer twice in the same turn
+
+    so they are replaced by the sub-tree that would be chosen. The result
+    is a bytes object, with nothing after the last gene in use.
+    """
+    out = bytearray()
+    _canonical_aux(genes, 0, {}, out)
+    return bytes(out)
+
+
+def _canonical_aux(genes, i, known, out):
+    """Appends the simplified sub-tree at genes[i] to (out), returns its end."""
+    gene = genes[i]
+    if not is_test(gene):
+        out.append(gene)
+        return i + 1
+
+    right_start = subtree_end(genes, i + 1)
+    if gene in known:
+        if known[gene]:
+            _canonical_aux(genes, i + 1, known, out)
+            return subtree_end(genes, right_start)
+        return _canonical_aux(genes, right_start, known, out)
+
+    left = bytearray()
+    right = bytearray()
+    known[gene] = True
+    _canonical_aux(genes, i + 1, known, left)
+    known[gene] = False
+    end = _canonical_aux(genes, right_start, known, right)
+    del known[gene]
+
+    if left == right:
+        out.extend(left)
+    else:
+        out.append(gene)
+        out.extend(left)
+        out.extend(right)
+    return end
 
 
 class DecisionTree:
     """My decision tree class.
 
+    The tree is stored as a fixed length array of small integers (genes),
+    listing the nodes in pre-order, with any unused genes at the end set
+    to EMPTY. A gene below N_TESTS is a test node, and is the test's index
+    in tests.members. Anything else is an action node: N_TESTS plus the
+    action's index in actions.members. The left branch of a test is taken
+    if the test returns True.
+
+    The genes live in a slot of a GenomePool (genes is a memoryview of
+    it, slot_number says which), which goes back to the pool when the
+    tree is garbage collected, so don't hang on to a tree's genes without
+    hanging on to the tree. Anything changing the genes in place other
+    than through the tree has to call genes_changed afterwards.
+
     Public Members:
 
+    genes
+    pool
+    slot_number
+    node_count
     get_action
+    get_action_from_bits
+    walk_bits
+    get_action_uncompiled
     init_random
+    init_grow
     init_sane
     mutate
     copy
+    set_genes
+    genes_changed
+    encode
+    init_from_genes
+    genome_key
+    policy
     """
-    def __init__(self, owner, root=None):
-        self.root = root
+    def __init__(self, owner, genes=None, pool=None):
+        """Arguments:
+
+        owner
+            -- the monster the tree decides for
+        genes
+            -- the genes to start with (default None: all EMPTY)
+        pool
+            -- the GenomePool to keep the genes in (default default_pool)
+        """
+        if pool is None:
+            pool = default_pool
         self.owner = owner
-        self.node_count = 0 # used for mutation probability
-        self.node_list = [] # this is not really used
+        self.pool = pool
+        self.__slot = pool.allocate()
+        self.genes, self.__raw, self.slot_number = self.__slot
+        self.__size = 0
+        self.__right = None # index of each test's right branch, see get_right_branches
+        self.__compiled = None # see get_action
+        self.__genes_bytes = None # the genes as bytes, see __get_compiled
+        self.__key = None # see genome_key
+        self.__policy = None # see get_action_from_bits
+        if genes is not None:
+            self.set_genes(genes)
+
+
+    def __del__(self):
+        # the slot may never have been allocated if __init__ failed
+        slot = self.__dict__.get('_DecisionTree__slot')
+        if slot is not None:
+            self.pool.release(slot)
+
+
+    def __getstate__(self):
+        # memoryviews can't be pickled, the genes go as bytes
+        state = self.__dict__.copy()
+        for name in ('pool', 'genes', 'slot_number', '_DecisionTree__slot',
+                     '_DecisionTree__raw', '_DecisionTree__compiled', '_DecisionTree__policy'):
+            del state[name]
+        state['genes'] = self.encode()
+        return state
+
+
+    def __setstate__(self, state):
+        genes = state.pop('genes')
+        self.__dict__.update(state)
+        self.pool = default_pool
+        self.__slot = default_pool.allocate()
+        self.genes, self.__raw, self.slot_number = self.__slot
+        self.__compiled = None
+        self.__policy = None
+        self.set_genes(genes)
 
 
-    def get_action(self, game):
-        return self.get_action_aux(game, self.root)
+    @property
+    def node_count(self):
+        """(int) the number of genes in use, used for mutation probability"""
+        return self.__size
 
 
-    def get_action_aux(self, game, node):
-        # base case
-        if node.is_external:
-            return node.action
+    def set_genes(self, genes):
+        """Replaces the tree's genes, padding them out to the pool's slot size.
+
+        (genes) can be anything array('b', genes) takes, or bytes from encode.
+        Raises ValueError if they don't fit.
+        """
+        if not isinstance(genes, bytes):
+            genes = array('b', genes).tobytes()
+        size = genes.find(b'\xff')
+        if size < 0:
+            size = len(genes)
+        slot_size = len(self.__raw)
+        if size > slot_size:
+            raise ValueError("%d genes don't fit in %d" % (size, slot_size))
+        raw = self.__raw
+        raw[:size] = genes[:size]
+        raw[size:] = b'\xff' * (slot_size - size)
+        self.__size = size
+        self.__right = None
+        self.genes_changed()
+
+
+    def genes_changed(self):
+        """Forgets everything worked out from the genes' values.
+
+        For when the genes were changed in place without changing the
+        tree's shape (tests are still tests and actions still actions),
+        like mutate does.
+        """
+        self.__compiled = None
+        self.__genes_bytes = None
+        self.__key = None
+        self.__policy = None
+
+
+    def get_right_branches(self):
+        """Returns an array with the index of the right branch of every test node.
+
+        Left branches are free (it's the next gene), but finding the right
+        one means skipping the whole left sub-tree, so they are worked out
+        once and kept until the tree's shape changes.
+        """
+        if self.__right is None:
+            self.__right = array('h', [EMPTY]) * len(self.genes)
+            self.__index_aux(0)
+        return self.__right
+
+
+    def __index_aux(self, i):
+        """Fills in right branch indices for the sub-tree at i, returns its end."""
+        if not is_test(self.genes[i]):
+            return i + 1
+        right = self.__index_aux(i + 1)
+        self.__right[i] = right
+        return self.__index_aux(right)
 
-        else:
-            # choose left branch if test result is True (arbitrary)
-            if node.test(game, self.owner) is True:
-                return self.get_action_aux(game, node.left)
-            else:
-                return self.get_action_aux(game, node.right)
 
+    def get_action(self, game):
+        """Returns the action the tree chooses for its owner this turn.
+
+        Compiling a tree (see compile_tree) costs about as much as walking
+        it a hundred times, and most trees get mutated after a handful of
+        turns, so the genes are walked until trees with the same genes
+        have been asked for COMPILE_THRESHOLD actions between them, and
+        only then compiled. A single tree hardly ever lives that long,
+        but the genomes the population converges on do. The compiled
+        function is kept until the genes change.
+
+        If the game is evaluating tests in batches (see batch.py), the
+        results are already sitting there and the tests aren't called at all.
+        """
+        bits = game.perception.get_test_bits(self.owner)
+        if bits is not None:
+            return self.get_action_from_bits(bits)
+
+        decide = self.__compiled
+        if decide is None:
+            decide = self.__get_compiled()
+            if decide is None:
+                return self.get_action_uncompiled(game)
+        return decide(game, self.owner)
+
+
+    def __get_compiled(self):
+        """Returns the compiled tree if it exists or is worth making, None otherwise."""
+        key = self.__genes_bytes
+        if key is None:
+            key = self.__genes_bytes = self.genes.tobytes()
+        # maybe an identical tree has been compiled since
+        decide = _compiled_trees.get(key)
+        if decide is None:
+            calls = _walk_counts.get(key, 0) + 1
+            if calls >= COMPILE_THRESHOLD:
+                decide = compile_tree(self.genes)
+                del _walk_counts[key]
+            else:
+                if calls == 1 and len(_walk_counts) >= MAX_WALK_COUNTS:
+                    _walk_counts.clear()
+                _walk_counts[key] = calls
+        self.__compiled = decide
+        return decide
 
-    def get_left_node_at_depth(self, depth):
-        """Returns a list of all nodes at a given depth in the tree."""
-        return self.get_left_node_at_depth_aux(depth, self.root)
 
+    def get_action_from_bits(self, bits):
+        """Returns the action chosen when the test results are (bits).
 
-    def get_left_node_at_depth_aux(self, depth, node):
-        if depth == 0:
-            return node
+        Bit i of (bits) is the result of tests.members[i]. The answer comes
+        out of the genome's PolicyTable, and the genes are only walked the
+        first time a genome sees a combination of test results.
+        """
+        table = self.__policy
+        if table is None:
+            table = self.__policy = policy_table(self.genes)
+        action = table.actions[bits]
+        if action is None:
+            table.misses = table.misses + 1
+            action = table.actions[bits] = self.walk_bits(bits)
         else:
-            depth = depth - 1
-            return self.get_left_node_at_depth_aux(depth, node.left)
+            table.hits = table.hits + 1
+        return action
+
+
+    @property
+    def policy(self):
+        """(PolicyTable) the table get_action_from_bits looks actions up in"""
+        if self.__policy is None:
+            self.__policy = policy_table(self.genes)
+        return self.__policy
+
+
+    def walk_bits(self, bits):
+        """Same as get_action_from_bits, but always walks the genes."""
+        genes = self.genes
+        right = self.get_right_branches()
+        i = 0
+        gene = genes[0]
+        while 0 <= gene < N_TESTS:
+            if (bits >> gene) & 1:
+                i = i + 1
+            else:
+                i = right[i]
+            gene = genes[i]
+        return actions.members[gene - N_TESTS]
+
+
+    def get_action_uncompiled(self, game):
+        """Same as get_action, but walks the genes instead of compiling them."""
+        genes = self.genes
+        right = self.get_right_branches()
+        i = 0
+        gene = genes[0]
+        while 0 <= gene < N_TESTS:
+            # choose left branch if test result is True (arbitrary)
+            if tests.members[gene](game, self.owner) is True:
+                i = i + 1
+            else:
+                i = right[i]
+            gene = genes[i]
+        return actions.members[gene - N_TESTS]
+
+
+    def get_action_profiled(self, game, profiler):
+        """Same as get_action_uncompiled, timing every test with (profiler)."""
+        genes = self.genes
+        right = self.get_right_branches()
+        clock = profiler.clock
+        i = 0
+        gene = genes[0]
+        while 0 <= gene < N_TESTS:
+            test = tests.members[gene]
+            start = clock()
+            result = test(game, self.owner)
+            profiler.add("test", test.__name__, clock() - start)
+            if result is True:
+                i = i + 1
+            else:
+                i = right[i]
+            gene = genes[i]
+        return actions.members[gene - N_TESTS]
 
 
-    def init_random(self, test_set=tests.members, action_set=actions.members):
+    def init_random(self, test_set=tests.members, action_set=actions.members, rng=random):
         """Initializes the tree randomly from a set of tests and actions.
 
         Right now the tree is just sort of a linear affair with each node
         having a left branch to another test and a right branch to an action.
         Less than ideal?
+
+        The choices are made with (rng), a random.Random (default: the
+        random module's).
         """
-        self.root = self.init_random_aux(test_set, action_set)
+        genes = []
+        self.init_random_aux(test_set, action_set, genes, rng)
+        self.set_genes(genes)
+
+
+    def init_grow(self, max_depth=MAX_DEPTH, max_nodes=MAX_NODES, p_test=0.5, rng=random):
+        """Initializes the tree as a random tree of any shape.
 
+        This is the "grow" method from GP: every node is a random test with
+        probability (p_test), or a random action, except that it's always
+        an action at (max_depth), or when another test wouldn't fit in
+        (max_nodes). Tests can show up more than once.
 
-    def init_random_aux(self, test_set, action_set):
-        """Should return the top node of the tree."""
+        The choices are made with (rng), a random.Random (default: the
+        random module's).
+        """
+        genes = []
+        # every node still to be made, as its depth; a test adds two
+        pending = [0]
+        while pending:
+            depth = pending.pop()
+            # a test needs at least its own two leaves after it
+            room = max_nodes - len(genes) - len(pending) >= 3
+            if depth < max_depth and room and rng.random() < p_test:
+                genes.append(rng.randrange(N_TESTS))
+                pending.append(depth + 1)
+                pending.append(depth + 1)
+            else:
+                genes.append(N_TESTS + rng.randrange(N_ACTIONS))
+        self.set_genes(genes)
+
+
+    def init_random_aux(self, test_set, action_set, genes, rng=random):
+        """Appends the genes of a random sub-tree to (genes)."""
         # base case is tests is empty, meaning all have been used,
         # so we make an action node instead
         if not test_set:
-            action = random.choice(action_set)
-            node = DTreeNode(self, action)
-            return node
+            genes.append(action_gene(rng.choice(action_set)))
 
         else:
             # choose a test
-            test = random.choice(test_set)
+            test = rng.choice(test_set)
+            genes.append(test_gene(test))
 
             # make a new list of tests without the one used here
             new_tests = list(test_set)
             new_tests.remove(test)
 
             # the left branch is another test, the right branch is an action
-            left = self.init_random_aux(new_tests, action_set)
-            right = self.init_random_aux([], action_set)
-
-            node = DTreeNode(self, None, test, left, right)
-            return node
+            self.init_random_aux(new_tests, action_set, genes, rng)
+            self.init_random_aux([], action_set, genes, rng)
 
 
     def init_sane(self):
         """Generates a tree manually for testing."""
-        self.root = DTreeNode(self, None, tests.less_than_half_life)
-        self.root.left = DTreeNode(self, actions.run_away)
-        #self.root.right = DTreeNode(actions.move_towards_player)
-
-        # for testing "adjacent_to_player"
-        self.root.right = DTreeNode(self, None, tests.adjacent_to_player)
-        self.root.right.left = DTreeNode(self, actions.attack_player)
-        self.root.right.right = DTreeNode(self, actions.move_towards_player)
-
-
-    def mutate(self, probability=(1.0 / (float(MAX_DEPTH) * 2.0 + 1.0))):
-        """Randomly moves some nodes around."""
-        self.__mutate_aux(probability, self.root)
-
-
-    def __mutate_aux(self, probability, node):
-        """Recursive version of mutate."""
-        # decide whether to mutate
-        if random.uniform(0, 1) < probability:
-            mutate = True
-        else:
-            mutate = False
-
-        # base case
-        if node.is_external:
-            # choose a new action randomly
-            if mutate:
-                node.action = random.choice(actions.members)
-            return
-        else:
-            # choose a new test randomly, do recursive calls regardless
-            # of whether a mutation happened:
-            if mutate:
-                node.test = random.choice(tests.members)
-            self.__mutate_aux(probability, node.left)
-            self.__mutate_aux(probability, node.right)
-            return
+        self.set_genes([
+            test_gene(tests.less_than_half_life),
+                action_gene(actions.run_away),
+                # for testing "adjacent_to_player"
+                test_gene(tests.adjacent_to_player),
+                    action_gene(actions.attack_player),
+                    action_gene(actions.move_towards_player)
+        ])
+
+
+    def mutate(self, probability=(1.0 / (float(MAX_DEPTH) * 2.0 + 1.0)), rng=random):
+        """Randomly changes some nodes.
+
+        Tests are only ever replaced by tests and actions by actions,
+        so the shape of the tree stays the same. The dice are rolled with
+        (rng), a random.Random (default: the random module's).
+        """
+        genes = self.genes
+        for i in range(self.node_count):
+            if rng.uniform(0, 1) < probability:
+                if is_test(genes[i]):
+                    genes[i] = rng.randrange(N_TESTS)
+                else:
+                    genes[i] = N_TESTS + rng.randrange(N_ACTIONS)
+                self.genes_changed()
 
 
     def copy(self):
         """Returns a copy of the Tree"""
-        cpy = DecisionTree(self.owner)
-        cpy.root = self.root.copy_recursive(cpy)
+        cpy = DecisionTree(self.owner, pool=self.pool)
+        cpy.__raw[:] = self.__raw
+        cpy.__size = self.__size
+        cpy.__right = self.__right # never modified in place, safe to share
+        cpy.__compiled = self.__compiled
+        cpy.__genes_bytes = self.__genes_bytes
+        cpy.__key = self.__key
+        cpy.__policy = self.__policy
         return cpy
 
 
-class DTreeNode:
-    """My decision tree node class.
+    def encode(self):
+        """Returns the tree as a string of bytes, for sending to other processes.
 
-    It can take two forms:
-
-    Form 1: A binary test with two leaf nodes
-    Form 2: An action function, with no test or leaves
-    """
-    def __init__(self, parent_tree, action=None, test=None, left=None, right=None):
-        """init function!
-
-        You have to pass a parent_tree so that Tree's node_count can be
-        incremented.
+        This is just the genes that are in use.
         """
-        self.action = action
-
-        self.test = test
-        self.left = left
-        self.right = right
-
-        self.parent_tree = parent_tree
-        parent_tree.node_count = parent_tree.node_count + 1
-        parent_tree.node_list.append(self)
+        return self.__raw[:self.__size].tobytes()
 
 
-    @property
-    def is_external(self):
-        """Returns True if the node is an action node (form 2)."""
-        # if this is ever wrong, the tree was generated wrong
-        if self.action is not None:
-            return True
-        else:
-            return False
+    def init_from_genes(self, genes):
+        """Initializes the tree from the output of encode."""
+        self.set_genes(bytes(genes))
 
 
-    def copy_recursive(self, parent_tree):
-        """Returns a copy of the node referencing new copies of its leaves."""
-        if self.is_external:
-            left = None
-            right = None
-        else:
-            left = self.left.copy_recursive(parent_tree)
-            right = self.right.copy_recursive(parent_tree)
+    def genome_key(self):
+        """Returns a bytes object that's the same for all trees that act the same.
 
-        cpy = DTreeNode(parent_tree, self.action, self.test, left, right)
-        return cpy
+        See canonical_genes. Used to look genomes up in a FitnessCache.
+        """
+        if self.__key is None:
+            self.__key = canonical_genes(self.genes)
+        return self.__key
@@ -0,0 +1,88 @@
+"""
+genome_pool.py
+
+Preallocated storage for decision tree genes.
+
+Every generation a handful of trees are bred and the ones they replace
+are thrown away, and with a few thousand frogs that's a lot of little
+gene arrays being made and freed. A GenomePool instead hands out
+fixed-size slots cut out of big chunks of memory, and takes them back
+when a tree is done with them, so after the first generation breeding
+doesn't allocate gene storage at all.
+
+A slot is handed out as a pair of memoryviews of the same bytes: one of
+signed bytes (format 'b', what DecisionTree.genes is, so EMPTY reads as
+-1) and one of unsigned bytes for copying raw bytes in and out, plus the
+slot's number.
+
+All the chunks are kept in chunks, for anything that wants to work on
+every genome at once (see variation.py): slot number n is the n %
+chunk_slots'th slot of chunks[n // chunk_slots].
+
+members:
+
+GenomePool
+"""
+
+
+class GenomePool:
+    """Hands out fixed-size slots for genes, and takes them back.
+
+    Public Members:
+
+    slot_size
+    chunk_slots
+    chunks
+    allocate
+    release
+    free_slots
+    """
+    def __init__(self, slot_size, chunk_slots=256, fill=0xff):
+        """Arguments:
+
+        slot_size
+            -- bytes per slot
+        chunk_slots
+            -- slots per chunk of memory; the pool grows a chunk at a time
+               (default 256)
+        fill
+            -- what a freshly allocated slot is filled with (default 0xff,
+               i.e. -1 as a signed byte)
+        """
+        self.slot_size = slot_size
+        self.chunk_slots = chunk_slots
+        self.chunks = []
+        self.__blank = bytes([fill]) * slot_size
+        self.__free = []
+
+
+    def allocate(self):
+        """Returns a blank slot, as a (signed view, unsigned view, number) tuple."""
+        if not self.__free:
+            self.__grow()
+        slot = self.__free.pop()
+        slot[1][:] = self.__blank
+        return slot
+
+
+    def release(self, slot):
+        """Gives a slot from allocate back. Nothing may use it afterwards."""
+        self.__free.append(slot)
+
+
+    @property
+    def free_slots(self):
+        """(int) slots that are ready to be handed out"""
+        return len(self.__free)
+
+
+    def __grow(self):
+        size = self.slot_size
+        chunk = bytearray(size * self.chunk_slots)
+        first = len(self.chunks) * self.chunk_slots
+        self.chunks.append(chunk)
+        view = memoryview(chunk)
+        # popped from the end, so put them on backwards to hand them out in order
+        for i in range(self.chunk_slots - 1, -1, -1):
+            raw = view[i * size:(i + 1) * size]
+            self.__free.append((raw.cast('b'), raw, first + i))
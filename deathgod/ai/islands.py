@@ -0,0 +1,202 @@
+"""
+islands.py
+
+Island model GA: several populations evolving side by side.
+
+Every island is a separate process running its own headless Arena, so
+a long run can use every core, and the populations drift off in
+different directions instead of all converging on the same tree. Every
+migration_interval generations, each island sends copies of its best
+trees to the next island over (in a ring), where they replace the
+worst ones.
+
+Migrants travel over multiprocessing Queues. Sending never waits for
+the other end, and an island only takes whatever migrants have already
+arrived, so no island ever sits around waiting for another to catch up.
+
+Each island seeds its arena with a child seed of the master seed (see
+rng.py). That makes each island's own evolution repeatable, but since
+migrants arrive whenever they arrive, a seeded run with migration can
+still turn out differently.
+
+Given a telemetry path, each island writes its own records (see
+telemetry.py) to the path with its number in front of the extension,
+e.g. run.csv becomes run.0.csv, run.1.csv and so on.
+
+If an island fails, the others are stopped and run_islands raises an
+IslandError with the island's traceback, rather than waiting forever
+for a report that's never coming.
+
+members:
+
+run_islands
+island_telemetry_path
+IslandError
+"""
+
+import os
+import queue
+import traceback
+import multiprocessing
+from .. import settings
+from .. import rng
+from .arena import Arena, forget_inherited_handlers
+from .fitness_cache import FitnessCache
+from .telemetry import TelemetryWriter
+
+# seconds between checks that the islands are still alive
+_POLL_INTERVAL = 1.0
+
+
+class IslandError(Exception):
+    """Raised by run_islands when an island fails."""
+    pass
+
+
+def run_islands(islands=4, generations=100, migration_interval=10, migrants=2,
+                monster_count=30, eval_interval=5,
+                world_dimensions=settings.world_dimensions, batched=False, seed=None,
+                player=None, telemetry=None, cache_size=0, cache_age=None):
+    """Evolves (islands) populations in parallel and returns how they ended up.
+
+    Returns a list with a dictionary per island, in island order:
+
+    {
+        'island': the island's number
+        'generations': generations run
+        'migrants_received': how many trees moved in from the neighbor
+        'best_fitness': the fitness of the best monster at the end
+        'best_genomes': the (migrants) best trees, DecisionTree.encode() strings
+    }
+
+    Arguments:
+
+    islands
+        -- how many populations (and processes) (default 4)
+    generations
+        -- how many generations each island runs (default 100)
+    migration_interval
+        -- generations between migrations (default 10)
+    migrants
+        -- how many trees each island sends per migration (default 2)
+    seed
+        -- the master seed, each island gets a child seed of it (default None)
+    telemetry
+        -- where to write telemetry, one file per island (see
+           island_telemetry_path), or None for none (default None)
+    cache_size
+        -- if more than 0, each island selects by mean fitness per genome
+           with its own fitness_cache.FitnessCache of this size (default 0)
+    cache_age
+        -- passed on to the FitnessCaches (default None)
+
+    The rest are passed on to each island's Arena.
+
+    Raises IslandError if any island fails.
+    """
+    inboxes = [multiprocessing.Queue() for i in range(islands)]
+    results = multiprocessing.Queue()
+    config = (generations, migration_interval, migrants, monster_count,
+              eval_interval, world_dimensions, batched, seed, player, telemetry,
+              cache_size, cache_age)
+
+    processes = []
+    for i in range(islands):
+        # a ring: everybody sends to the next island over
+        outbox = inboxes[(i + 1) % islands]
+        proc = multiprocessing.Process(target=_island_main,
+                                       args=(i, inboxes[i], outbox, results, config))
+        proc.start()
+        processes.append(proc)
+
+    # results have to be taken off the queue before joining, or the
+    # islands can't finish putting them there
+    reports = []
+    try:
+        while len(reports) < islands:
+            try:
+                report = results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                # an island that died outright (killed, out of memory) never reports
+                for i, proc in enumerate(processes):
+                    if proc.exitcode is not None and proc.exitcode != 0:
+                        raise IslandError("island %d exited with code %d" % (i, proc.exitcode))
+                continue
+            if 'error' in report:
+                raise IslandError("island %d failed:\n%s" % (report['island'], report['error']))
+            reports.append(report)
+    except BaseException:
+        for proc in processes:
+            proc.terminate()
+        for proc in processes:
+            proc.join()
+        raise
+    for proc in processes:
+        proc.join()
+
+    reports.sort(key=lambda r: r['island'])
+    return reports
+
+
+def _island_main(index, inbox, outbox, results, config):
+    """What each island process runs."""
+    try:
+        _run_island(index, inbox, outbox, results, config)
+    except Exception:
+        results.put({'island': index, 'error': traceback.format_exc()})
+    # the next island may already be done and never read its last migrants,
+    # which must not keep this process from exiting
+    outbox.cancel_join_thread()
+
+
+def _run_island(index, inbox, outbox, results, config):
+    """Evolves the island's population and puts its report on (results)."""
+    (generations, migration_interval, migrants, monster_count,
+     eval_interval, world_dimensions, batched, seed, player, telemetry,
+     cache_size, cache_age) = config
+
+    forget_inherited_handlers()
+    fitness_cache = None
+    if cache_size > 0:
+        fitness_cache = FitnessCache(cache_size, cache_age)
+    arena = Arena(monster_count, eval_interval, world_dimensions, batched=batched,
+                  fitness_cache=fitness_cache, seed=rng.child_seed(seed, "island", index),
+                  player=player)
+    ga_test = arena.ga_test
+    if telemetry is not None:
+        ga_test.telemetry = TelemetryWriter(island_telemetry_path(telemetry, index))
+    received = 0
+
+    while ga_test.generations < generations:
+        arena.run(min(migration_interval, generations - ga_test.generations))
+        if ga_test.generations >= generations:
+            break
+
+        outbox.put(ga_test.best_genomes(migrants))
+
+        # take whatever has shown up so far, don't wait for anything
+        while True:
+            try:
+                genomes = inbox.get_nowait()
+            except queue.Empty:
+                break
+            ga_test.immigrate(genomes)
+            received = received + len(genomes)
+
+    results.put({
+        'island': index,
+        'generations': ga_test.generations,
+        'migrants_received': received,
+        'best_fitness': max(mon.fitness for mon in ga_test.monsters),
+        'best_genomes': ga_test.best_genomes(migrants)
+    })
+
+    arena.close()
+    if ga_test.telemetry is not None:
+        ga_test.telemetry.close()
+
+
+def island_telemetry_path(path, index):
+    """Returns where island number (index) writes the telemetry meant for (path)."""
+    root, extension = os.path.splitext(path)
+    return "%s.%d%s" % (root, index, extension)
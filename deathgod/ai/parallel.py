@@ -0,0 +1,164 @@
+"""
+parallel.py
+
+Evaluates a GA population on several cores at once.
+
+GATest normally scores all its frogs in one shared map, on one core.
+A ParallelEvaluator instead splits the population into shards and
+sends each shard to a worker process in a multiprocessing Pool. Every
+worker keeps its own headless Arena around (one per shard size it has
+been sent), drops the shard's decision trees into its frogs, simulates
+a number of turns and sends back each frog's (damage_dealt, kills,
+got_killed). fitness() and breed() still happen centrally, in
+GATest.next_generation.
+
+Every shard starts from a fresh arena (see Arena.scatter) seeded with a
+child seed of the evaluator's seed, the evaluation count and the shard
+number, so the results don't depend on which worker got which shard.
+
+Decision trees cross the process boundary as DecisionTree.encode()
+strings, since the trees themselves reference their owner, and through
+it the whole game.
+
+members:
+
+ParallelEvaluator
+"""
+
+import multiprocessing
+from .. import settings
+from .. import rng
+from . import genetic
+from .arena import Arena, forget_inherited_handlers
+
+
+class ParallelEvaluator:
+    """Farms out fitness evaluation to a pool of worker processes.
+
+    Public Members:
+
+    processes
+    shards
+    eval_interval
+    seed
+    evaluate
+    close
+    """
+    def __init__(self, processes=None, shards=None, eval_interval=5,
+                 world_dimensions=settings.world_dimensions, seed=None, player=None,
+                 context=None):
+        """Arguments:
+
+        processes
+            -- number of worker processes (default: one per core)
+        shards
+            -- how many pieces to cut the population into. More shards than
+               processes evens out the load a bit, at the cost of smaller
+               arenas. (default: same as processes)
+        eval_interval
+            -- how many turns each shard is simulated for (default 5)
+        world_dimensions
+            -- the size of the workers' maps (default settings.world_dimensions)
+        seed
+            -- the master seed for the shards' random number generators
+               (default None: different every time)
+        player
+            -- the name of the player controller the workers' arenas use
+               (see player_controllers.py) (default None: the player stands still)
+        context
+            -- the multiprocessing context to start the workers with, e.g.
+               multiprocessing.get_context("spawn") (default None: the
+               platform's default)
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if shards is None:
+            shards = processes
+        self.processes = processes
+        self.shards = shards
+        self.eval_interval = eval_interval
+        self.seed = seed
+        self.__evaluations = 0
+        if context is None:
+            context = multiprocessing
+        self.__pool = context.Pool(processes, _init_worker, (world_dimensions, player))
+
+
+    def evaluate(self, trees, turns=None):
+        """Simulates every tree in (trees) and returns their results.
+
+        Returns a list of (damage_dealt, kills, got_killed) tuples in the
+        same order as (trees).
+
+        Arguments:
+
+        trees
+            -- a list of DecisionTrees
+        turns
+            -- how many turns to simulate (default self.eval_interval)
+        """
+        if turns is None:
+            turns = self.eval_interval
+
+        self.__evaluations = self.__evaluations + 1
+        genes = [tree.encode() for tree in trees]
+        shard_count = min(self.shards, len(genes))
+        tasks = []
+        for i in range(shard_count):
+            # split as evenly as possible, keeping the order intact
+            start = i * len(genes) // shard_count
+            end = (i + 1) * len(genes) // shard_count
+            seed = rng.child_seed(self.seed, self.__evaluations, i)
+            tasks.append((genes[start:end], turns, seed))
+
+        results = []
+        for shard_results in self.__pool.map(_evaluate_shard, tasks, chunksize=1):
+            results.extend(shard_results)
+        return results
+
+
+    def close(self):
+        """Shuts down the worker processes."""
+        self.__pool.close()
+        self.__pool.join()
+
+
+# worker process state
+_world_dimensions = None
+_player = None
+# one arena, whatever the shard size (with a fitness cache it changes every
+# generation), with frogs spawned or removed to fit
+_arena = None
+
+def _init_worker(world_dimensions, player):
+    """Sets up a worker process."""
+    global _world_dimensions, _player
+    _world_dimensions = world_dimensions
+    _player = player
+    forget_inherited_handlers()
+
+
+def _evaluate_shard(task):
+    """Runs one shard of the population in this worker's arena."""
+    global _arena
+    genes_list, turns, seed = task
+
+    arena = _arena
+    if arena is None:
+        arena = _arena = Arena(len(genes_list), turns, _world_dimensions, player=_player)
+        # the frogs still need respawning when they die, but breeding
+        # happens back in the parent process
+        arena.ga_test.evolving = False
+    else:
+        arena.ga_test.set_population(len(genes_list))
+
+    monsters = arena.ga_test.monsters
+    for mon, genes in zip(monsters, genes_list):
+        mon.d_tree = genetic.DecisionTree(mon)
+        mon.d_tree.init_from_genes(genes)
+        mon.reset()
+    arena.scatter(seed)
+
+    arena.run_turns(turns)
+
+    return [(mon.damage_dealt, mon.kills, mon.got_killed) for mon in monsters]
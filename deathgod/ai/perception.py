@@ -0,0 +1,154 @@
+"""
+perception.py
+
+What the AI knows about the world on a given turn.
+
+The functions in tests.py used to work everything out from scratch for
+every monster, every turn: building lists of adjacent coordinates,
+scanning slices of the map for friends, reading the player's stats.
+Game.end_turn now calls Perception.update once at the start of every
+turn, which takes a snapshot of the player-relative facts and buckets
+every entity on the map by position, so the tests can just look things
+up.
+
+Note that the snapshot is taken before anybody acts, so things that move
+during the turn (other monsters) are seen where they were at the start
+of it. The player doesn't move while the monsters act, but the player's
+hp does change when they get hit, so anything depending on it should
+still read it from the player.
+
+Perception also owns the flow field the movement actions use (see
+flow_field.py), and brings it up to date in update.
+
+Nothing needs to know anything when a recorded game is being replayed
+(see replay.py), so update does nothing if enabled is False.
+
+If enable_batch is called, update also evaluates every test for every
+monster with a decision tree in one go with NumPy (see batch.py), and
+get_test_bits hands out the results.
+
+members:
+
+Perception
+BUCKET_SIZE
+"""
+
+from ..ordered_pair import x, y
+from .flow_field import FlowField
+
+# size of the squares entities are bucketed into for count_nearby
+BUCKET_SIZE = 8
+
+
+class Perception:
+    """A per-turn snapshot of the world for the AI to use.
+
+    Public Members:
+
+    turn
+    enabled
+    player_position
+    player_defense
+    flow_field
+    batch
+    update
+    enable_batch
+    get_test_bits
+    player_distance
+    count_nearby
+    """
+    def __init__(self, game):
+        self.game = game
+        self.turn = 0
+        self.enabled = True
+        self.player_position = (0, 0)
+        self.player_defense = 0
+        self.flow_field = FlowField()
+        self.batch = None
+        self.__buckets = {}
+        self.__test_bits = {}
+
+
+    def enable_batch(self):
+        """Turns on batched test evaluation. Needs NumPy."""
+        from .batch import TestBatch
+        self.batch = TestBatch()
+
+
+    def update(self):
+        """Takes the snapshot. Called by Game.end_turn before any entity acts."""
+        if not self.enabled:
+            return
+        game = self.game
+        player = game.get_player()
+        self.turn = self.turn + 1
+        self.player_position = (player.position[x], player.position[y])
+        self.player_defense = player.defense
+        self.flow_field.update(game.get_map(), self.player_position)
+
+        # bucket everything on the map by position, keeping a copy of the
+        # position since it'll change if the entity moves
+        buckets = {}
+        for entities in (game.active_entities, game.inactive_entities):
+            for ent in entities:
+                pos = ent.position
+                key = (pos[x] // BUCKET_SIZE, pos[y] // BUCKET_SIZE)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = []
+                bucket.append((pos[x], pos[y], ent.type))
+        self.__buckets = buckets
+
+        if self.batch is not None:
+            dormancy = game.dormancy
+            characters = [ent for ent in game.active_entities
+                          if getattr(ent, "d_tree", None) is not None
+                          and not dormancy.is_parked(ent)]
+            bits = self.batch.evaluate_bits(game, characters)
+            self.__test_bits = dict(zip(characters, bits))
+
+
+    def get_test_bits(self, ch):
+        """Returns the results of all of tests.members for ch packed into an int.
+
+        Bit i is set if tests.members[i] was True for ch at the start of the
+        turn. Returns None unless batched evaluation is on and ch was part
+        of the batch.
+        """
+        return self.__test_bits.get(ch)
+
+
+    def player_distance(self, ch):
+        """(int) How many moves (diagonals included) ch is from the player."""
+        dx = ch.position[x] - self.player_position[x]
+        dy = ch.position[y] - self.player_position[y]
+        if dx < 0:
+            dx = -dx
+        if dy < 0:
+            dy = -dy
+        if dx > dy:
+            return dx
+        return dy
+
+
+    def count_nearby(self, ch, radius, ent_type):
+        """(int) Counts the entities of type (ent_type) within (radius) of ch.
+
+        "Within" means in the square reaching (radius) tiles out from ch in
+        every direction, as in Game.get_nearby_entities. If ch is of that
+        type, it counts itself.
+        """
+        pos_x = ch.position[x]
+        pos_y = ch.position[y]
+        buckets = self.__buckets
+        count = 0
+        for b_x in range((pos_x - radius) // BUCKET_SIZE, (pos_x + radius) // BUCKET_SIZE + 1):
+            for b_y in range((pos_y - radius) // BUCKET_SIZE, (pos_y + radius) // BUCKET_SIZE + 1):
+                bucket = buckets.get((b_x, b_y))
+                if bucket is None:
+                    continue
+                for e_x, e_y, e_type in bucket:
+                    if e_type == ent_type and -radius <= e_x - pos_x <= radius \
+                            and -radius <= e_y - pos_y <= radius:
+                        count = count + 1
+        return count
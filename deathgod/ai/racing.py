@@ -0,0 +1,254 @@
+"""
+racing.py
+
+Stops evaluating frogs once they're obviously losing.
+
+Normally every tree gets eval_interval turns, even one that stands in
+a corner and waits for death. A RacingEvaluator evaluates in short
+rounds instead, all the frogs playing together in an arena of its own:
+
+1. every frog still in the race plays round_turns more turns
+2. each frog's fitness per turn so far gets a confidence interval
+   (mean +/- confidence standard errors)
+3. a frog is taken off the map if even the top of its interval is below
+   the bottom of the interval of the frog ranked in the middle, i.e.
+   it's clearly in the bottom half, which is all selection cares about
+4. at most half the frogs (the best, by mean) go on to the next round
+   (successive halving), and only as many as the turns left can cover
+5. repeat until the budget runs out or only one frog is left
+
+So the close contenders get the turns the hopeless trees didn't. The
+frogs aren't put back at the start between rounds, so the turns spent
+walking up to the player only have to be paid for once.
+
+Most frogs don't score at all in the first few rounds, so step 3
+mostly kicks in on long evaluations; step 4 does most of the saving. In a 60 frog,
+20 turn test, a budget of 0.5 picked a better top half than plain
+evaluations of the same cost, and came close to full length ones.
+
+Fitness is scored per turn, the same way genetic.fitness scores a
+whole evaluation, and the results handed back are scaled to what the
+frog would have done in eval_interval turns, so it's a drop-in evaluator
+for an Arena.
+
+members:
+
+RacingEvaluator
+"""
+
+import math
+from .. import settings
+from .. import rng
+from . import genetic
+from .arena import Arena
+
+
+class RacingEvaluator:
+    """Evaluates a population in rounds, dropping dominated trees early.
+
+    Public Members:
+
+    eval_interval
+    round_turns
+    budget
+    confidence
+    seed
+    frog_turns
+    plain_frog_turns
+    evaluate
+    close
+    """
+    def __init__(self, eval_interval=5, world_dimensions=settings.world_dimensions,
+                 seed=None, round_turns=None, budget=0.5, confidence=1.0, player=None):
+        """Arguments:
+
+        eval_interval
+            -- the turns a plain evaluation would give each tree, results
+               are scaled to this (default 5)
+        world_dimensions
+            -- the size of the racing arena's map (default settings.world_dimensions)
+        seed
+            -- the master seed for the racing arena (default None)
+        round_turns
+            -- turns per round (default: a quarter of eval_interval, at least 1)
+        budget
+            -- the most frog-turns to spend, as a fraction of what a plain
+               evaluation would spend (default 0.5)
+        confidence
+            -- how many standard errors wide the confidence intervals are.
+               Bigger drops fewer trees. (default 1.0)
+        player
+            -- the player controller for the racing arena, see Arena
+               (default None: the player stands still)
+        """
+        if round_turns is None:
+            round_turns = max(1, eval_interval // 4)
+        self.eval_interval = eval_interval
+        self.round_turns = round_turns
+        self.budget = budget
+        self.confidence = confidence
+        self.seed = seed
+        # turns each frog was simulated, summed, over every evaluation so far,
+        # and what plain evaluations would have cost
+        self.frog_turns = 0
+        self.plain_frog_turns = 0
+        self.__world_dimensions = world_dimensions
+        self.__player = player
+        self.__arena = None # resized to fit, like the parallel evaluator's workers
+        self.__evaluations = 0
+
+
+    def evaluate(self, trees, turns=None):
+        """Races the trees. Returns a (damage_dealt, kills, got_killed) per tree.
+
+        damage_dealt and kills are the frog's totals scaled to (turns),
+        rounded, since they're counts everywhere else (e.g. checkpoints).
+        got_killed is True if the frog died more often than once every
+        (turns) turns.
+
+        Arguments:
+
+        trees
+            -- a list of DecisionTrees
+        turns
+            -- the evaluation length to scale the results to
+               (default self.eval_interval)
+        """
+        if turns is None:
+            turns = self.eval_interval
+        n = len(trees)
+        budget = int(self.budget * n * turns)
+        round_turns = self.round_turns
+
+        arena = self.__get_arena(n)
+        game = arena.game
+        monsters = arena.ga_test.monsters
+        for mon, tree in zip(monsters, trees):
+            mon.d_tree = genetic.DecisionTree(mon, tree.genes)
+            mon.reset()
+        self.__evaluations = self.__evaluations + 1
+        arena.scatter(rng.child_seed(self.seed, self.__evaluations))
+
+        # per frog: [turns played, damage, kills, deaths, fitness per turn of each round]
+        records = [[0, 0, 0, 0, []] for tree in trees]
+        racing = list(range(n))
+        dropped = []
+        spent = 0
+        while len(racing) > 1 or spent == 0:
+            # only as many as the budget still covers
+            affordable = (budget - spent) // round_turns
+            if affordable < 1:
+                break
+            if affordable < len(racing):
+                racing.sort(key=lambda i: _mean(records[i][4]), reverse=True)
+                racing, out = racing[:affordable], racing[affordable:]
+                self.__drop(game, monsters, out, dropped)
+
+            arena.run_turns(round_turns)
+            spent = spent + len(racing) * round_turns
+            for i in racing:
+                mon = monsters[i]
+                record = records[i]
+                record[0] = record[0] + round_turns
+                record[1] = record[1] + mon.damage_dealt
+                record[2] = record[2] + mon.kills
+                record[3] = record[3] + (1 if mon.got_killed else 0)
+                # genetic.fitness, per turn
+                record[4].append(float(genetic.fitness(mon)) / round_turns)
+                mon.reset()
+
+            survivors = self.__drop_dominated(racing, records)
+            # successive halving: at most half go on to the next round
+            keep = max(2, (len(racing) + 1) // 2)
+            if len(survivors) > keep:
+                survivors.sort(key=lambda i: _mean(records[i][4]), reverse=True)
+                survivors = survivors[:keep]
+            staying = set(survivors)
+            self.__drop(game, monsters, [i for i in racing if i not in staying], dropped)
+            racing = survivors
+
+        # put the arena back together for next time
+        for mon in dropped:
+            game.add_entity(mon)
+            game.activate_entity(mon)
+
+        self.frog_turns = self.frog_turns + spent
+        self.plain_frog_turns = self.plain_frog_turns + n * turns
+
+        results = []
+        for played, damage_dealt, kills, deaths, samples in records:
+            if played == 0:
+                # the budget didn't even cover one round for everybody
+                results.append((0, 0, False))
+                continue
+            scale = float(turns) / played
+            results.append((int(round(damage_dealt * scale)), int(round(kills * scale)),
+                            deaths * scale > 0.5))
+        return results
+
+
+    def __get_arena(self, size):
+        arena = self.__arena
+        if arena is None:
+            arena = self.__arena = Arena(size, self.eval_interval, self.__world_dimensions,
+                                         player=self.__player)
+            # the frogs still need respawning when they die, but breeding
+            # is up to whoever asked for the evaluation
+            arena.ga_test.evolving = False
+        else:
+            arena.ga_test.set_population(size)
+        return arena
+
+
+    def __drop(self, game, monsters, indexes, dropped):
+        """Takes the frogs at (indexes) out of the race (and off the map)."""
+        for i in indexes:
+            mon = monsters[i]
+            game.deactivate_entity(mon)
+            game.remove_entity(mon)
+            dropped.append(mon)
+
+
+    def __drop_dominated(self, racing, records):
+        """Returns the frogs in (racing) that aren't clearly in the bottom half."""
+        if len(racing) < 2:
+            return racing
+        samples = [records[i][4] for i in racing]
+
+        # a frog's own variance is useless after a couple of rounds, so
+        # everybody gets the average variance of the whole race
+        variances = [_variance(s) for s in samples if len(s) > 1]
+        if not variances:
+            return racing
+        variance = sum(variances) / len(variances)
+        if variance == 0.0:
+            return racing
+
+        bounds = []
+        for i, s in zip(racing, samples):
+            mean = _mean(s)
+            margin = self.confidence * math.sqrt(variance / len(s))
+            bounds.append((mean - margin, mean + margin, i))
+
+        # the lower bound of the frog in the middle of the ranking
+        ranked = sorted(bounds, key=lambda b: b[0] + b[1], reverse=True)
+        bar = ranked[(len(ranked) - 1) // 2][0]
+        return [i for lower, upper, i in bounds if upper >= bar]
+
+
+    def close(self):
+        """Closes the racing arena."""
+        if self.__arena is not None:
+            self.__arena.close()
+            self.__arena = None
+
+
+def _mean(samples):
+    if not samples:
+        return 0.0
+    return sum(samples) / len(samples)
+
+
+def _variance(samples):
+    mean = _mean(samples)
+    return sum((s - mean) ** 2 for s in samples) / (len(samples) - 1)
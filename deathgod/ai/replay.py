@@ -0,0 +1,350 @@
+"""
+replay.py
+
+Plays a recorded arena run (see recorder.py) again, fast.
+
+A Replayer builds the same Arena the log was recorded in and plays its
+turns again, except that nobody decides anything: every time a frog's
+AI (or the player's controller) would have had its turn, the moves and
+fights it decided on are read out of the log and done as they were.
+Perception is switched off, since only the AI looks at it. Everything
+else really happens again: regeneration, deaths, respawning, the whole
+GA (fitness, mutation, selection, breeding). The game's random number
+generator is a ReplayRandom, which draws the same numbers as the
+original did, skipping the ones the AI drew, and checks how many it
+drew against the log.
+
+Deciding (the decision trees and the perception snapshot behind them)
+is nearly all of what a turn costs, so a replay is many times faster
+than the run was. Once it's caught up to the point of interest, the
+replay can be let go (detach) and the arena carries on as a normal,
+live one, from exactly where the recording was at that point:
+
+python3 -m deathgod.ai.arena -s 1 -g 5000 --record run.log
+python3 -m deathgod.ai.replay run.log --turns 20000 --then 10
+
+Every record the game would have written is checked against the log
+as it's replayed, and a ReplayError is raised if they differ, e.g.
+because the code changed since the log was recorded.
+
+members:
+
+Replayer
+ReplayRandom
+ReplayError
+main
+"""
+
+import sys
+import time
+import random
+import itertools
+import argparse
+from .. import recorder
+from ..recorder import TURN, ACT, DONE, MOVE, COMBAT, ADD, BREED, REPLACE, DRAWS, STATE
+from .arena import Arena
+from .fitness_cache import FitnessCache
+
+
+class ReplayError(Exception):
+    """Raised when a replay doesn't do what the log says happened."""
+    pass
+
+
+class Replayer:
+    """Replays a recorded arena run. See the module docstring.
+
+    Public Members:
+
+    config
+    arena
+    game
+    records
+    turns
+    finished
+    run
+    detach
+    make_rng
+    attach
+    """
+    def __init__(self, path):
+        """Sets up the arena the log at (path) was recorded in.
+
+        Raises ValueError if (path) isn't a log.
+        """
+        with open(path, "rb") as f:
+            self.config = recorder.read_header(f)
+            data = f.read()
+        self.__records = recorder.read_records(data)
+        self.__next_record = next(self.__records, None)
+        self.records = 0
+        self.turns = 0
+        self.__ids = {}
+        self.__entities = []
+        self.__applying = None
+        self.__rng = None
+        self.__drawn = 0 # words drawn since the last record
+        self.game = None
+
+        config = self.config
+        fitness_cache = None
+        if config.get("cache_size", 0) > 0:
+            fitness_cache = FitnessCache(config["cache_size"], config.get("cache_age"))
+        self.arena = Arena(config["monsters"], config["eval_interval"],
+                           tuple(config["world"]), batched=config.get("batched", False),
+                           fitness_cache=fitness_cache, player=config.get("player"),
+                           recorder=self, dormancy=config.get("dormancy"))
+
+
+    def run(self, turns=None):
+        """Replays (turns) more turns, or the rest of the log if None.
+
+        Returns how many turns were replayed.
+        """
+        game = self.game
+        player = game.get_player()
+        played = 0
+        while not self.finished and (turns is None or played < turns):
+            # the player's turn: whatever its controller did, then the rest of the turn
+            self.__play(player, TURN)
+            game.end_turn()
+            self.arena.turns = self.arena.turns + 1
+            self.turns = self.turns + 1
+            played = played + 1
+        return played
+
+
+    @property
+    def finished(self):
+        """(bool) whether the whole log has been replayed"""
+        return self.__next_record is None
+
+
+    def detach(self):
+        """Stops replaying. The arena goes on from here as a live one."""
+        self.game.recorder = None
+        self.game.perception.enabled = True
+        self.__rng.replayer = None
+
+
+    def make_rng(self, seed=None):
+        """Returns the ReplayRandom for the game, in the log's first state."""
+        rng = ReplayRandom()
+        random.Random.setstate(rng, self.__expect(STATE)[1])
+        rng.replayer = self
+        self.__rng = rng
+        return rng
+
+
+    def attach(self, game):
+        """Starts replaying into (game). See Recorder.attach."""
+        self.game = game
+        game.recorder = self
+        game.perception.enabled = False
+        for ent in itertools.chain(game.active_entities, game.inactive_entities):
+            self.__number(ent)
+
+
+    # what the game calls, see Recorder
+
+    def ending_turn(self):
+        self.__expect(TURN)
+
+
+    def turn_ended(self):
+        self.__settle()
+
+
+    def acting(self, ch):
+        """Does what (ch)'s AI did. Returns False: the AI isn't asked again."""
+        record = self.__peek()
+        if record is None or record[0] != ACT or self.__entities[record[1]] is not ch:
+            # nothing was recorded, so it didn't do anything
+            return False
+        self.__take()
+        self.__play(ch, DONE)
+        self.__expect(DONE)
+        return False
+
+
+    def entity_added(self, ent):
+        number = self.__number(ent)
+        self.__check(self.__expect(ADD), (ADD, number, ent.position[0], ent.position[1]))
+
+
+    def moved(self, ent, destination):
+        if self.__applying is not None:
+            self.__applying = None
+            return
+        self.__check(self.__expect(MOVE),
+                     (MOVE, self.__ids[ent], destination[0], destination[1]))
+
+
+    def fought(self, attacker, victim, damage):
+        record = self.__applying
+        if record is not None:
+            self.__applying = None
+        else:
+            record = self.__expect(COMBAT)
+        self.__check(record, (COMBAT, self.__ids[attacker], self.__ids[victim], damage))
+
+
+    def bred(self, parent1, parent2):
+        self.__check(self.__expect(BREED), (BREED, self.__ids[parent1], self.__ids[parent2]))
+
+
+    def replaced(self, mon):
+        self.__check(self.__expect(REPLACE), (REPLACE, self.__ids[mon], mon.d_tree.encode()))
+
+
+    def drew(self, words):
+        self.__drawn = self.__drawn + words
+
+
+    def seeded(self, state):
+        # seeding from None is different every time, so the log is what counts
+        random.Random.setstate(self.__rng, self.__expect(STATE)[1])
+
+
+    def __play(self, ch, until):
+        """Does what (ch) decided, up to the next (until) record."""
+        game = self.game
+        entities = self.__entities
+        rng = self.__rng
+        while True:
+            record = self.__peek()
+            if record is None:
+                raise ReplayError("the log ended in the middle of a turn")
+            code = record[0]
+            if code == until:
+                return
+            self.__take()
+            if code == DRAWS:
+                # drawn while deciding, which isn't happening this time
+                random.Random.getrandbits(rng, 32 * record[1])
+            elif code == MOVE:
+                self.__applying = record
+                ent = entities[record[1]]
+                if not game.move_entity(ent, (record[2], record[3])):
+                    raise ReplayError("record %d: %s couldn't move to (%d, %d)" % (
+                        self.records, ent.name, record[2], record[3]))
+            elif code == COMBAT:
+                self.__applying = record
+                game.combat(entities[record[1]], entities[record[2]])
+            else:
+                raise ReplayError("record %d: %s while %s was deciding" % (
+                    self.records, code.decode(), ch.name))
+            if self.__applying is not None:
+                raise ReplayError("record %d: %s didn't happen" % (self.records, code.decode()))
+
+
+    def __number(self, ent):
+        number = self.__ids.get(ent)
+        if number is None:
+            number = self.__ids[ent] = len(self.__entities)
+            self.__entities.append(ent)
+        return number
+
+
+    def __check(self, record, expected):
+        if record != expected:
+            raise ReplayError("record %d: the log has %r, the replay did %r" % (
+                self.records, record, expected))
+
+
+    def __expect(self, code):
+        record = self.__take()
+        if record[0] != code:
+            raise ReplayError("record %d: expected %s, the log has %r" % (
+                self.records, code.decode(), record))
+        return record
+
+
+    def __settle(self):
+        """Checks the words drawn since the last record against the log."""
+        if self.__drawn:
+            drawn = self.__drawn
+            self.__drawn = 0
+            self.__check(self.__expect(DRAWS), (DRAWS, drawn))
+
+
+    def __peek(self):
+        if self.__drawn:
+            self.__settle()
+        return self.__next_record
+
+
+    def __take(self):
+        if self.__drawn:
+            self.__settle()
+        record = self.__next_record
+        if record is None:
+            raise ReplayError("the log ended in the middle of a turn")
+        self.__next_record = next(self.__records, None)
+        self.records = self.records + 1
+        return record
+
+
+class ReplayRandom(random.Random):
+    """A random.Random that counts what it draws, to check against the log.
+
+    The counterpart of recorder.RecordingRandom.
+    """
+    replayer = None
+
+    def random(self):
+        if self.replayer is not None:
+            self.replayer.drew(2)
+        return random.Random.random(self)
+
+
+    def getrandbits(self, k):
+        if self.replayer is not None:
+            self.replayer.drew((k + 31) // 32)
+        return random.Random.getrandbits(self, k)
+
+
+    def seed(self, a=None, version=2):
+        random.Random.seed(self, a, version)
+        if self.replayer is not None:
+            self.replayer.seeded(self.getstate())
+
+
+    def setstate(self, state):
+        random.Random.setstate(self, state)
+        if self.replayer is not None:
+            self.replayer.seeded(state)
+
+
+def main(argv=None):
+    """Replays a log from the command line and reports how fast it went."""
+    parser = argparse.ArgumentParser(description="Replay a recorded arena run.")
+    parser.add_argument("log")
+    parser.add_argument("-n", "--turns", type=int, default=None,
+                        help="stop after this many turns (default: the whole log)")
+    parser.add_argument("--then", type=int, default=0, metavar="GENERATIONS",
+                        help="carry on live for this many generations afterwards")
+    args = parser.parse_args(argv)
+
+    replayer = Replayer(args.log)
+    arena = replayer.arena
+    start = time.time()
+    turns = replayer.run(args.turns)
+    elapsed = time.time() - start
+    print("replayed %d turns (%d records, %d generations) in %.2f s: %.1f turns/s" % (
+        turns, replayer.records, arena.ga_test.generations, elapsed,
+        turns / max(elapsed, 1e-9)))
+
+    if args.then > 0:
+        replayer.detach()
+        start = time.time()
+        arena.run(args.then)
+        elapsed = time.time() - start
+        print("then %d generations live in %.2f s: %.1f generations/s" % (
+            args.then, elapsed, args.then / elapsed))
+    arena.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+telemetry.py
+
+Machine readable per-generation records for long GA runs.
+
+GATest only prints the average, worst and best fitness. Give it a
+TelemetryWriter and it also hands over one record per generation with
+the fitness distribution, how diverse the genomes are, how many trees
+were bred and replaced, and how long each phase of the generation took
+(see GATest.next_generation for what the phases are).
+
+Records are written as JSON lines, or as CSV if the file name ends in
+".csv". They're kept in memory and written out every buffer_size records,
+so writing them costs the GA loop next to nothing; call close (or flush)
+when the run is done.
+
+members:
+
+TelemetryWriter
+make_record
+FIELDS
+"""
+
+import csv
+import json
+import time
+
+# the fields of every record, in CSV column order
+FIELDS = [
+    "generation",
+    "timestamp",
+    "population",
+    "fitness_mean",
+    "fitness_stdev",
+    "fitness_min",
+    "fitness_p25",
+    "fitness_median",
+    "fitness_p75",
+    "fitness_max",
+    "unique_genomes",
+    "diversity",
+    "bred",
+    "replaced",
+    "time_simulation",
+    "time_fitness",
+    "time_mutation",
+    "time_breeding",
+    "time_total"
+]
+
+
+def make_record(generation, samples, genome_keys, bred, replaced, times):
+    """Builds a record for one generation.
+
+    Arguments:
+
+    generation
+        -- the generation number
+    samples
+        -- every monster's fitness
+    genome_keys
+        -- every monster's DecisionTree.genome_key()
+    bred
+        -- how many trees were picked to breed
+    replaced
+        -- how many monsters got a new tree
+    times
+        -- seconds spent on each phase: a dictionary with "simulation",
+           "fitness", "mutation" and "breeding" keys
+    """
+    ranked = sorted(samples)
+    n = len(ranked)
+    mean = float(sum(ranked)) / n
+    variance = sum((s - mean) ** 2 for s in ranked) / n
+    unique = len(set(genome_keys))
+
+    return {
+        "generation": generation,
+        "timestamp": time.time(),
+        "population": n,
+        "fitness_mean": mean,
+        "fitness_stdev": variance ** 0.5,
+        "fitness_min": ranked[0],
+        "fitness_p25": ranked[n // 4],
+        "fitness_median": ranked[n // 2],
+        "fitness_p75": ranked[(3 * n) // 4],
+        "fitness_max": ranked[-1],
+        "unique_genomes": unique,
+        "diversity": float(unique) / n,
+        "bred": bred,
+        "replaced": replaced,
+        "time_simulation": times["simulation"],
+        "time_fitness": times["fitness"],
+        "time_mutation": times["mutation"],
+        "time_breeding": times["breeding"],
+        "time_total": sum(times.values())
+    }
+
+
+class TelemetryWriter:
+    """Buffers telemetry records and writes them to a file.
+
+    Public Members:
+
+    path
+    write
+    flush
+    close
+    """
+    def __init__(self, path, buffer_size=100):
+        """Arguments:
+
+        path
+            -- the file to write to. Ends in ".csv" for CSV, anything else
+               gets JSON lines.
+        buffer_size
+            -- how many records to hold on to before writing (default 100)
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.__records = []
+        self.__file = open(path, "w", newline="")
+        if path.endswith(".csv"):
+            self.__csv = csv.DictWriter(self.__file, FIELDS)
+            self.__csv.writeheader()
+        else:
+            self.__csv = None
+
+
+    def write(self, record):
+        """Queues up a record (a dictionary with the keys in FIELDS)."""
+        self.__records.append(record)
+        if len(self.__records) >= self.buffer_size:
+            self.flush()
+
+
+    def flush(self):
+        """Writes out all the queued records."""
+        if self.__csv is not None:
+            self.__csv.writerows(self.__records)
+        else:
+            self.__file.writelines(json.dumps(r) + "\n" for r in self.__records)
+        self.__records = []
+        self.__file.flush()
+
+
+    def close(self):
+        """Writes out anything still queued and closes the file."""
+        self.flush()
+        self.__file.close()
@@ -5,9 +5,10 @@ by William Makley
 
 Contains a bunch of tests the genetic algorithm can use
 to assemble a decision tree AI
-"""
 
-from .. import game_map
+Anything that can be worked out once per turn instead of once per
+monster comes from game.perception (see perception.py).
+"""
 
 
 def full_life(game, ch):
@@ -41,18 +42,14 @@ def player_about_to_die(game, ch, threshold=5):
         return False
 
 def can_kill_player(game, ch):
-    if ch.offense - game.player.defense >= game.player.stats.hp:
+    # hp changes as the player gets hit, so it can't come from the snapshot
+    if ch.offense - game.perception.player_defense >= game.player.stats.hp:
         return True
     else:
         return False
 
 def friends_nearby(game, ch, threshold=3, radius=5):
-    entities = game.get_nearby_entities(ch, radius)
-    count = 0
-
-    for e in entities:
-        if e.type == ch.type:
-            count = count + 1
+    count = game.perception.count_nearby(ch, radius, ch.type)
 
     if count >= threshold:
         return True
@@ -61,15 +58,7 @@ def friends_nearby(game, ch, threshold=3, radius=5):
 
 
 def adjacent_to_player(game, ch):
-    pl_pos = game.player.position
-    ch_pos = ch.position
-
-    adj_coords = game_map.get_adjacent_coords(ch_pos)
-    for c in adj_coords:
-        if c == pl_pos:
-            return True
-
-    return False
+    return game.perception.player_distance(ch) == 1
 
 
 members = [full_life,
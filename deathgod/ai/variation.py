@@ -0,0 +1,124 @@
+"""
+variation.py
+
+Mutation and crossover for a whole population at once.
+
+DecisionTree.mutate rolls the dice once per node in Python, one tree at
+a time, which is most of what a generation costs outside of simulating
+turns once the population gets into the thousands. mutate_all instead
+looks at the GenomePool's memory as a matrix (a row per tree) and draws
+every mutation and every replacement gene for the whole population in
+one go with NumPy, writing the new genes straight back into the pool,
+so the only Python left per tree is finding its row and telling the
+trees that changed (DecisionTree.genes_changed).
+
+breed_all does all of a generation's crossovers in one call, drawing
+the random numbers for all of them up front; the crossover itself is
+the same as genetic.breed.
+
+Both draw from a NumPy generator seeded from the python random.Random
+they're given, so a seeded run is still repeatable. They don't draw the
+same numbers as mutate and breed would, though, so switching between
+them changes what a given seed does.
+
+Requires NumPy, which is why nothing imports this module unless it's
+asked for (see GATest.enable_batched_variation).
+
+members:
+
+mutate_all
+breed_all
+"""
+
+import numpy
+from . import genetic
+
+
+def _numpy_rng(rng):
+    """Returns a NumPy generator seeded from the python random.Random (rng)."""
+    return numpy.random.default_rng(rng.getrandbits(64))
+
+
+def mutate_all(trees, probability, rng):
+    """Same as calling mutate(probability) on every tree in (trees).
+
+    All the trees must keep their genes in the same GenomePool.
+    """
+    if not trees:
+        return
+    pool = trees[0].pool
+    chunks = _pool_matrices(pool)
+    slots = numpy.fromiter((tree.slot_number for tree in trees), numpy.intp, len(trees))
+    genes = numpy.concatenate(chunks)[slots]
+    np_rng = _numpy_rng(rng)
+
+    # only genes in use can mutate, and the unused ones are all at the end
+    used = genes != genetic.EMPTY
+    hit = numpy.zeros(genes.shape, bool)
+    hit[used] = np_rng.random(int(numpy.count_nonzero(used))) < probability
+    rows, columns = numpy.nonzero(hit)
+    if not rows.size:
+        return
+
+    # tests are replaced by tests and actions by actions, like mutate
+    old = genes[rows, columns]
+    new_tests = np_rng.integers(0, genetic.N_TESTS, rows.size)
+    new_actions = genetic.N_TESTS + np_rng.integers(0, genetic.N_ACTIONS, rows.size)
+    new = numpy.where(old < genetic.N_TESTS, new_tests, new_actions)
+
+    # straight back into the pool's memory, a chunk at a time
+    changed = slots[rows]
+    chunk_of = changed // pool.chunk_slots
+    for c in numpy.unique(chunk_of).tolist():
+        in_chunk = chunk_of == c
+        chunks[c][changed[in_chunk] % pool.chunk_slots, columns[in_chunk]] = new[in_chunk]
+
+    for row in numpy.unique(rows).tolist():
+        trees[row].genes_changed()
+
+
+def breed_all(pairs, rng, max_depth=genetic.MAX_DEPTH, max_nodes=genetic.MAX_NODES):
+    """Same as genetic.breed(tree1, tree2) for every (tree1, tree2) in (pairs).
+
+    Returns the new trees, in the same order.
+    """
+    attempts = genetic.CROSSOVER_ATTEMPTS
+    # per pair, per attempt: whether each point prefers a test, and where it lands
+    draws = _numpy_rng(rng).random((len(pairs), attempts, 4)).tolist()
+
+    children = []
+    for (tree1, tree2), pair_draws in zip(pairs, draws):
+        cpy = tree1.copy()
+        genes1 = tree1.encode()
+        genes2 = tree2.encode()
+        tests1 = numpy.flatnonzero(numpy.frombuffer(genes1, numpy.int8) < genetic.N_TESTS)
+        tests2 = numpy.flatnonzero(numpy.frombuffer(genes2, numpy.int8) < genetic.N_TESTS)
+
+        for prefer1, where1, prefer2, where2 in pair_draws:
+            i = _crossover_point(len(genes1), tests1, prefer1, where1)
+            j = _crossover_point(len(genes2), tests2, prefer2, where2)
+            end1 = genetic.subtree_end(genes1, i)
+            end2 = genetic.subtree_end(genes2, j)
+            if len(genes1) - (end1 - i) + (end2 - j) > max_nodes:
+                continue
+            genes = genes1[:i] + genes2[j:end2] + genes1[end1:]
+            if genetic.tree_depth(genes) > max_depth:
+                continue
+            cpy.set_genes(genes)
+            break
+
+        children.append(cpy)
+    return children
+
+
+def _pool_matrices(pool):
+    """Returns the chunks of (pool) as writable NumPy arrays, a row per slot."""
+    return [numpy.frombuffer(chunk, numpy.int8).reshape(pool.chunk_slots, pool.slot_size)
+            for chunk in pool.chunks]
+
+
+def _crossover_point(size, tests_at, prefer, where):
+    """Like genetic._crossover_point, from two uniform draws."""
+    if prefer < 0.9 and tests_at.size:
+        return int(tests_at[int(where * tests_at.size)])
+    return int(where * size)
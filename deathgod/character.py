@@ -1,14 +1,13 @@
 """Includes base class and events for all characters in the game world
 """
-import random
 from . import cfg_parser
 from . import ascii_gfx
 from . import entity
 from . import fonts
 from .entity import Entity
 from .event import Event
+from .profiler import function_name
 
-random.seed()
 default_character_fstr = ascii_gfx.StyledString('C', fonts.regular, (180, 180, 0), True)
 default_sprite_idx = entity.add_sprite(default_character_fstr.create_surface())
 
@@ -71,6 +70,7 @@ class Character(Entity):
         self.turns = 0
         self.turns_since_regen = 0
         self.regen_rate = 5
+        self.times_hurt = 0 # how many hits have done it damage, see Game.combat
         self.inventory = None # needs to be an item container object
         self.equipment = {
             'head':None, 'neck':None, 'about_body':None, 'body':None, 'legs':None, 'feet':None,
@@ -94,13 +94,23 @@ class Character(Entity):
         self.kills = 0
         self.got_killed = False
         self.fitness = 0
+        self.fitness_sampled = 0 # see GATest.pool_fitness
 
 
     def update(self):
         """Called every turn by Game."""
 
         if self.ai_func is not None:
-            self.ai_func(self.game, self)
+            game = self.game
+            # too far from the player to matter, see dormancy.py
+            dormancy = game.dormancy
+            if dormancy.enabled and dormancy.park_if_far(self):
+                return
+
+            if game.recorder is None and game.profiler is None:
+                self.ai_func(game, self)
+            else:
+                self.__act_watched(game)
 
         self.turns = self.turns + 1
         if self.stats.hp < self.stats.max_hp:
@@ -111,6 +121,40 @@ class Character(Entity):
             self.turns_since_regen = 0
 
 
+    def __act_watched(self, game):
+        """Calls the AI function with a recorder or profiler watching."""
+        recorder = game.recorder
+        profiler = game.profiler
+        if profiler is not None:
+            start = profiler.clock()
+        if recorder is None:
+            self.ai_func(game, self)
+        elif recorder.acting(self):
+            # a replay (see ai/replay.py) does what was recorded instead
+            self.ai_func(game, self)
+            recorder.done_acting(self)
+        if profiler is not None:
+            profiler.add("ai", function_name(self.ai_func), profiler.clock() - start)
+
+
+    def catch_up(self, updates):
+        """Regenerates as much as (updates) calls to update would have at once.
+
+        For a Character that hasn't been updated for a while (see dormancy.py).
+        """
+        self.turns = self.turns + updates
+        if updates <= 0 or self.stats.hp >= self.stats.max_hp:
+            return
+        waited = self.turns_since_regen + updates
+        hp = self.stats.hp + waited // self.regen_rate
+        if hp >= self.stats.max_hp:
+            self.stats.hp = self.stats.max_hp
+            self.turns_since_regen = 0
+        else:
+            self.stats.hp = hp
+            self.turns_since_regen = waited % self.regen_rate
+
+
     def die(self):
         """Informs the Character that is has been killed."""
         self.got_killed = True
@@ -123,6 +167,7 @@ class Character(Entity):
         self.kills = 0
         self.got_killed = False
         self.fitness = 0
+        self.fitness_sampled = 0 # see GATest.pool_fitness
 
 
     def __str__(self):
@@ -153,14 +198,22 @@ class Character(Entity):
 
     @property
     def speed(self):
-        """(int) Returns the Character's speed."""
-        return 1 # speed system not implemented yet
+        """(number) Returns the Character's speed, in actions per turn."""
+        return self.stats.speed
+
+    @property
+    def idle(self):
+        """(bool) True if the Character has no AI and nothing to regenerate."""
+        return self.ai_func is None and self.stats.hp >= self.stats.max_hp
 
 
 class StatStruct:
     """Container for all of a Character's attributes"""
 
     def __init__(self, level=1, file=None):
+        # actions per turn, see scheduler.py
+        self.speed = 1
+
         if file is not None:
             try:
                 cfg_parser.parse_and_apply(file, self)
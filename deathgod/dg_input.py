@@ -61,6 +61,12 @@ def parse_keydown(key, game):
     elif key == K_SEMICOLON or key == K_KP7:
         game.move_player_in_direction(directions.NORTHWEST)
         # PlayerMoved(directions.NORTHWEST).dispatch()
+    # rest until healed
+    elif key == K_r or key == K_KP5:
+        game.rest()
+    # where the turns are going, if they're being profiled
+    elif key == K_F12 and game.profiler is not None:
+        print(game.profiler.report())
     else:
         KeyPressed().dispatch()
 
@@ -0,0 +1,212 @@
+"""
+dormancy.py
+
+Lets monsters far away from the player stop acting.
+
+Every active frog used to run its AI every turn wherever it was, so a
+big map full of frogs cost the same per turn as if they were all around
+the player, which is where nothing's going on. With dormancy enabled
+(settings.dormancy_radius, or DormancyManager.enable), a monster that
+finds itself further from the player than the radius when its turn
+comes up is parked instead: it's taken out of the Scheduler, so it
+costs nothing at all, and put in the bucket of the region of the map
+it's standing in. It stays active, and it stays where it is, so
+everything else can still see it and bump into it.
+
+It wakes up again when:
+
+- the player comes within the radius of its region (checked at the
+  start of every turn, only looking at the regions around the player)
+- it's hurt (Game.combat), or anything else calls wake
+
+Whatever it would have done on its own while it was dormant is done in
+one go when it wakes: for now that's regenerating (Character.catch_up).
+Anything that takes a monster off the map (deactivating it) has it
+forgotten without waking it.
+
+To keep monsters on the edge from being parked and woken every other
+turn, they're only parked once they're a region further away than the
+radius, so a monster that's just been woken is never parked again
+straight away.
+
+members:
+
+DormancyManager
+"""
+
+from .ordered_pair import x, y
+from .scheduler import TICKS_PER_TURN
+
+
+class DormancyManager:
+    """Parks the monsters far from the player. See the module docstring.
+
+    Public Members:
+
+    radius
+    region_size
+    enabled
+    enable
+    disable
+    update
+    park_if_far
+    wake
+    forget
+    is_parked
+    parked_count
+    snapshot
+    restore
+    """
+    def __init__(self, game, radius=None, region_size=16):
+        """Arguments:
+
+        game
+            -- the game whose monsters are parked
+        radius
+            -- how far from the player (in moves, diagonals included)
+               monsters keep acting (default None: disabled)
+        region_size
+            -- the width of the square regions dormant monsters are kept
+               in (default 16)
+        """
+        self.game = game
+        self.radius = radius
+        self.region_size = region_size
+        self.__regions = {} # (region x, region y) -> {id: character}
+        self.__parked = {} # character -> (region, scheduler tick of the turn it was parked on)
+        self.__window = None # the regions looked at last turn
+
+
+    @property
+    def enabled(self):
+        """(bool) whether anything gets parked"""
+        return self.radius is not None
+
+
+    def enable(self, radius, region_size=None):
+        """Starts parking monsters further than (radius) from the player."""
+        self.radius = radius
+        if region_size is not None:
+            self.region_size = region_size
+        # the regions were cut up differently
+        for ch in list(self.__parked):
+            self.wake(ch)
+        self.__window = None
+
+
+    def disable(self):
+        """Wakes everything up and stops parking."""
+        for ch in list(self.__parked):
+            self.wake(ch)
+        self.radius = None
+
+
+    def update(self):
+        """Wakes the monsters in the regions within the radius of the player.
+
+        Called at the start of every turn by Game.end_turn.
+        """
+        if not self.__parked:
+            return
+        player = self.game.get_player()
+        radius = self.radius
+        size = self.region_size
+        px = player.position[x]
+        py = player.position[y]
+        window = ((px - radius) // size, (px + radius) // size,
+                  (py - radius) // size, (py + radius) // size)
+        # nothing's ever parked inside the window it was parked from, so
+        # unless the player's moved on to new regions there's nobody to wake
+        if window == self.__window:
+            return
+        self.__window = window
+        regions = self.__regions
+        for rx in range(window[0], window[1] + 1):
+            for ry in range(window[2], window[3] + 1):
+                region = regions.get((rx, ry))
+                if region is not None:
+                    for ch in list(region.values()):
+                        self.wake(ch)
+
+
+    def park_if_far(self, ch):
+        """Parks (ch) if it's far enough away from the player. Returns True if it was.
+
+        Called by Character.update, before the AI, when enabled.
+        """
+        game = self.game
+        player = game.get_player()
+        if ch is player:
+            return False
+        distance = max(abs(ch.position[x] - player.position[x]),
+                       abs(ch.position[y] - player.position[y]))
+        if distance < self.radius + self.region_size:
+            return False
+
+        size = self.region_size
+        region = (ch.position[x] // size, ch.position[y] // size)
+        bucket = self.__regions.get(region)
+        if bucket is None:
+            bucket = self.__regions[region] = {}
+        bucket[ch.id] = ch
+        # the scheduler's tick is already the end of this turn, and this
+        # turn's update is the first one it misses
+        self.__parked[ch] = (region, game.scheduler.tick - TICKS_PER_TURN)
+        game.scheduler.remove(ch)
+        return True
+
+
+    def wake(self, ch):
+        """Wakes (ch) up if it's parked, catching up on what it missed."""
+        parked = self.__parked.pop(ch, None)
+        if parked is None:
+            return
+        region, tick = parked
+        self.__drop(region, ch)
+        scheduler = self.game.scheduler
+        missed = (scheduler.tick - tick) * ch.speed / TICKS_PER_TURN
+        ch.catch_up(int(missed))
+        scheduler.wake(ch)
+
+
+    def forget(self, ch):
+        """Stops keeping track of (ch) without waking it, e.g. if it's leaving the map."""
+        parked = self.__parked.pop(ch, None)
+        if parked is not None:
+            self.__drop(parked[0], ch)
+
+
+    def is_parked(self, ch):
+        """Returns True if (ch) is parked."""
+        return ch in self.__parked
+
+
+    @property
+    def parked_count(self):
+        """(int) how many monsters are parked"""
+        return len(self.__parked)
+
+
+    def snapshot(self):
+        """Returns everything restore needs to put the parked monsters back."""
+        return (self.radius, self.region_size, self.__parked.copy())
+
+
+    def restore(self, state):
+        """Puts the parked monsters back the way they were in (state), from snapshot."""
+        self.radius, self.region_size, parked = state
+        self.__parked = parked.copy()
+        self.__regions = {}
+        for ch, (region, tick) in parked.items():
+            bucket = self.__regions.get(region)
+            if bucket is None:
+                bucket = self.__regions[region] = {}
+            bucket[ch.id] = ch
+        self.__window = None
+
+
+    def __drop(self, region, ch):
+        bucket = self.__regions[region]
+        del bucket[ch.id]
+        if not bucket:
+            del self.__regions[region]
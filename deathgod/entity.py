@@ -14,6 +14,7 @@ public members:
 
 Entity
 EntityList
+EntityRegistry
 compare_entities
 add_sprite
 get_sprite
@@ -21,6 +22,7 @@ default_entity_fstr
 
 """
 
+import itertools
 from pygame.sprite import Sprite
 from .directions import *
 from .ordered_pair import x, y
@@ -38,7 +40,8 @@ class Entity(Sprite):
     - Entities should specify a name for the look command, and
       optionally a description
     - Every turn, the update method of all active entities is called
-      unless that entity is not active
+      unless that entity is not active, (speed) times a turn, as long
+      as it isn't idle (see scheduler.py)
     - If any entity attempts to move into a square occupied by another
       entity, that entity's interact method is called (maybe this
       mechanic needs to be less simplistic?)
@@ -49,8 +52,11 @@ class Entity(Sprite):
 
     Public Members:
 
+        id
         update
         interact
+        speed
+        idle
         sprite
         position
         description
@@ -90,6 +96,8 @@ class Entity(Sprite):
         self.__sorting_priority = 0
         self.active = False
         self.mark = -1
+        # never reused, so entities can be looked up (and ordered) by it
+        self.id = next(_ids)
 
 
     def update(self):
@@ -102,6 +110,22 @@ class Entity(Sprite):
         pass
 
 
+    @property
+    def speed(self):
+        """(number) How many times a turn update is called."""
+        return 1
+
+
+    @property
+    def idle(self):
+        """(bool) True if update has nothing to do, so it needn't be called.
+
+        Sub-classes that override update should override this too. An idle
+        entity isn't updated again until it's woken (Scheduler.wake).
+        """
+        return True
+
+
     def interact(self, antagonist):
         """
         Called whenever another entity attempts to move into this one.
@@ -247,6 +271,10 @@ def get_sprite(idx):
     return _sprite_list[idx]
 
 
+# where Entity.id comes from
+_ids = itertools.count()
+
+
 types = []
 def add_type(t):
     ret = len(types)
@@ -292,9 +320,18 @@ class EntityList(list):
         Arguments:
             entity - the entity to add
         """
-        self.append(entity)
-        if self.size > 0:
-            self.sort()
+        # after anything with the same priority, same as appending and sorting
+        # (bisect.insort_right only takes a key from Python 3.10 on)
+        priority = entity.sorting_priority
+        lo = 0
+        hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if priority < self[mid].sorting_priority:
+                hi = mid
+            else:
+                lo = mid + 1
+        self.insert(lo, entity)
 
 
     def remove_entity(self, entity):
@@ -353,5 +390,65 @@ class EntityList(list):
         return None
 
 
+class EntityRegistry:
+    """A set of entities that remembers the order they were added in.
+
+    Game keeps its active and inactive entities in these. Adding and
+    removing are O(1), unlike list.remove, which had to search the whole
+    list every time a frog died. Iterating goes through the entities in
+    the order they were added (removing and adding one again puts it at
+    the end), the same as appending to and removing from a list did, so
+    games still play out the same.
+
+    Don't add or remove entities while iterating; iterate over a copy
+    (list(registry)) if you have to.
+
+    Public Members:
+
+    add
+    remove
+    get
+    """
+    def __init__(self, entities=()):
+        """Arguments:
+
+        entities
+            -- entities to start with, in order (default none)
+        """
+        self.__entities = {} # id -> entity, in the order they were added
+        for ent in entities:
+            self.add(ent)
+
+
+    def add(self, ent):
+        """Adds (ent) at the end. Raises ValueError if it's already there."""
+        if ent.id in self.__entities:
+            raise ValueError("%s is already in the registry" % ent.name)
+        self.__entities[ent.id] = ent
+
+
+    def remove(self, ent):
+        """Removes (ent). Raises ValueError if it isn't there."""
+        if self.__entities.pop(ent.id, None) is None:
+            raise ValueError("%s isn't in the registry" % ent.name)
+
+
+    def get(self, ent_id):
+        """Returns the entity with the id (ent_id), or None."""
+        return self.__entities.get(ent_id)
+
+
+    def __contains__(self, ent):
+        return self.__entities.get(ent.id) is ent
+
+
+    def __iter__(self):
+        return iter(self.__entities.values())
+
+
+    def __len__(self):
+        return len(self.__entities)
+
+
 if __name__ == "__main__":
     print(__doc__, Entity.__doc__)
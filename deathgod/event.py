@@ -159,10 +159,17 @@ class PlayerMoved(Event):
 
 
 class TurnEnded(Event):
-    """Dispatched when the player's turn ends."""
+    """Dispatched when the player's turn ends.
+
+    Public Members:
+
+    game
+        -- the game whose turn ended (None if unknown)
+    """
     handlers = []
-    def __init__(self):
+    def __init__(self, game=None):
         Event.__init__(self)
+        self.game = game
 
 
 class FlushMessages(Event):
@@ -5,15 +5,20 @@ import pickle
 import pygame
 from . import settings
 from . import dg_input
-from . import display
 from . import event
 from . import entity
 from .player import Player
 from . import game_map
 from . import map_generators
 from . import colors
+from . import rng as rng_module
 from .ordered_pair import x, y
 from .message import Message
+from .ai.perception import Perception
+from .world_state import WorldState
+from .scheduler import Scheduler
+from .dormancy import DormancyManager
+from .profiler import TurnProfiler
 
 
 class Game:
@@ -33,6 +38,10 @@ class Game:
     get_player
     get_map
     end_turn
+    step
+    render
+    advance
+    rest
     move_entity
     move_entity_in_direction
     add_entity
@@ -41,30 +50,81 @@ class Game:
     deactivate_entity
     move_player_in_direction
     combat
+    snapshot
+    restore
     """
 
-    def __init__(self):
+    def __init__(self, headless=False, world_dimensions=settings.world_dimensions,
+                 seed=None, rng=None):
+        """Arguments:
+
+        headless
+            -- if True, no Display is created, so nothing is ever drawn and
+               end_turn never stops to wait on a "- more -" prompt. The test
+               monsters and the GA test are not created either, whoever
+               asked for a headless game is expected to set those up.
+               (default False)
+        world_dimensions
+            -- the size of the map (default settings.world_dimensions)
+        seed
+            -- seeds the game's random number generator, so the same seed
+               always makes the same game (default None: a different game
+               every time)
+        rng
+            -- a random.Random to use instead of making one from (seed)
+               (default None)
+        """
+        # everything random in the game draws from this, see rng.py
+        if rng is None:
+            rng = rng_module.make_rng(seed)
+        self.rng = rng
+
         # model!
         self.player = Player(self, settings.player_start)
         self.current_map = game_map.GameMap(
-            settings.world_dimensions,
+            world_dimensions,
             self.player.position,
-            map_generators.test_generator
+            map_generators.test_generator,
+            rng
         )
 
         # view!
-        self.display = display.Display(self.player, self.current_map)
+        if headless:
+            self.display = None
+        else:
+            # importing display opens the window, so don't do it unless we have to
+            from . import display
+            self.display = display.Display(self.player, self.current_map)
 
         # other local variables!
         self.done = False
-
-        self.inactive_entities = []
-        self.active_entities = []
+        # told about everything that changes the world, if anybody is
+        # recording the game (see recorder.py)
+        self.recorder = None
+        # times every part of every turn, if anybody wants to know (see profiler.py)
+        self.profiler = None
+        if settings.profile_window is not None:
+            self.profiler = TurnProfiler(settings.profile_window)
+
+        # in the order they were added, see entity.EntityRegistry
+        self.inactive_entities = entity.EntityRegistry()
+        self.active_entities = entity.EntityRegistry()
         self.turns = 0
+        # decides which active entities act when, see scheduler.py
+        self.scheduler = Scheduler()
+        # parks the monsters far from the player, see dormancy.py
+        self.dormancy = DormancyManager(self, settings.dormancy_radius,
+                                        settings.dormancy_region_size)
+
+        # what the AI knows, updated at the start of every turn
+        self.perception = Perception(self)
 
         self.add_entity(self.player)
         self.activate_entity(self.player)
 
+        if headless:
+            return
+
         # create some test stuff
         from .monster import Monster
         from . import monsters
@@ -103,18 +163,55 @@ class Game:
 
 
     def end_turn(self):
-        """Ends the turn, calls update on all active entities."""
+        """Ends the turn, calls update on the active entities whose time has come.
+
+        Then shows the turn's messages and redraws the screen.
+        """
+        self.step()
+        self.render()
+
+
+    def step(self):
+        """Plays the rest of the turn without showing anything.
+
+        Everything end_turn does except for the messages and the drawing,
+        which are left for render. Messages keep piling up until then.
+        """
         #print "ending turn %d" % self.turns
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start_turn()
+        if self.recorder is not None:
+            self.recorder.ending_turn()
+        self.turns = self.turns + 1
         self.player.turns = self.player.turns + 1
 
-        # update all active entities
-        # TODO add speed mechanics here
-        for ent in self.active_entities:
-            ent.update()
+        # before perception, so whoever wakes up is perceived for
+        self.dormancy.update()
+        if profiler is not None:
+            profiler.lap("dormancy")
+        self.perception.update()
+        if profiler is not None:
+            profiler.lap("perception")
 
+        # update the active entities, as often as their speed says
+        self.scheduler.run_turn(profiler)
+        if profiler is not None:
+            profiler.lap("entities")
 
         # some things still rely on this event being instantiated every turn, alas
-        event.TurnEnded().dispatch()
+        event.TurnEnded(self).dispatch()
+        if self.recorder is not None:
+            self.recorder.turn_ended()
+        if profiler is not None:
+            profiler.end_turn("turn ended")
+
+
+    def render(self):
+        """Shows the messages that have piled up and redraws the screen."""
+        # headless games have nobody to show anything to
+        if self.display is None:
+            return
 
         # show all the messages that have accumulated due to the events of the turn
         self.display.message_view.show_messages()
@@ -123,6 +220,64 @@ class Game:
         self.display.update()
 
 
+    def advance(self, turns, render=False, until=None):
+        """Plays (turns) turns as fast as possible, the player doing nothing.
+
+        Nothing is drawn and no messages are shown in between, so a turn
+        costs the same as in a headless game.
+
+        Arguments:
+
+        turns
+            -- how many turns to play
+        render
+            -- if True, the messages from all the turns are shown and the
+               screen is redrawn once at the end. If False, the messages
+               are thrown away and nothing is drawn. (default False)
+        until
+            -- a function taking the game, checked after every turn; if it
+               returns True, no more turns are played (default None)
+
+        Returns how many turns were played.
+        """
+        played = 0
+        while played < turns:
+            self.step()
+            played = played + 1
+            if until is not None and until(self):
+                break
+
+        if self.display is not None:
+            if render:
+                self.render()
+            else:
+                self.display.message_view.clear_messages()
+        return played
+
+
+    def rest(self, max_turns=100):
+        """Waits until the player is healed, or something hurts it.
+
+        Waits (max_turns) turns at most, and shows what happened at the
+        end. Returns how many turns were waited.
+        """
+        player = self.player
+        if player.stats.hp >= player.stats.max_hp:
+            Message(("You don't need to rest.", colors.white)).dispatch()
+            self.render()
+            return 0
+
+        # not by comparing hp, since it can regenerate as much as it was hurt,
+        # and getting killed puts it back at full health
+        hurt = player.times_hurt
+        def done(game):
+            if player.times_hurt != hurt:
+                return True # interrupted
+            return player.stats.hp >= player.stats.max_hp
+
+        return self.advance(max_turns, True, done)
+
+
     def move_entity(self, ent, destination):
         """Takes any given entity and relocates it to a destination tile.
 
@@ -139,6 +294,8 @@ class Game:
             if moved is True:
                 self.current_map.move_entity_to_tile(ent, target)
                 ent.position = destination
+                if self.recorder is not None:
+                    self.recorder.moved(ent, destination)
         else:
             moved = False
             if ent.type == "Player":
@@ -157,14 +314,18 @@ class Game:
 
     def add_entity(self, ent):
         """Add an entity to the current map: ent = the Entity object"""
-        self.inactive_entities.append(ent)
+        self.inactive_entities.add(ent)
         self.current_map.add_entity(ent)
+        if self.recorder is not None:
+            self.recorder.entity_added(ent)
 
 
     def remove_entity(self, ent):
         """Remove an entity from the current map: ent = the Entity object"""
         if ent.active is True:
             self.active_entities.remove(ent)
+            self.scheduler.remove(ent)
+            self.dormancy.forget(ent)
         else:
             self.inactive_entities.remove(ent)
         self.current_map.remove_entity(ent)
@@ -172,16 +333,19 @@ class Game:
 
     def activate_entity(self, ent):
         """Move an entity to the active entities list: ent = the Entity object"""
-        self.active_entities.append(ent)
         self.inactive_entities.remove(ent)
+        self.active_entities.add(ent)
         ent.active = True
+        self.scheduler.add(ent)
 
 
     def deactivate_entity(self, ent):
         """Remove an entity from the active entities list: ent = the Entity object"""
         self.active_entities.remove(ent)
-        self.inactive_entities.append(ent)
+        self.inactive_entities.add(ent)
         ent.active = False
+        self.scheduler.remove(ent)
+        self.dormancy.forget(ent)
 
 
     def move_player_in_direction(self, direction):
@@ -216,9 +380,22 @@ class Game:
         return entities
 
 
+    def snapshot(self):
+        """Returns a WorldState that restore can put the game back to.
+
+        Much cheaper than copying the game, see world_state.py.
+        """
+        return WorldState(self)
+
+
+    def restore(self, state):
+        """Puts the game back the way it was when (state) was snapshotted."""
+        state.restore(self)
+
+
     def save_game(self, file_name):
         """Saves the current game to a file."""
-        f = open(file_name, "w")
+        f = open(file_name, "wb")
         pickle.dump(self.current_map, f)
         f.close()
 
@@ -226,7 +403,7 @@ class Game:
     def load_game(self, file_name):
         """Loads a saved game from a file."""
         try:
-            f = open(file_name, "r")
+            f = open(file_name, "rb")
             try:
                 self.current_map = pickle.load(f)
             except IOError:
@@ -256,11 +433,20 @@ class Game:
         a_offense = attacker.offense
         v_defense = victim.defense
 
+        # anything dormant wakes up when it's hit
+        self.dormancy.wake(victim)
+
         damage = a_offense - v_defense
         if damage < 0:
             damage = 0
+        if self.recorder is not None:
+            self.recorder.fought(attacker, victim, damage)
 
         victim.stats.hp = victim.stats.hp - damage
+        if damage > 0:
+            victim.times_hurt = victim.times_hurt + 1
+        # it has something to regenerate now
+        self.scheduler.wake(victim)
 
         # log some stuff for the GA
         attacker.damage_dealt = attacker.damage_dealt + damage
@@ -1,3 +1,4 @@
+import random
 from .tile import *
 from .directions import *
 from .ordered_pair import *
@@ -14,36 +15,93 @@ def get_adjacent_coords(pos):
 
 class GameMap:
     """Defines a map in Death God and everything that entails. Terrain, Entities, the works"""
-    def __init__(self, size, player_position, generator_function):
+    def __init__(self, size, player_position, generator_function, rng=None):
+        """Arguments:
+
+        size -- the map's (width, height)
+        player_position -- where the player starts
+        generator_function -- makes the tiles, see map_generators.py
+        rng -- the random.Random to make the map and choose tiles with
+               (default: the random module's)
+        """
         self.size = size
         self.width = size[x]
         self.height = size[y]
+        self.rng = rng
         #self.player_position = list(player_position)
-        self.tiles = generator_function(size, player_position)
+        self.tiles = generator_function(size, player_position, rng=rng)
+
+        # whether each tile is passable, column by column, like tiles. Cheaper
+        # to look at than the tiles themselves, and snapshots of the world
+        # (see world_state.py) just hold on to it, so it's copied before
+        # being changed if anybody might be (copy-on-write).
+        self.passability = bytearray(self.width * self.height)
+        i = 0
+        for column in self.tiles:
+            for tile in column:
+                if tile.passable:
+                    self.passability[i] = 1
+                i = i + 1
+        self.terrain_shared = False
+        # goes up every time the terrain changes
+        self.terrain_version = 0
 
     def get_tile(self, position):
         """ Returns the Tile object reference at a given coordinate on the map """
         return self.tiles[position[x]][position[y]]
 
-    def choose_open_tile(self):
+    def choose_open_tile(self, rng=None):
         """Chooses a random tile from the map that's open.
 
         Returns the coordinates of the tile, and the tile itself.
         Does this by iterating through random tiles until it finds an
         open one, so not really a bulletproof algorithm at the moment.
         Perhaps a list of open tiles should be maintained.
+
+        The tiles are drawn from (rng), or the map's own rng if None.
         """
-        import random
+        if rng is None:
+            rng = self.rng if self.rng is not None else random
         found = False
         while not found:
-            pos = [random.randint(0, self.width-1),
-                   random.randint(0, self.height-1)]
+            pos = [rng.randint(0, self.width-1),
+                   rng.randint(0, self.height-1)]
             target_tile = self.get_tile(pos)
             if target_tile.character_can_enter():
                 found = True
 
         return pos, target_tile
 
+    def set_passable(self, position, passable):
+        """Changes whether the tile at (position) can be walked on."""
+        if self.terrain_shared:
+            self.passability = bytearray(self.passability)
+            self.terrain_shared = False
+        self.passability[position[x] * self.height + position[y]] = 1 if passable else 0
+        self.get_tile(position).passable = passable
+        self.terrain_version = self.terrain_version + 1
+
+    def share_terrain(self):
+        """Returns the passability grid, which must then never be changed.
+
+        The map copies it before its next change instead.
+        """
+        self.terrain_shared = True
+        return self.passability
+
+    def restore_terrain(self, passability):
+        """Puts back a passability grid from share_terrain."""
+        if passability is self.passability:
+            return
+        old = self.passability
+        height = self.height
+        for i in range(len(passability)):
+            if passability[i] != old[i]:
+                self.tiles[i // height][i % height].passable = bool(passability[i])
+        self.passability = passability
+        self.terrain_shared = True
+        self.terrain_version = self.terrain_version + 1
+
     def get_tile_slice(self, x_min, x_max, y_min, y_max):
         """I don't even know if this works."""
         result = self.tiles[x_min:x_max]
@@ -2,7 +2,12 @@
 
 from .tile import *
 
-def test_generator(dimensions, player_position):
+def test_generator(dimensions, player_position, rng=None):
+    """Makes the hand-drawn test map.
+
+    Generators are passed the map's random.Random as (rng), so a seeded
+    game always gets the same map. This one is always the same anyway.
+    """
     width = dimensions[0]
     height = dimensions[1]
     
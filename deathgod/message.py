@@ -70,6 +70,7 @@ class MessageView(View):
     size
     dequeue_msg
     enqueue_msg
+    clear_messages
     """
 
     def __init__(self, parent, rect, bg_color=(0,0,0), font=fonts.regular):
@@ -157,6 +158,11 @@ class MessageView(View):
         #print "in MessageView: enqueue_msg: _msg_q = " + str(self.__msg_q)
 
 
+    def clear_messages(self):
+        """Throws away every message in the queue without showing it."""
+        del self.__msg_q[:]
+
+
     @property
     def is_empty(self):
         """Obvious."""
@@ -4,8 +4,9 @@ stats = "giant_frog_stat.txt"
 char = 'F'
 color = (0, 255, 0)
 
-from .. import ai
-ai_module = ai.default
+# the submodule itself, since deathgod.ai may still be half imported
+# (e.g. by a worker process importing ai.parallel cold)
+from ..ai import default as ai_module
 
 
 from .. import entity
@@ -0,0 +1,240 @@
+"""
+player_controllers.py
+
+Things that play the player's turns instead of somebody at the keyboard.
+
+In the normal game the player only moves when dg_input.parse_keydown
+gets a key, so a headless game (see ai/arena.py) used to have a player
+that just stood there. A PlayerController takes the player's turn by
+calling the same Game methods the keys do (move_player_in_direction,
+or combat and end_turn), so nothing goes through the pygame event queue
+and a game can be played unattended as fast as it will go.
+
+Every controller draws whatever it needs that's random from the game's
+random number generator, so seeded games still come out the same.
+
+IdleController
+    -- stands still and lets the monsters come (what the arena always did)
+RandomWalk
+    -- wanders around, attacking whatever it bumps into
+ChaseNearest
+    -- hunts down the nearest monster and attacks it
+ScriptedPatrol
+    -- walks a loop of waypoints, attacking monsters next to it on the way
+
+Controllers can be made by name, for command lines and for sending to
+worker processes:
+
+controller = make_controller("chase")
+while playing:
+    controller.take_turn(game)
+
+members:
+
+PlayerController
+IdleController
+RandomWalk
+ChaseNearest
+ScriptedPatrol
+CONTROLLERS
+make_controller
+nearest_monster
+random_step
+step_towards
+"""
+
+from . import directions
+from .ordered_pair import x, y
+
+# every direction, and which way it goes
+_STEPS = (
+    (directions.NORTH, 0, 1),
+    (directions.NORTHEAST, 1, 1),
+    (directions.EAST, 1, 0),
+    (directions.SOUTHEAST, 1, -1),
+    (directions.SOUTH, 0, -1),
+    (directions.SOUTHWEST, -1, -1),
+    (directions.WEST, -1, 0),
+    (directions.NORTHWEST, -1, 1)
+)
+
+
+class PlayerController:
+    """Plays the player's turns. Sub-classes decide what to do.
+
+    Public Members:
+
+    take_turn
+    reset
+    """
+    def take_turn(self, game):
+        """Does something with the player in (game), and ends the turn."""
+        game.end_turn()
+
+
+    def reset(self):
+        """Forgets anything remembered from earlier turns, like where a patrol was."""
+        pass
+
+
+class IdleController(PlayerController):
+    """Never does anything but wait."""
+    pass
+
+
+class RandomWalk(PlayerController):
+    """Moves in a random direction every turn.
+
+    Walls are never walked into, but monsters are, which attacks them.
+    """
+    def take_turn(self, game):
+        random_step(game)
+
+
+class ChaseNearest(PlayerController):
+    """Goes after the nearest monster, and attacks it once it's next to it.
+
+    Distances are counted in moves, diagonals included, as the crow
+    flies, so the player can get stuck behind walls, in which case it
+    takes a random step and tries again next turn.
+    """
+    def take_turn(self, game):
+        player = game.get_player()
+        target = nearest_monster(game)
+        if target is None:
+            game.end_turn()
+        elif _distance(player.position, target.position) <= 1:
+            game.combat(player, target)
+            game.end_turn()
+        elif not step_towards(game, target.position):
+            random_step(game)
+
+
+class ScriptedPatrol(PlayerController):
+    """Walks from waypoint to waypoint, round and round.
+
+    Any monster next to the player gets attacked before the patrol goes
+    on. If the next waypoint can't be got any closer to (there's a wall
+    in the way), the patrol gives up on it and heads for the one after.
+
+    Public Members:
+
+    waypoints
+    fight
+    """
+    def __init__(self, waypoints=None, fight=True):
+        """Arguments:
+
+        waypoints
+            -- the (x, y) positions to walk between, in order
+               (default: near the four corners of the map)
+        fight
+            -- whether to attack monsters on the way (default True)
+        """
+        self.waypoints = waypoints
+        self.fight = fight
+        self.__next = 0
+
+
+    def take_turn(self, game):
+        player = game.get_player()
+        if self.fight:
+            target = nearest_monster(game)
+            if target is not None and _distance(player.position, target.position) <= 1:
+                game.combat(player, target)
+                game.end_turn()
+                return
+
+        if self.waypoints is None:
+            current_map = game.get_map()
+            right = current_map.width - 3
+            top = current_map.height - 3
+            self.waypoints = [(2, 2), (right, 2), (right, top), (2, top)]
+
+        # skip the waypoints already reached or out of reach
+        for i in range(len(self.waypoints)):
+            waypoint = self.waypoints[self.__next]
+            if _distance(player.position, waypoint) > 0 and step_towards(game, waypoint):
+                return
+            self.__next = (self.__next + 1) % len(self.waypoints)
+        game.end_turn()
+
+
+    def reset(self):
+        self.__next = 0
+
+
+def nearest_monster(game):
+    """Returns the active monster closest to the player in (game), or None."""
+    px, py = game.get_player().position
+    nearest = None
+    nearest_distance = None
+    for ent in game.active_entities:
+        if ent.type != "Monster":
+            continue
+        distance = max(abs(ent.position[x] - px), abs(ent.position[y] - py))
+        if nearest is None or distance < nearest_distance:
+            nearest = ent
+            nearest_distance = distance
+    return nearest
+
+
+def random_step(game):
+    """Moves the player in a random direction that isn't into a wall, ending the turn."""
+    player = game.get_player()
+    current_map = game.get_map()
+    px, py = player.position
+    open_directions = [direction for direction, dx, dy in _STEPS
+                       if current_map.get_tile((px + dx, py + dy)).passable]
+    if open_directions:
+        game.move_player_in_direction(game.rng.choice(open_directions))
+    else:
+        game.end_turn()
+
+
+def step_towards(game, destination):
+    """Moves the player one step closer to (destination), ending the turn.
+
+    Returns False, without doing anything, if no open tile next to the
+    player is any closer.
+    """
+    player = game.get_player()
+    current_map = game.get_map()
+    px, py = player.position
+    best = None
+    best_distance = (_distance((px, py), destination), 0)
+    for direction, dx, dy in _STEPS:
+        position = (px + dx, py + dy)
+        if not current_map.get_tile(position).passable:
+            continue
+        # straight lines beat zigzags
+        distance = (_distance(position, destination),
+                    (position[x] - destination[x]) ** 2 + (position[y] - destination[y]) ** 2)
+        if distance < best_distance:
+            best = direction
+            best_distance = distance
+    if best is None:
+        return False
+    game.move_player_in_direction(best)
+    return True
+
+
+def _distance(a, b):
+    return max(abs(a[x] - b[x]), abs(a[y] - b[y]))
+
+
+# controllers by name
+CONTROLLERS = {
+    "idle": IdleController,
+    "random": RandomWalk,
+    "chase": ChaseNearest,
+    "patrol": ScriptedPatrol
+}
+
+
+def make_controller(name):
+    """Returns a new controller of the type called (name) in CONTROLLERS.
+
+    Raises KeyError if there's no such controller.
+    """
+    return CONTROLLERS[name]()
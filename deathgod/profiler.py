@@ -0,0 +1,194 @@
+"""
+profiler.py
+
+Times where the turns go, from inside the game.
+
+When a turn takes 200 ms on a big map, cProfile says it's all in
+Character.update and the decision trees, which everybody already knew.
+A TurnProfiler hangs off Game.profiler (None, the default, costs
+nothing) and is handed a timing for every piece of every turn:
+
+turn          -- the whole of Game.step
+phase         -- dormancy, perception, entities and turn ended (TurnEnded,
+                 which is mostly the GA)
+entity        -- update, per type and name of entity
+ai            -- each ai_func, e.g. genetic.act
+decision      -- a decision tree choosing an action
+test          -- each test in ai/tests.py the trees call
+batched test  -- each test in ai/batch.py, for the whole population
+action        -- each action in ai/actions.py
+
+Only the last (window) turns count, so the numbers are about how the
+game is doing now rather than since it started. For each thing timed,
+stats gives how many times it happened in those turns, the total time
+and the mean, and the p50 and p99 of its latest (samples) timings
+(a test can be called thousands of times a turn, so not all of them
+are kept). report makes a table of that, most total time first, and
+dump writes it to a file.
+
+While profiling, decision trees are walked test by test instead of
+being run compiled (see genetic.act), so that every test gets timed;
+the trees still choose exactly the same actions, the "decision" times
+are just slower than they'd otherwise be.
+
+python3 -m deathgod.ai.arena -m 3000 --width 200 --height 200 --profile turns.json
+
+members:
+
+TurnProfiler
+function_name
+FIELDS
+"""
+
+import csv
+import json
+import time
+from collections import deque
+
+# the columns of stats, report and CSV dumps
+FIELDS = ["category", "name", "count", "total_ms", "mean_us", "p50_us", "p99_us"]
+
+
+def function_name(f):
+    """Returns "module.function" for (f), e.g. genetic.act."""
+    return "%s.%s" % (f.__module__.rsplit(".", 1)[-1], f.__name__)
+
+
+class TurnProfiler:
+    """Collects timings from a game. See the module docstring.
+
+    Public Members:
+
+    window
+    samples
+    turns
+    clock
+    add
+    start_turn
+    lap
+    end_turn
+    stats
+    report
+    dump
+    reset
+    """
+    # what to time with
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, window=100, samples=10000):
+        """Arguments:
+
+        window
+            -- how many of the latest turns count (default 100)
+        samples
+            -- how many of the latest timings of each thing the
+               percentiles come from (default 10000)
+        """
+        self.window = window
+        self.samples = samples
+        self.turns = 0
+        self.__samples = {} # (category, name) -> the latest timings, in seconds
+        self.__per_turn = {} # (category, name) -> (count, seconds) for each turn in the window
+        self.__this_turn = {} # (category, name) -> [count, seconds] so far this turn
+        self.__turn_start = None
+        self.__mark = None
+
+
+    def add(self, category, name, seconds):
+        """Records that (name), of (category), took (seconds)."""
+        key = (category, name)
+        this_turn = self.__this_turn.get(key)
+        if this_turn is None:
+            this_turn = self.__this_turn[key] = [0, 0.0]
+            if key not in self.__samples:
+                self.__samples[key] = deque(maxlen=self.samples)
+                self.__per_turn[key] = deque(maxlen=self.window)
+        this_turn[0] = this_turn[0] + 1
+        this_turn[1] = this_turn[1] + seconds
+        self.__samples[key].append(seconds)
+
+
+    def start_turn(self):
+        """Starts timing a turn. Called by Game.step."""
+        self.__turn_start = self.__mark = self.clock()
+
+
+    def lap(self, phase):
+        """Records the time since the last lap (or start_turn) as (phase)."""
+        now = self.clock()
+        self.add("phase", phase, now - self.__mark)
+        self.__mark = now
+
+
+    def end_turn(self, phase):
+        """Records the last (phase) of the turn, and the whole turn."""
+        self.lap(phase)
+        self.add("turn", "step", self.__mark - self.__turn_start)
+        self.turns = self.turns + 1
+        this_turn = self.__this_turn
+        for key, per_turn in self.__per_turn.items():
+            totals = this_turn.get(key)
+            per_turn.append((totals[0], totals[1]) if totals is not None else (0, 0.0))
+        self.__this_turn = {}
+
+
+    def stats(self):
+        """Returns a dictionary per thing timed, with the keys in FIELDS.
+
+        Sorted by total time, the most first.
+        """
+        rows = []
+        for (category, name), samples in self.__samples.items():
+            per_turn = self.__per_turn[(category, name)]
+            count = sum(c for c, seconds in per_turn)
+            if count == 0:
+                continue # not in the window any more
+            total = sum(seconds for c, seconds in per_turn)
+            ranked = sorted(samples)
+            n = len(ranked)
+            rows.append({
+                "category": category,
+                "name": name,
+                "count": count,
+                "total_ms": total * 1e3,
+                "mean_us": total / count * 1e6,
+                "p50_us": ranked[n // 2] * 1e6,
+                "p99_us": ranked[min(n - 1, (n * 99) // 100)] * 1e6
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+
+    def report(self, limit=None):
+        """Returns the stats as a table, as a string, at most (limit) rows of it."""
+        rows = self.stats()
+        if limit is not None:
+            rows = rows[:limit]
+        lines = ["%d turns profiled, the last %d of them:" % (self.turns, min(self.turns, self.window)),
+                 "%-13s %-28s %7s %10s %10s %10s %10s" % (
+                     "category", "name", "count", "total ms", "mean us", "p50 us", "p99 us")]
+        for row in rows:
+            lines.append("%(category)-13s %(name)-28s %(count)7d %(total_ms)10.2f "
+                         "%(mean_us)10.2f %(p50_us)10.2f %(p99_us)10.2f" % row)
+        return "\n".join(lines)
+
+
+    def dump(self, path):
+        """Writes the stats to (path): CSV if it ends in ".csv", else JSON."""
+        rows = self.stats()
+        with open(path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump({"turns": self.turns, "window": self.window, "stats": rows},
+                          f, indent=2)
+
+
+    def reset(self):
+        """Forgets every timing."""
+        self.__samples = {}
+        self.__per_turn = {}
+        self.__this_turn = {}
+        self.turns = 0
@@ -0,0 +1,328 @@
+"""
+recorder.py
+
+Records everything that happens in a game to a compact binary log.
+
+A Recorder hangs off Game.recorder, and the game tells it about every
+call that changes the world:
+
+- entities being added to the map (Game.add_entity)
+- entities moving (Game.move_entity)
+- combat, and how much damage it did (Game.combat)
+- the end of every turn (Game.end_turn)
+- every character's AI taking its turn (Character.update), which
+  brackets the moves and fights it decided on. Most turns most frogs
+  don't do anything at all, and then nothing's recorded.
+- the GA picking parents to breed and monsters to replace
+  (GATest.next_generation)
+- how much gets drawn from the game's random number generator, which
+  has to be a RecordingRandom made by make_rng, along with its whole
+  state whenever it's seeded or set
+
+The generator is a Mersenne Twister, which hands out 32 bit words one
+after another whatever they're asked for in, so draws are recorded as
+the number of words drawn since the last record. One record covers any
+number of draws, so the thousands of them the GA makes every generation
+cost a few bytes.
+
+That's enough to play the game again without deciding anything: see
+ai/replay.py, which reads the log back with read_records.
+
+The log starts with MAGIC and a JSON header (whatever the recorder was
+given as (config), i.e. how to set the game up again), then one record
+after another, each a one byte code followed by a fixed layout (see
+the record codes below), except for REPLACE, which says how long it
+is. Entities are numbered in the order they were first added to the
+game, since the replay adds them in the same order.
+
+members:
+
+Recorder
+RecordingRandom
+read_header
+read_records
+MAGIC
+"""
+
+import json
+import itertools
+import random
+import struct
+
+MAGIC = b"DGREC1\n"
+
+# record codes
+TURN = b"T"     # a turn ended
+ACT = b"A"      # (entity) a character's AI started deciding
+DONE = b"D"     # the AI is done
+MOVE = b"M"     # (entity, x, y) an entity moved
+COMBAT = b"C"   # (attacker, victim, damage) a fight
+ADD = b"N"      # (entity, x, y) an entity was added to the map
+BREED = b"B"    # (parent, parent) the GA bred two monsters
+REPLACE = b"R"  # (entity, length, genes) a monster got a new tree
+DRAWS = b"W"    # (words) random numbers were drawn
+STATE = b"S"    # (625 words, gauss flag, gauss) the generator's state was set
+
+_ID = struct.Struct("<I")
+_POSITION = struct.Struct("<IHH")
+_COMBAT = struct.Struct("<IIi")
+_PAIR = struct.Struct("<II")
+_REPLACE = struct.Struct("<IB")
+_STATE = struct.Struct("<625IBd")
+_HEADER = struct.Struct("<I")
+
+# bytes buffered before they're written out
+BUFFER_SIZE = 1 << 16
+
+
+class Recorder:
+    """Writes everything a game does to a log file.
+
+    Public Members:
+
+    path
+    records
+    make_rng
+    attach
+    close
+    """
+    def __init__(self, path, config=None):
+        """Arguments:
+
+        path
+            -- the file to write the log to
+        config
+            -- a dictionary of anything needed to set the game up again,
+               stored as JSON in the log's header (default None)
+        """
+        self.path = path
+        self.records = 0
+        self.__file = open(path, "wb")
+        header = json.dumps(config or {}).encode("utf-8")
+        self.__buffer = bytearray(MAGIC + _HEADER.pack(len(header)) + header)
+        self.__ids = {}
+        self.__acting = None # the character whose ACT isn't written yet
+        self.__drawn = 0 # words drawn since the last record
+
+
+    def make_rng(self, seed=None):
+        """Returns a RecordingRandom seeded with (seed) that reports to this recorder."""
+        rng = RecordingRandom(seed)
+        rng.recorder = self
+        self.seeded(rng.getstate())
+        return rng
+
+
+    def attach(self, game):
+        """Starts recording (game).
+
+        The entities already in the game are numbered, in the order
+        they're kept in, without being recorded, since the game adds them
+        itself when it's made.
+        """
+        game.recorder = self
+        for ent in itertools.chain(game.active_entities, game.inactive_entities):
+            self.__number(ent)
+
+
+    def close(self):
+        """Writes out what's left and closes the log."""
+        self.turn_ended()
+        self.__flush()
+        self.__file.close()
+
+
+    # what the game calls
+
+    def ending_turn(self):
+        self.__write(TURN)
+
+
+    def turn_ended(self):
+        # so the next player's draws aren't lumped in with the GA's
+        if self.__drawn:
+            self.__write_draws()
+
+
+    def acting(self, ch):
+        """Returns True: the AI should go ahead and decide."""
+        # not written until there's something to bracket
+        self.__acting = ch
+        return True
+
+
+    def done_acting(self, ch):
+        if self.__acting is None:
+            self.__write(DONE)
+        self.__acting = None
+
+
+    def entity_added(self, ent):
+        self.__write(ADD + _POSITION.pack(self.__number(ent), ent.position[0], ent.position[1]))
+
+
+    def moved(self, ent, destination):
+        self.__write(MOVE + _POSITION.pack(self.__ids[ent], destination[0], destination[1]))
+
+
+    def fought(self, attacker, victim, damage):
+        self.__write(COMBAT + _COMBAT.pack(self.__ids[attacker], self.__ids[victim], damage))
+
+
+    def bred(self, parent1, parent2):
+        self.__write(BREED + _PAIR.pack(self.__ids[parent1], self.__ids[parent2]))
+
+
+    def replaced(self, mon):
+        genes = mon.d_tree.encode()
+        self.__write(REPLACE + _REPLACE.pack(self.__ids[mon], len(genes)) + genes)
+
+
+    def drew(self, words):
+        if self.__acting is not None:
+            self.__write_act()
+        self.__drawn = self.__drawn + words
+
+
+    def seeded(self, state):
+        self.__write(STATE + _pack_state(state))
+
+
+    def __number(self, ent):
+        number = self.__ids.get(ent)
+        if number is None:
+            number = self.__ids[ent] = len(self.__ids)
+        return number
+
+
+    def __write(self, record):
+        if self.__acting is not None:
+            self.__write_act()
+        elif self.__drawn:
+            self.__write_draws()
+        self.__buffer += record
+        self.records = self.records + 1
+        if len(self.__buffer) >= BUFFER_SIZE:
+            self.__flush()
+
+
+    def __write_act(self):
+        if self.__drawn:
+            self.__write_draws()
+        self.__buffer += ACT + _ID.pack(self.__ids[self.__acting])
+        self.records = self.records + 1
+        self.__acting = None
+
+
+    def __write_draws(self):
+        self.__buffer += DRAWS + _ID.pack(self.__drawn)
+        self.records = self.records + 1
+        self.__drawn = 0
+
+
+    def __flush(self):
+        self.__file.write(self.__buffer)
+        self.__buffer = bytearray()
+
+
+class RecordingRandom(random.Random):
+    """A random.Random that tells its recorder how much it draws.
+
+    Everything random.Random does comes down to random() (two words)
+    and getrandbits(k) (k / 32 words, rounded up), so those are all that
+    get counted, plus the state whenever it's seeded or set.
+    """
+    recorder = None
+
+    def random(self):
+        if self.recorder is not None:
+            self.recorder.drew(2)
+        return random.Random.random(self)
+
+
+    def getrandbits(self, k):
+        if self.recorder is not None:
+            self.recorder.drew((k + 31) // 32)
+        return random.Random.getrandbits(self, k)
+
+
+    def seed(self, a=None, version=2):
+        random.Random.seed(self, a, version)
+        if self.recorder is not None:
+            self.recorder.seeded(self.getstate())
+
+
+    def setstate(self, state):
+        random.Random.setstate(self, state)
+        if self.recorder is not None:
+            self.recorder.seeded(state)
+
+
+def read_header(f):
+    """Reads the start of the log in the open file (f). Returns the config.
+
+    Raises ValueError if it isn't a log.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a game log")
+    (length,) = _HEADER.unpack(f.read(_HEADER.size))
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+def read_records(data):
+    """Yields every record in (data), the log after its header, as tuples.
+
+    Each tuple is the record's code followed by what's in it (for STATE,
+    a state for random.Random.setstate).
+    Raises ValueError if (data) ends in the middle of a record.
+    """
+    view = memoryview(data)
+    i = 0
+    end = len(data)
+    while i < end:
+        code = data[i:i + 1]
+        i = i + 1
+        if code == ACT or code == DRAWS:
+            yield (code, _unpack(_ID, view, i)[0])
+            i = i + _ID.size
+        elif code == TURN or code == DONE:
+            yield (code,)
+        elif code == MOVE or code == ADD:
+            yield (code,) + _unpack(_POSITION, view, i)
+            i = i + _POSITION.size
+        elif code == COMBAT:
+            yield (COMBAT,) + _unpack(_COMBAT, view, i)
+            i = i + _COMBAT.size
+        elif code == BREED:
+            yield (BREED,) + _unpack(_PAIR, view, i)
+            i = i + _PAIR.size
+        elif code == REPLACE:
+            number, length = _unpack(_REPLACE, view, i)
+            i = i + _REPLACE.size
+            yield (REPLACE, number, bytes(view[i:i + length]))
+            i = i + length
+        elif code == STATE:
+            yield (STATE, _unpack_state(view, i))
+            i = i + _STATE.size
+        else:
+            raise ValueError("unknown record %r at byte %d" % (code, i - 1))
+        if i > end:
+            raise ValueError("the log ends in the middle of a record")
+
+
+def _unpack(layout, view, i):
+    try:
+        return layout.unpack_from(view, i)
+    except struct.error:
+        raise ValueError("the log ends in the middle of a record")
+
+
+def _pack_state(state):
+    version, internal, gauss = state
+    return _STATE.pack(*(internal + (gauss is not None, gauss or 0.0)))
+
+
+def _unpack_state(view, i):
+    values = _unpack(_STATE, view, i)
+    gauss = values[626] if values[625] else None
+    return (3, tuple(values[:625]), gauss)
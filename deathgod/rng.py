@@ -0,0 +1,51 @@
+"""
+rng.py
+
+Random number generators that can be made to repeat themselves.
+
+Everything random in the game (where monsters spawn, how the GA mutates
+and breeds) draws from a random.Random that is handed around explicitly,
+usually the Game's rng, instead of the random module's shared one. Give
+a Game a seed and the same run happens every time.
+
+Anything that runs its own games in other processes (parallel
+evaluators, islands) gets child seeds, made from the master seed plus
+whatever tells the children apart, so each one gets its own stream of
+numbers and the whole run still only depends on the master seed.
+
+members:
+
+make_rng
+child_seed
+child_rng
+"""
+
+import random
+
+
+def make_rng(seed=None):
+    """Returns a new random.Random seeded with (seed).
+
+    A seed of None seeds it from the operating system, i.e. a different
+    run every time.
+    """
+    return random.Random(seed)
+
+
+def child_seed(seed, *path):
+    """Returns the seed for a child stream of (seed).
+
+    (path) is anything that tells the children apart, e.g. an island
+    number, or a generation and shard number. A string seed gets hashed
+    into the generator's state with SHA-512, so the children's streams
+    have nothing to do with each other, and the same seed and path make
+    the same child in any process. If (seed) is None, so is the child's.
+    """
+    if seed is None:
+        return None
+    return ":".join(str(part) for part in (seed,) + path)
+
+
+def child_rng(seed, *path):
+    """Returns a random.Random for a child stream of (seed). See child_seed."""
+    return make_rng(child_seed(seed, *path))
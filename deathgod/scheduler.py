@@ -0,0 +1,159 @@
+"""
+scheduler.py
+
+Decides whose turn it is.
+
+Game.end_turn used to call update on every active entity once a turn,
+in the order they were activated, whether or not they had anything to
+do, and everything acted exactly once per turn whatever its speed. The
+Scheduler instead keeps the active entities in a heap keyed by when
+each one acts next, in ticks. A turn is TICKS_PER_TURN ticks long, and
+every entity that acts is put back into the heap for its next action
+(ent.speed) actions per turn later:
+
+speed 1    -- acts once every turn, like everything used to
+speed 2    -- acts twice every turn
+speed 0.5  -- acts every other turn
+
+Speeds that don't divide TICKS_PER_TURN (3, 7, ...) don't come out to a
+whole number of ticks between actions. Each entity carries the fraction
+of a tick it's owed from one action to the next, so over a few turns
+a speed 3 entity still acts exactly 3 times a turn, instead of 100 / 3
+being rounded to 33 ticks every time and it gaining an extra action
+every 33 turns. Nothing can act more than once a tick though.
+
+A turn only touches the entities that act during it, so a thousand slow
+frogs cost a tenth of what a thousand normal ones do.
+
+Entities with nothing to do (ent.idle, e.g. a player at full health, or
+anything that isn't a Character) aren't put back into the heap at all,
+and are never looked at again until something wakes them up, e.g. by
+hurting them (see Game.combat). Anything that gives an idle entity
+something to do has to call wake.
+
+Entities that act at the same tick act in the order they were
+scheduled, so everything with the same speed still acts in the order it
+was activated, and a seeded game still comes out the same every time.
+Entities added or woken in the middle of a turn first act at the start
+of the next one.
+
+Removing an entity (remove) only forgets it; its entry stays in the heap
+until it's popped and thrown away, or until the heap is mostly stale
+entries and gets rebuilt.
+
+members:
+
+Scheduler
+TICKS_PER_TURN
+"""
+
+import heapq
+
+# how finely a turn is divided up between entities of different speeds
+TICKS_PER_TURN = 100
+
+
+class Scheduler:
+    """A heap of active entities, keyed by when they act next.
+
+    Public Members:
+
+    tick
+    add
+    remove
+    wake
+    run_turn
+    scheduled
+    snapshot
+    restore
+    """
+    def __init__(self):
+        self.tick = 0 # the start of the next turn, anything added acts then
+        self.__heap = [] # (tick, sequence number, entity, fraction of a tick carried)
+        self.__entries = {} # entity -> the sequence number of its live entry
+        self.__sequence = 0
+
+
+    def add(self, ent):
+        """Schedules (ent) to act at the start of the next turn."""
+        self.__push(self.tick, ent, 0.0)
+
+
+    def remove(self, ent):
+        """Stops (ent) from acting until it's added again."""
+        if self.__entries.pop(ent, None) is None:
+            return
+        # throw the stale entries away once they're most of the heap
+        heap = self.__heap
+        if len(heap) > 2 * len(self.__entries) + 16:
+            entries = self.__entries
+            self.__heap = [entry for entry in heap if entries.get(entry[2]) == entry[1]]
+            heapq.heapify(self.__heap)
+
+
+    def wake(self, ent):
+        """Schedules (ent) to act at the start of the next turn, if it's active
+        and isn't already scheduled."""
+        if ent.active and ent not in self.__entries:
+            self.__push(self.tick, ent, 0.0)
+
+
+    def scheduled(self, ent):
+        """Returns True if (ent) is going to act."""
+        return ent in self.__entries
+
+
+    def run_turn(self, profiler=None):
+        """Calls update on every entity whose time comes up this turn.
+
+        Each update is timed if given a profiler.TurnProfiler (default None).
+        """
+        end = self.tick + TICKS_PER_TURN
+        self.tick = end
+        entries = self.__entries
+        # remove can rebuild the heap in the middle of a turn, so it's
+        # looked up again every time
+        while self.__heap and self.__heap[0][0] < end:
+            when, number, ent, carried = heapq.heappop(self.__heap)
+            if entries.get(ent) != number:
+                continue # removed since it was scheduled
+            if profiler is None:
+                ent.update()
+            else:
+                start = profiler.clock()
+                ent.update()
+                profiler.add("entity", "%s %s" % (ent.type, ent.name), profiler.clock() - start)
+            if entries.get(ent) != number:
+                continue # removed, or removed and added again, while updating
+            speed = ent.speed
+            if speed <= 0 or ent.idle:
+                del entries[ent]
+                continue
+            interval = TICKS_PER_TURN / speed + carried
+            # a hair more than a whole tick short is float error, not a tick
+            ticks = int(interval + 1e-9)
+            if ticks < 1:
+                ticks = 1
+                interval = 1.0
+            self.__push(when + ticks, ent, interval - ticks)
+
+
+    def snapshot(self):
+        """Returns everything restore needs to put the schedule back."""
+        return (self.tick, self.__sequence, list(self.__heap), self.__entries.copy())
+
+
+    def restore(self, state):
+        """Puts the schedule back to (state), from snapshot."""
+        tick, sequence, heap, entries = state
+        self.tick = tick
+        self.__sequence = sequence
+        self.__heap = list(heap)
+        self.__entries = entries.copy()
+
+
+    def __push(self, when, ent, carried):
+        number = self.__sequence
+        self.__sequence = number + 1
+        self.__entries[ent] = number
+        heapq.heappush(self.__heap, (when, number, ent, carried))
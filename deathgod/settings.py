@@ -82,6 +82,16 @@ status_view_color = (60, 0, 10)
 
 player_start = (10, 10)
 world_dimensions = (30, 30)
+
+# monsters further than this from the player stop acting until it comes
+# back, see dormancy.py (None: everything always acts)
+dormancy_radius = None
+# the dormant monsters are kept in square regions this many tiles wide
+dormancy_region_size = 16
+
+# time the last this many of everything that happens in a turn, see
+# profiler.py (None: don't)
+profile_window = None
 screen_dimensions = (map_view_size[x] + status_view_size[x], message_view_size[y] + map_view_size[y])
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""
+world_state.py
+
+Snapshots of the game world that can be put back, for AI rollouts.
+
+Deep copying a Game means copying every Tile, every Tile's EntityList,
+every Entity's pygame Sprite innards and the Game they all point back
+to, which is slow when it works at all. A WorldState only copies what
+actually changes while the game runs:
+
+- the game's turn counters and random number generator state
+- which entities are in the game, and which of those are active
+- when each active entity acts next, and which are dormant (see
+  scheduler.py and dormancy.py)
+- every entity's attributes (a shallow copy), position and stats
+
+The terrain isn't copied at all: the state holds on to the map's
+passability grid, and the map copies the grid before its next change
+(see GameMap.set_passable), so terrain is copy-on-write. Tiles, sprites
+and the display are never touched.
+
+A WorldState is never changed after it's made, so the same one can be
+restored any number of times, e.g. to try out a few thousand different
+futures from the same turn:
+
+state = game.snapshot()
+for plan in plans:
+    ...play some turns...
+    game.restore(state)
+
+Only the game the state came from can restore it, since it refers to
+that game's entities. Things that live outside the world aren't part of
+it either: a GATest's population and fitness logging in particular, so
+stop it from evolving (GATest.evolving) while doing rollouts. Decision
+trees are kept by reference, so genes changed in place (mutate) stay
+changed.
+
+members:
+
+WorldState
+"""
+
+import itertools
+from .entity import EntityRegistry
+
+# Entity keeps its position in a list it changes in place, so the copy of
+# its attributes can't just share it
+_POSITION = "_Entity__position"
+
+
+class WorldState:
+    """Everything about a game that changes as it's played.
+
+    Public Members:
+
+    turns
+    entity_count
+    restore
+    """
+    def __init__(self, game):
+        """Takes a snapshot of (game)."""
+        self.turns = game.turns
+        self.__rng_state = game.rng.getstate()
+        self.__terrain = game.get_map().share_terrain()
+        self.__active_count = len(game.active_entities)
+        self.__schedule = game.scheduler.snapshot()
+        self.__dormancy = game.dormancy.snapshot()
+
+        # (entity, attributes, position, stats attributes) for every
+        # entity in the game, active ones first
+        records = []
+        for ent in itertools.chain(game.active_entities, game.inactive_entities):
+            attrs = ent.__dict__.copy()
+            position = attrs.pop(_POSITION)
+            stats = attrs.get('stats')
+            if stats is not None:
+                stats = stats.__dict__.copy()
+            records.append((ent, attrs, (position[0], position[1]), stats))
+        self.__records = records
+
+
+    @property
+    def entity_count(self):
+        """(int) how many entities were in the game"""
+        return len(self.__records)
+
+
+    def restore(self, game):
+        """Puts (game) back the way it was when the snapshot was taken."""
+        current_map = game.get_map()
+        for ent in game.active_entities:
+            current_map.remove_entity(ent)
+        for ent in game.inactive_entities:
+            current_map.remove_entity(ent)
+
+        current_map.restore_terrain(self.__terrain)
+
+        entities = []
+        for ent, attrs, position, stats in self.__records:
+            ent.__dict__.update(attrs)
+            ent.__dict__[_POSITION] = [position[0], position[1]]
+            if stats is not None:
+                ent.stats.__dict__.update(stats)
+            current_map.add_entity(ent)
+            entities.append(ent)
+
+        game.active_entities = EntityRegistry(entities[:self.__active_count])
+        game.inactive_entities = EntityRegistry(entities[self.__active_count:])
+        game.scheduler.restore(self.__schedule)
+        game.dormancy.restore(self.__dormancy)
+        game.turns = self.turns
+        game.rng.setstate(self.__rng_state)
@@ -0,0 +1,71 @@
+"""
+Tests for ai/batch.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import random
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from deathgod.ai import tests
+from deathgod.ai.arena import Arena
+
+
+def scalar_bits(game, ch):
+    """The bits TestBatch packs, from calling tests.members one at a time."""
+    bits = 0
+    for i, test in enumerate(tests.members):
+        if test(game, ch):
+            bits = bits | (1 << i)
+    return bits
+
+
+@unittest.skipIf(numpy is None, "batched tests need NumPy")
+class EvaluateBitsTest(unittest.TestCase):
+    """The batched tests should come out exactly the same as the plain ones."""
+
+    def setUp(self):
+        self.arena = Arena(30, 5, (30, 30), seed=1)
+        self.game = self.arena.game
+        from deathgod.ai.batch import TestBatch
+        self.batch = TestBatch()
+
+
+    def tearDown(self):
+        self.arena.close()
+
+
+    def test_matches_tests_members(self):
+        game = self.game
+        rng = random.Random(1)
+        player = game.get_player()
+        seen_set = 0
+        seen_clear = 0
+        for generation in range(20):
+            self.arena.run(1)
+            frogs = self.arena.ga_test.monsters
+            # every hp, not just whatever the frogs got up to
+            for ch in frogs + [player]:
+                ch.stats.hp = rng.randint(1, ch.stats.max_hp)
+            game.perception.update()
+            bits = self.batch.evaluate_bits(game, frogs)
+            self.assertEqual(bits, [scalar_bits(game, ch) for ch in frogs])
+            for b in bits:
+                seen_set = seen_set | b
+                seen_clear = seen_clear | ~b
+        # and every test came out both ways somewhere
+        everything = (1 << len(tests.members)) - 1
+        self.assertEqual(seen_set & everything, everything)
+        self.assertEqual(seen_clear & everything, everything)
+
+
+if __name__ == "__main__":
+    unittest.main()
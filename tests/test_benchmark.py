@@ -0,0 +1,47 @@
+"""
+Tests for ai/benchmark.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod.ai import benchmark
+from deathgod.ai import genetic
+
+
+class RepeatTest(unittest.TestCase):
+    """Every repeat of a benchmark should do the same work, compiling included."""
+
+    def setUp(self):
+        self.compiles = 0
+        self.compile_tree = genetic.compile_tree
+        def compile_tree(genes):
+            self.compiles = self.compiles + 1
+            return self.compile_tree(genes)
+        genetic.compile_tree = compile_tree
+
+
+    def tearDown(self):
+        genetic.compile_tree = self.compile_tree
+
+
+    def test_repeats_compile_the_same(self):
+        counts = []
+        for i in range(3):
+            before = self.compiles
+            benchmark.run_benchmark(30, 60, seed=1, repeats=1)
+            counts.append(self.compiles - before)
+        self.assertEqual(counts, [counts[0]] * 3)
+
+
+    def test_git_revision(self):
+        revision = benchmark.git_revision()
+        self.assertTrue(revision is None or len(revision) == 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Tests for ai/checkpoint.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from deathgod.ai import checkpoint
+from deathgod.ai.arena import Arena
+
+
+class RoundTripTest(unittest.TestCase):
+    """What a checkpoint saves should come back the same when it's loaded."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "frogs.ckpt")
+        self.arena = Arena(8, 5, (30, 30), seed=1)
+
+
+    def tearDown(self):
+        self.arena.close()
+        shutil.rmtree(self.directory)
+
+
+    def test_monster_stats(self):
+        self.arena.run(3)
+        ga_test = self.arena.ga_test
+        mon = ga_test.monsters[0]
+        mon.damage_dealt = 123
+        mon.kills = 4
+        mon.got_killed = True
+        ga_test.save_checkpoint(self.path)
+
+        genes, damage_dealt, kills, got_killed, fitness = checkpoint.load(self.path)['monsters'][0]
+        self.assertEqual(genes, mon.d_tree.encode())
+        self.assertEqual((damage_dealt, kills, got_killed), (123, 4, True))
+        self.assertIsInstance(damage_dealt, int)
+        self.assertIsInstance(kills, int)
+        self.assertEqual(fitness, mon.fitness)
+
+
+    def test_resume(self):
+        self.arena.run(3)
+        ga_test = self.arena.ga_test
+        ga_test.save_checkpoint(self.path)
+        saved = [(mon.d_tree.encode(), mon.damage_dealt, mon.kills) for mon in ga_test.monsters]
+
+        resumed = Arena(8, 5, (30, 30), seed=2)
+        try:
+            resumed.ga_test.resume(self.path)
+            self.assertEqual(resumed.ga_test.generations, 3)
+            self.assertEqual([(mon.d_tree.encode(), mon.damage_dealt, mon.kills)
+                              for mon in resumed.ga_test.monsters], saved)
+            for mon in resumed.ga_test.monsters:
+                self.assertIsInstance(mon.kills, int)
+        finally:
+            resumed.close()
+
+
+    def test_damaged_files(self):
+        self.arena.run(3)
+        self.arena.ga_test.save_checkpoint(self.path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        header = checkpoint._header.size
+        body = zlib.decompress(data[header:])
+        # cut off, scrambled, and cut off before it was compressed
+        for damaged in (data[:len(data) // 2],
+                        data[:header] + bytes(reversed(data[header:])),
+                        data[:header] + zlib.compress(body[:len(body) // 2])):
+            with open(self.path, "wb") as f:
+                f.write(damaged)
+            with self.assertRaises(checkpoint.CheckpointError):
+                checkpoint.load(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Tests for dormancy.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod.ai.arena import Arena
+
+
+class CatchUpTest(unittest.TestCase):
+    """A monster woken up should have caught up on every turn it missed."""
+
+    def setUp(self):
+        self.arena = Arena(8, 5, (60, 60), seed=1)
+        self.arena.ga_test.evolving = False
+        self.game = self.arena.game
+        self.game.dormancy.enable(2, 4)
+
+
+    def tearDown(self):
+        self.arena.close()
+
+
+    def test_wake_catches_up_every_turn(self):
+        game = self.game
+        player = game.get_player()
+        far = [mon for mon in self.arena.ga_test.monsters
+               if max(abs(mon.position[0] - player.position[0]),
+                      abs(mon.position[1] - player.position[1])) >= 6]
+        self.assertTrue(far)
+        mon = far[0]
+        mon.stats.hp = 1
+        mon.turns_since_regen = 0
+        turns = mon.turns
+
+        game.advance(40)
+        self.assertTrue(game.dormancy.is_parked(mon))
+        game.dormancy.wake(mon)
+        # parked on the first of the 40 turns, so it missed all of them
+        self.assertEqual(mon.turns, turns + 40)
+        self.assertEqual(mon.stats.hp, min(mon.stats.max_hp, 1 + 40 // mon.regen_rate))
+
+
+if __name__ == "__main__":
+    unittest.main()
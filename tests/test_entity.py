@@ -0,0 +1,35 @@
+"""
+Tests for entity.py.
+
+python3 -m pytest tests
+"""
+
+import random
+import unittest
+
+from deathgod.entity import EntityList
+
+
+class Stacked:
+    """Just enough of an entity for an EntityList."""
+
+    def __init__(self, sorting_priority):
+        self.sorting_priority = sorting_priority
+
+
+class EntityListTest(unittest.TestCase):
+    """add_entity should leave the list as if it had appended and sorted."""
+
+    def test_sorted_and_stable(self):
+        rng = random.Random(1)
+        pile = EntityList()
+        added = []
+        for i in range(200):
+            ent = Stacked(rng.randrange(5))
+            pile.add_entity(ent)
+            added.append(ent)
+        self.assertEqual(list(pile), sorted(added, key=lambda e: e.sorting_priority))
+
+
+if __name__ == "__main__":
+    unittest.main()
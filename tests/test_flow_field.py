@@ -0,0 +1,76 @@
+"""
+Tests for ai/flow_field.py.
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod.ai.flow_field import FlowField, UNREACHABLE
+
+
+class Terrain:
+    """Just enough of a GameMap for a FlowField, drawn from rows of text.
+
+    '#' is a wall, anything else is open.
+    """
+
+    def __init__(self, rows):
+        self.width = len(rows[0])
+        self.height = len(rows)
+        self.terrain_version = 0
+        self.passability = bytearray(self.width * self.height)
+        for pos_y, row in enumerate(rows):
+            for pos_x, c in enumerate(row):
+                self.passability[pos_x * self.height + pos_y] = 0 if c == "#" else 1
+
+
+    def set_passable(self, pos, passable):
+        self.passability[pos[0] * self.height + pos[1]] = 1 if passable else 0
+        self.terrain_version = self.terrain_version + 1
+
+
+class DistanceTest(unittest.TestCase):
+    """Distances should be moves over open tiles, not as the crow flies."""
+
+    def setUp(self):
+        self.terrain = Terrain(["...#...",
+                                "...#...",
+                                "...#...",
+                                "...#..#",
+                                "......#"])
+        self.field = FlowField()
+        self.field.update(self.terrain, (0, 0))
+
+
+    def test_open_ground(self):
+        self.assertEqual(self.field.distance((0, 0)), 0)
+        self.assertEqual(self.field.distance((2, 2)), 2)
+        self.assertEqual(self.field.distance((1, 4)), 4)
+
+
+    def test_around_the_wall(self):
+        # 6 moves as the crow flies, but the only way through is at (3, 4)
+        self.assertEqual(self.field.distance((3, 4)), 4)
+        self.assertEqual(self.field.distance((6, 0)), 8)
+        self.assertEqual(self.field.distance((5, 2)), 6)
+
+
+    def test_walls_are_unreachable(self):
+        self.assertEqual(self.field.distance((3, 0)), UNREACHABLE)
+        self.assertEqual(self.field.distance((6, 4)), UNREACHABLE)
+
+
+    def test_terrain_changes(self):
+        self.terrain.set_passable((3, 0), True)
+        self.field.update(self.terrain, (0, 0))
+        self.assertEqual(self.field.distance((6, 0)), 6)
+        # and shut off completely
+        self.terrain.set_passable((3, 0), False)
+        self.terrain.set_passable((3, 4), False)
+        self.field.update(self.terrain, (0, 0))
+        self.assertEqual(self.field.distance((6, 0)), UNREACHABLE)
+
+
+if __name__ == "__main__":
+    unittest.main()
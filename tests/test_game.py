@@ -0,0 +1,82 @@
+"""
+Tests for game.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod import event
+from deathgod.ai.arena import Arena
+
+
+class Attacker:
+    """Just enough of a monster for Game.combat, next to (victim)."""
+
+    def __init__(self, victim, damage):
+        self.position = list(victim.position)
+        self.offense = victim.defense + damage
+        self.damage_dealt = 0
+        self.kills = 0
+        self.type = "Monster"
+        self.name = "test frog"
+
+
+class RestTest(unittest.TestCase):
+    """Resting should stop as soon as the player is hurt."""
+
+    def setUp(self):
+        self.arena = Arena(8, 5, (30, 30), seed=1)
+        self.arena.ga_test.evolving = False
+        self.game = self.arena.game
+        # nothing hits the player except hit_player
+        for mon in self.arena.ga_test.monsters:
+            self.game.deactivate_entity(mon)
+        self.player = self.game.get_player()
+        self.hits = {} # turn -> damage
+        event.add_handler(self.hit_player, event.TurnEnded)
+
+
+    def tearDown(self):
+        event.remove_handler(self.hit_player, event.TurnEnded)
+        self.arena.close()
+
+
+    def hit_player(self, e):
+        damage = self.hits.get(self.game.turns)
+        if damage is not None:
+            self.game.combat(Attacker(self.player, damage), self.player)
+
+
+    def hurt(self, hp):
+        self.player.stats.hp = hp
+        self.player.turns_since_regen = 0
+        self.game.scheduler.wake(self.player)
+
+
+    def test_rests_until_healed(self):
+        self.hurt(self.player.stats.max_hp - 2)
+        self.assertEqual(self.game.rest(50), 2 * self.player.regen_rate)
+        self.assertEqual(self.player.stats.hp, self.player.stats.max_hp)
+
+
+    def test_hurt_as_much_as_regenerated(self):
+        self.hurt(self.player.stats.max_hp - 5)
+        # regenerates on turn regen_rate, then gets hit for 1
+        turn = self.game.turns + self.player.regen_rate
+        self.hits[turn] = 1
+        self.assertEqual(self.game.rest(50), self.player.regen_rate)
+
+
+    def test_killed_while_resting(self):
+        self.hurt(1)
+        self.hits[self.game.turns + 3] = self.player.stats.max_hp
+        self.assertEqual(self.game.rest(50), 3)
+        self.assertEqual(self.player.times_hurt, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests for ai/genetic.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod.ai import genetic
+from deathgod.ai.arena import Arena
+from deathgod.ai.fitness_cache import FitnessCache
+
+
+class CompileTest(unittest.TestCase):
+    """Genomes should get compiled once they've been walked often enough."""
+
+    def setUp(self):
+        genetic.clear_caches()
+        self.arena = Arena(8, 5, (30, 30), seed=1)
+        self.game = self.arena.game
+        self.tree = self.arena.ga_test.monsters[0].d_tree
+
+
+    def tearDown(self):
+        self.arena.close()
+        genetic.clear_caches()
+
+
+    def compiled(self, tree):
+        return tree.genes.tobytes() in genetic._compiled_trees
+
+
+    def test_compiles_at_threshold(self):
+        for i in range(genetic.COMPILE_THRESHOLD - 1):
+            self.tree.get_action(self.game)
+        self.assertFalse(self.compiled(self.tree))
+        self.tree.get_action(self.game)
+        self.assertTrue(self.compiled(self.tree))
+
+
+    def test_trees_with_the_same_genes_count_together(self):
+        twin = self.arena.ga_test.monsters[1].d_tree
+        twin.init_from_genes(self.tree.encode())
+        for i in range(genetic.COMPILE_THRESHOLD // 2):
+            self.tree.get_action(self.game)
+            twin.get_action(self.game)
+        self.assertTrue(self.compiled(self.tree))
+        # and the walks are the same as a copy's
+        self.assertEqual(self.tree.get_action(self.game),
+                         self.tree.copy().get_action_uncompiled(self.game))
+
+
+class PoolFitnessTest(unittest.TestCase):
+    """A genome that does the same every generation should keep the same mean."""
+
+    def setUp(self):
+        self.cache = FitnessCache()
+        self.arena = Arena(8, 5, (30, 30), fitness_cache=self.cache, seed=1)
+        self.ga = self.arena.ga_test
+
+
+    def tearDown(self):
+        self.arena.close()
+
+
+    def test_survivor_mean_is_stable(self):
+        mon = self.ga.monsters[0]
+        key = mon.d_tree.genome_key()
+        for generation in range(10):
+            # 5 damage and a kill every generation, never reset
+            mon.damage_dealt = mon.damage_dealt + 5
+            mon.kills = mon.kills + 1
+            mon.fitness = genetic.fitness(mon)
+            self.ga.generations = self.ga.generations + 1
+            self.ga.pool_fitness([mon])
+            self.assertEqual(self.cache.estimate(key), 15)
+            self.assertEqual(mon.fitness, 15)
+
+
+    def test_reset_starts_a_new_sample(self):
+        mon = self.ga.monsters[0]
+        mon.damage_dealt = 20
+        mon.fitness = genetic.fitness(mon)
+        self.ga.pool_fitness([mon])
+        mon.reset()
+        mon.damage_dealt = 10
+        mon.fitness = genetic.fitness(mon)
+        self.ga.pool_fitness([mon])
+        self.assertEqual(self.cache.estimate(mon.d_tree.genome_key()), 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Tests for ai/islands.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from deathgod.ai.islands import run_islands, island_telemetry_path, IslandError
+
+
+class TelemetryTest(unittest.TestCase):
+    """Every island should write its own telemetry."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_file_per_island(self):
+        path = os.path.join(self.directory, "run.csv")
+        run_islands(2, 6, 3, 1, 8, 5, (30, 30), seed=1, telemetry=path)
+        for index in range(2):
+            with open(island_telemetry_path(path, index), newline="") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual([int(row["generation"]) for row in rows], list(range(1, 7)))
+
+
+class FailureTest(unittest.TestCase):
+    """An island that fails should make run_islands raise, not hang."""
+
+    def test_failing_island_raises(self):
+        with self.assertRaises(IslandError) as raised:
+            run_islands(2, 6, 3, 1, 8, 5, (30, 30), seed=1, player="no such controller")
+        self.assertIn("KeyError", str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests for ai/parallel.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import multiprocessing
+import unittest
+
+from deathgod.ai.arena import Arena
+from deathgod.ai.parallel import ParallelEvaluator
+
+
+class SpawnedWorkersTest(unittest.TestCase):
+    """Workers that start from a fresh interpreter have to import everything cold."""
+
+    def setUp(self):
+        self.arena = Arena(8, 5, (30, 30), seed=1)
+        self.trees = [mon.d_tree for mon in self.arena.ga_test.monsters]
+
+
+    def tearDown(self):
+        self.arena.close()
+
+
+    def evaluate(self, context):
+        evaluator = ParallelEvaluator(2, 2, 5, (30, 30), seed=1,
+                                      context=multiprocessing.get_context(context))
+        try:
+            return evaluator.evaluate(self.trees)
+        finally:
+            evaluator.close()
+
+
+    def test_spawn_pool_evaluates(self):
+        results = self.evaluate("spawn")
+        self.assertEqual(len(results), len(self.trees))
+        for damage_dealt, kills, got_killed in results:
+            self.assertGreaterEqual(damage_dealt, 0)
+            self.assertGreaterEqual(kills, 0)
+
+
+    def test_spawn_matches_fork(self):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            self.skipTest("no fork on this platform")
+        self.assertEqual(self.evaluate("spawn"), self.evaluate("fork"))
+
+
+class ShardSizeTest(unittest.TestCase):
+    """A worker's arena is resized to every shard, and shouldn't remember earlier ones."""
+
+    def setUp(self):
+        self.arena = Arena(8, 5, (30, 30), seed=1)
+        self.trees = [mon.d_tree for mon in self.arena.ga_test.monsters]
+
+
+    def tearDown(self):
+        self.arena.close()
+
+
+    def evaluate_after(self, first):
+        evaluator = ParallelEvaluator(1, 1, 5, (30, 30), seed=1)
+        try:
+            evaluator.evaluate(self.trees[:first])
+            return evaluator.evaluate(self.trees[:5])
+        finally:
+            evaluator.close()
+
+
+    def test_grown_and_shrunk_arenas_agree(self):
+        self.assertEqual(self.evaluate_after(3), self.evaluate_after(8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Tests for ai/racing.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod import event
+from deathgod import character
+from deathgod.ai.arena import Arena
+from deathgod.ai.fitness_cache import FitnessCache
+from deathgod.ai.racing import RacingEvaluator
+
+
+class ArenaReuseTest(unittest.TestCase):
+    """The racing arena is resized to every population instead of piling up new ones."""
+
+    def setUp(self):
+        self.evaluator = RacingEvaluator(5, (40, 40), 1, budget=0.5)
+        self.arena = Arena(40, 5, (40, 40), evaluator=self.evaluator,
+                           fitness_cache=FitnessCache(), seed=1)
+        self.trees = [mon.d_tree for mon in self.arena.ga_test.monsters]
+
+
+    def tearDown(self):
+        self.arena.close()
+        self.evaluator.close()
+
+
+    def test_one_arena_however_many_genomes(self):
+        self.arena.run(30)
+        # the arena's and the racing arena's
+        self.assertEqual(len(event.TurnEnded.handlers), 2)
+        self.assertEqual(len(character.CharacterDeath.handlers), 2)
+
+
+    def evaluate_after(self, first):
+        evaluator = RacingEvaluator(5, (40, 40), 1, budget=0.5)
+        try:
+            evaluator.evaluate(self.trees[:first])
+            return evaluator.evaluate(self.trees[:10])
+        finally:
+            evaluator.close()
+
+
+    def test_grown_and_shrunk_arenas_agree(self):
+        self.assertEqual(self.evaluate_after(4), self.evaluate_after(20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for ai/replay.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from deathgod.ai import arena
+from deathgod.ai.replay import Replayer
+from deathgod.ai.telemetry import TelemetryWriter
+
+GENERATIONS = 20
+
+
+def read_telemetry(path):
+    """The telemetry at (path), without the timings, which never repeat."""
+    with open(path, newline="") as f:
+        return [dict((k, v) for k, v in row.items()
+                     if k != "timestamp" and not k.startswith("time_"))
+                for row in csv.DictReader(f)]
+
+
+class ReplayTest(unittest.TestCase):
+    """A replayed run, carried on live, should end up the same as the recorded one."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = os.path.join(self.directory, "run.log")
+        self.recorded = os.path.join(self.directory, "recorded.csv")
+        self.replayed = os.path.join(self.directory, "replayed.csv")
+        arena.main(["-g", str(GENERATIONS), "-m", "12", "--width", "30", "--height", "30",
+                    "-s", "1", "-p", "chase", "--record", self.log, "-t", self.recorded])
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_replay_then_detach(self):
+        replayer = Replayer(self.log)
+        ga_test = replayer.arena.ga_test
+        ga_test.telemetry = TelemetryWriter(self.replayed)
+        try:
+            # half of it replayed (raising ReplayError if it goes differently),
+            # the rest live
+            replayer.run(GENERATIONS * ga_test.eval_interval // 2)
+            self.assertFalse(replayer.finished)
+            replayer.detach()
+            replayer.arena.run(GENERATIONS - ga_test.generations)
+        finally:
+            ga_test.telemetry.close()
+            replayer.arena.close()
+        recorded = read_telemetry(self.recorded)
+        self.assertEqual(len(recorded), GENERATIONS)
+        self.assertEqual(read_telemetry(self.replayed), recorded)
+
+
+    def test_whole_log(self):
+        replayer = Replayer(self.log)
+        try:
+            replayer.run()
+            self.assertTrue(replayer.finished)
+            self.assertEqual(replayer.arena.ga_test.generations, GENERATIONS)
+        finally:
+            replayer.arena.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Tests for scheduler.py.
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod.scheduler import Scheduler
+
+
+class Runner:
+    """Just enough of an entity for the scheduler: counts its turns."""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.active = True
+        self.idle = False
+        self.actions = 0
+
+
+    def update(self):
+        self.actions = self.actions + 1
+
+
+class SpeedTest(unittest.TestCase):
+    """Entities should act (speed) times a turn, however it divides a turn."""
+
+    def run_turns(self, speeds, turns):
+        scheduler = Scheduler()
+        runners = [Runner(speed) for speed in speeds]
+        for runner in runners:
+            scheduler.add(runner)
+        counts = []
+        for turn in range(turns):
+            before = [runner.actions for runner in runners]
+            scheduler.run_turn()
+            counts.append([runner.actions - b for runner, b in zip(runners, before)])
+        return counts
+
+
+    def test_speeds_that_dont_divide_a_turn(self):
+        for counts in self.run_turns([1, 2, 3, 6, 7, 9], 300):
+            self.assertEqual(counts, [1, 2, 3, 6, 7, 9])
+
+
+    def test_slow_speeds(self):
+        counts = self.run_turns([0.5, 1.0 / 3], 300)
+        self.assertEqual(sum(c[0] for c in counts), 150)
+        self.assertEqual(sum(c[1] for c in counts), 100)
+        # never twice in one turn
+        self.assertEqual(max(max(c) for c in counts), 1)
+
+
+    def test_restore_keeps_the_fraction(self):
+        scheduler = Scheduler()
+        runner = Runner(3)
+        scheduler.add(runner)
+        scheduler.run_turn()
+        state = scheduler.snapshot()
+        for turn in range(10):
+            scheduler.run_turn()
+        after = runner.actions
+        scheduler.restore(state)
+        runner.actions = 3
+        for turn in range(10):
+            scheduler.run_turn()
+        self.assertEqual(runner.actions, after)
+
+
+if __name__ == "__main__":
+    unittest.main()
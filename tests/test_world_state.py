@@ -0,0 +1,39 @@
+"""
+Tests for world_state.py.
+
+Run from the top level directory, since the stat files are loaded with
+relative paths:
+
+python3 -m pytest tests
+"""
+
+import unittest
+
+from deathgod.ai.arena import Arena
+
+
+class TurnsTest(unittest.TestCase):
+    """The turn counter should count turns, and be put back by restore."""
+
+    def setUp(self):
+        self.arena = Arena(8, 5, (30, 30), seed=1)
+        self.game = self.arena.game
+
+
+    def tearDown(self):
+        self.arena.close()
+
+
+    def test_snapshot_restores_turns(self):
+        self.game.advance(3)
+        self.assertEqual(self.game.turns, 3)
+        state = self.game.snapshot()
+        self.assertEqual(state.turns, 3)
+        self.game.advance(4)
+        self.assertEqual(self.game.turns, 7)
+        self.game.restore(state)
+        self.assertEqual(self.game.turns, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()